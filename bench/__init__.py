@@ -0,0 +1,14 @@
+"""Benchmark suite: synthetic households, traffic replay and JSON reports.
+
+    python -m bench generate --scale medium --out /tmp/medium.db
+    python -m bench run --scale medium --mix kiosk --out before.json
+    python -m bench run --db /tmp/medium.db --gunicorn --workers 2
+    python -m bench run --db /tmp/medium.db --asgi
+    python -m bench idle --connections 500
+    python -m bench serialize --scale medium
+    python -m bench compare before.json after.json
+
+Databases are generated with the real schema and migrate_db() from a
+fixed seed, and every run replays a seeded request sequence against a
+fresh copy, so reports from different commits can be compared.
+"""
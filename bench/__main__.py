@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from . import encoding, idle, synth, traffic
+
+SERVER_DIR = Path(__file__).parent.parent / 'server'
+
+# Relative change that counts as a regression in compare
+DEFAULT_THRESHOLD = 0.15
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVER_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server did not start on port {port}")
+
+
+def start_server(mode, port, workers):
+    """Serve the app from a subprocess with gunicorn or serve.py (asgi)."""
+    if mode == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', '--chdir', str(SERVER_DIR),
+                   '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--preload', 'app:create_app()']
+    else:
+        command = [sys.executable, str(SERVER_DIR / 'serve.py'), '--host', '127.0.0.1', '--port', str(port)]
+    server = subprocess.Popen(command, env=os.environ.copy(),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port, server)
+    return server
+
+
+def prepare_db(args, tmp):
+    """Copy or generate the database for this run; returns (path, row counts)."""
+    db = Path(tmp) / 'chores.db'
+    if args.db:
+        shutil.copy(args.db, db)
+        archive = Path(args.db).with_name('chores-archive.db')
+        if archive.exists():
+            shutil.copy(archive, db.with_name(archive.name))
+        return db, None
+    return db, synth.generate(db, args.scale, args.seed)
+
+
+def run(args):
+    # SQL per request is scraped from /api/metrics
+    os.environ.setdefault('CHORES_METRICS', '1')
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        data = None
+        if args.url:
+            mode = 'http'
+            make_client = lambda: traffic.HttpClient(args.url)
+        else:
+            db, data = prepare_db(args, tmp)
+            os.environ['CHORES_DB_PATH'] = str(db)
+            if args.gunicorn or args.asgi:
+                mode = 'gunicorn' if args.gunicorn else 'asgi'
+                port = free_port()
+                server = start_server(mode, port, args.workers)
+                url = f'http://127.0.0.1:{port}'
+                make_client = lambda: traffic.HttpClient(url)
+            else:
+                mode = 'in-process'
+                import database
+                database.DB_PATH = db
+                from app import app
+                make_client = lambda: traffic.InProcessClient(app)
+
+        try:
+            if args.warmup:
+                traffic.replay(make_client, args.mix, args.warmup, args.concurrency, seed=args.seed + 1)
+            client = make_client()
+            sql_before = traffic.sql_statements(client)
+            samples, elapsed = traffic.replay(
+                make_client, args.mix, args.requests, args.concurrency, seed=args.seed)
+            sql_after = traffic.sql_statements(client)
+            client.close()
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    report = {
+        'commit': git_commit(),
+        'mode': mode,
+        'scale': None if args.db or args.url else args.scale,
+        'mix': args.mix,
+        'concurrency': args.concurrency,
+        'workers': args.workers if mode == 'gunicorn' else None,
+        'seed': args.seed,
+        'data': data,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        **traffic.summarize(samples, elapsed, sql_before, sql_after),
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(output + '\n')
+    print(output)
+    return 0
+
+
+def compare(args):
+    old = json.loads(Path(args.old).read_text())
+    new = json.loads(Path(args.new).read_text())
+    regressions = []
+    for endpoint, after in new['endpoints'].items():
+        before = old['endpoints'].get(endpoint)
+        if before is None:
+            continue
+        checks = [
+            ('p95_ms', after['p95_ms'] > before['p95_ms'] * (1 + args.threshold)),
+            ('rps', after['rps'] < before['rps'] * (1 - args.threshold)),
+            # SQL counts are deterministic, so any growth is a change in the code
+            ('sql_per_request', after['sql_per_request'] > before['sql_per_request'] + 0.01),
+        ]
+        for metric, regressed in checks:
+            flag = 'REGRESSED' if regressed else ''
+            print(f"{endpoint:40} {metric:16} {before[metric]:>10} -> {after[metric]:>10} {flag}")
+            if regressed:
+                regressions.append((endpoint, metric))
+    print(f"{len(regressions)} regressions ({old.get('commit')} -> {new.get('commit')})")
+    return 1 if regressions else 0
+
+
+def soak(args):
+    mode = 'gunicorn' if args.gunicorn else 'asgi'
+    with tempfile.TemporaryDirectory() as tmp:
+        db, data = prepare_db(args, tmp)
+        os.environ['CHORES_DB_PATH'] = str(db)
+        port = free_port()
+        server = start_server(mode, port, args.workers)
+        try:
+            samples = idle.soak(port, server.pid, args.connections, args.step)
+        finally:
+            server.terminate()
+            server.wait()
+
+    report = {
+        'commit': git_commit(),
+        'mode': mode,
+        'workers': args.workers if mode == 'gunicorn' else None,
+        'python': platform.python_version(),
+        'samples': samples,
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(output + '\n')
+    print(output)
+    return 0
+
+
+def serialize(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db, data = prepare_db(args, tmp)
+        os.environ['CHORES_DB_PATH'] = str(db)
+        cases = encoding.measure(args.repeat)
+
+    report = {
+        'commit': git_commit(),
+        'scale': None if args.db else args.scale,
+        'seed': args.seed,
+        'data': data,
+        'repeat': args.repeat,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'cases': cases,
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(output + '\n')
+    print(output)
+    return 0
+
+
+def generate(args):
+    counts = synth.generate(args.out, args.scale, args.seed)
+    print(json.dumps(counts))
+    return 0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m bench', description="Chores app benchmarks.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    gen = commands.add_parser('generate', help="create a synthetic database")
+    gen.add_argument('--scale', choices=list(synth.SCALES), default='medium')
+    gen.add_argument('--seed', type=int, default=1)
+    gen.add_argument('--out', required=True)
+    gen.set_defaults(func=generate)
+
+    bench = commands.add_parser('run', help="replay a traffic mix and report JSON")
+    source = bench.add_mutually_exclusive_group()
+    source.add_argument('--scale', choices=list(synth.SCALES), default='medium')
+    source.add_argument('--db', help="copy this database instead of generating one")
+    source.add_argument('--url', help="benchmark a running server (its data is modified)")
+    servers = bench.add_mutually_exclusive_group()
+    servers.add_argument('--gunicorn', action='store_true', help="serve with gunicorn instead of in-process")
+    servers.add_argument('--asgi', action='store_true', help="serve with serve.py instead of in-process")
+    bench.add_argument('--workers', type=int, default=2)
+    bench.add_argument('--mix', choices=list(traffic.MIXES), default='kiosk')
+    bench.add_argument('--requests', type=int, default=2000)
+    bench.add_argument('--warmup', type=int, default=200)
+    bench.add_argument('--concurrency', type=int, default=4)
+    bench.add_argument('--seed', type=int, default=1)
+    bench.add_argument('--out', help="also write the report here")
+    bench.set_defaults(func=run)
+
+    soak_cmd = commands.add_parser('idle', help="hold open SSE streams and sample server memory")
+    soak_cmd.add_argument('--scale', choices=list(synth.SCALES), default='small')
+    soak_cmd.add_argument('--connections', type=int, default=500)
+    soak_cmd.add_argument('--step', type=int, default=100)
+    soak_cmd.add_argument('--gunicorn', action='store_true', help="serve with gunicorn instead of serve.py")
+    soak_cmd.add_argument('--workers', type=int, default=2)
+    soak_cmd.add_argument('--seed', type=int, default=1)
+    soak_cmd.add_argument('--out', help="also write the report here")
+    soak_cmd.set_defaults(func=soak, db=None)
+
+    ser = commands.add_parser('serialize', help="time building JSON bodies against the dict-and-jsonify path")
+    source = ser.add_mutually_exclusive_group()
+    source.add_argument('--scale', choices=list(synth.SCALES), default='medium')
+    source.add_argument('--db', help="copy this database instead of generating one")
+    ser.add_argument('--repeat', type=int, default=20)
+    ser.add_argument('--seed', type=int, default=1)
+    ser.add_argument('--out', help="also write the report here")
+    ser.set_defaults(func=serialize)
+
+    cmp = commands.add_parser('compare', help="compare two reports; exits 1 on regressions")
+    cmp.add_argument('old')
+    cmp.add_argument('new')
+    cmp.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    cmp.set_defaults(func=compare)
+
+    args = parser.parse_args(argv[1:])
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
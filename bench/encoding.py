@@ -0,0 +1,149 @@
+"""Serialization microbenchmark: JSON fragments against dicts and jsonify().
+
+Times the CPU it takes to build one response body in-process, without
+HTTP, for the board and history windows of several lengths. Each case
+runs the route as it is now (see server/serialize.py) and a reference
+that builds the same body the way the routes did before: sqlite3.Row
+objects copied into dicts and encoded with jsonify(). The time of the
+case's SQL alone, without the JSON columns and fetched as tuples, is
+reported too, since neither path can go below it. Both bodies are
+decoded and compared, so a run also checks the fast path against the
+reference.
+"""
+from itertools import groupby
+import json
+import re
+import time
+from unittest import mock
+
+# (name, path) of each case; the path's query string goes to the route
+CASES = [
+    ('board', '/api/board'),
+    ('history_7d', '/api/history?days=7'),
+    ('history_30d', '/api/history?days=30'),
+    ('history_365d', '/api/history?days=365'),
+    ('child_history_90d', '/api/history/child/1?days=90'),
+]
+
+
+def cpu_ms(fn, repeat):
+    """Mean CPU milliseconds per call of fn over repeat calls, after one warm-up call."""
+    fn()
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat * 1000
+
+
+def row_query(sql, args):
+    """Run a query with sqlite3.Row rows, as query_db() does."""
+    from database import get_db
+    return get_db().execute(sql, args)
+
+
+def reference_board(definitions, periods):
+    """The board as get_board() built it with dicts and jsonify().
+
+    definitions and periods are what the read cache held for it.
+    """
+    from flask import jsonify
+    from routes.chores import PERIOD_STATE_SQL
+    state = {row['chore_id']: row for row in row_query(PERIOD_STATE_SQL, {'periods': periods})}
+    children = []
+    for child in definitions:
+        chores = []
+        for chore in child['chores']:
+            done = state.get(chore['id'])
+            chores.append({
+                **chore,
+                'completed': done is not None,
+                'completed_at': done['completed_at'] if done else None
+            })
+        children.append({**child, 'chores': chores})
+    return jsonify({'children': children}).get_data()
+
+
+def reference_history(sql, params, child):
+    """A history response as get_history() built it with dicts and jsonify()."""
+    from flask import jsonify
+
+    def entry(row):
+        return {'chore_id': row['chore_id'], 'title': row['chore_title'], 'completed_at': row['completed_at']}
+
+    days = []
+    for d, day_rows in groupby(row_query(sql, params), key=lambda r: r['date']):
+        if child:
+            days.append({'date': d, 'chores': [entry(r) for r in day_rows]})
+            continue
+        children = []
+        for (child_id, child_name), child_rows in groupby(
+                day_rows, key=lambda r: (r['child_id'], r['child_name'])):
+            children.append({'id': child_id, 'name': child_name, 'chores': [entry(r) for r in child_rows]})
+        days.append({'date': d, 'children': children})
+    return jsonify({'history': days}).get_data()
+
+
+def history_query(path):
+    """Capture the SQL and parameters the history route runs for path.
+
+    Returns the statement without its JSON column, as the reference reads it.
+    """
+    from routes import history
+    with mock.patch.object(history, 'tuple_cursor', wraps=history.tuple_cursor) as spy:
+        view(path)()
+    sql, args = spy.call_args.args
+    return re.sub(r",\s*json_object\([^)]*\) as entry", '', sql), args
+
+
+def view(path):
+    """The undecorated view function serving path, called with its URL arguments."""
+    from flask import current_app
+    adapter = current_app.url_map.bind('bench')
+    endpoint, kwargs = adapter.match(path.split('?')[0])
+    function = current_app.view_functions[endpoint]
+    function = getattr(function, '__wrapped__', function)
+    return lambda: function(**kwargs).get_data()
+
+
+def run_case(app, path, repeat):
+    from database import query_tuples, tuple_cursor
+    from routes.chores import PERIOD_STATE_SQL
+    with app.test_request_context(path):
+        fast = view(path)
+        if path == '/api/board':
+            definitions = json.loads(fast())['children']
+            for child in definitions:
+                for chore in child['chores']:
+                    del chore['completed'], chore['completed_at']
+            periods = json.dumps([[c['id'], c['period_start']] for child in definitions for c in child['chores']])
+            reference = lambda: reference_board(definitions, periods)
+            sql = lambda: query_tuples(PERIOD_STATE_SQL, {'periods': periods})
+        else:
+            row_sql, params = history_query(path)
+            child = '/child/' in path
+            reference = lambda: reference_history(row_sql, params, child)
+            sql = lambda: tuple_cursor(row_sql, params).fetchall()
+
+        body = fast()
+        if json.loads(body) != json.loads(reference()):
+            raise AssertionError(f"{path}: the fast path's body differs from the reference")
+        result = {
+            'bytes': len(body),
+            'sql_ms': cpu_ms(sql, repeat),
+            'reference_ms': cpu_ms(reference, repeat),
+            'fast_ms': cpu_ms(fast, repeat),
+        }
+    result = {key: round(value, 3) for key, value in result.items()}
+    # Serialization alone: what each path spends beyond the SQL
+    reference_extra = max(result['reference_ms'] - result['sql_ms'], 0.001)
+    fast_extra = max(result['fast_ms'] - result['sql_ms'], 0.001)
+    result['speedup'] = round(result['reference_ms'] / result['fast_ms'], 2)
+    result['serialize_speedup'] = round(reference_extra / fast_extra, 2)
+    return result
+
+
+def measure(repeat):
+    """Run every case against the database in CHORES_DB_PATH; returns {case: result}."""
+    from app import create_app
+    app = create_app()
+    return {name: run_case(app, path, repeat) for name, path in CASES}
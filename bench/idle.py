@@ -0,0 +1,79 @@
+"""Idle-connection soak: hold open SSE streams and watch the server's memory.
+
+Streams to /api/events are opened in steps. Each one counts only once its
+first message has arrived, so the server has really taken it on. After
+every step the resident memory of the server's processes is sampled and
+a board request is timed, to show the server still answers.
+"""
+import http.client
+import subprocess
+import socket
+import time
+
+STREAM_REQUEST = b'GET /api/events HTTP/1.1\r\nHost: bench\r\nAccept: text/event-stream\r\n\r\n'
+
+
+def open_stream(port, timeout):
+    """Open one SSE stream and wait for its first message."""
+    sock = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+    try:
+        sock.sendall(STREAM_REQUEST)
+        received = b''
+        while b'retry:' not in received:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("stream closed before its first message")
+            received += chunk
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def resident_kib(pid):
+    """Resident memory of pid and its child processes (gunicorn workers), in KiB."""
+    output = subprocess.run(['ps', '-axo', 'pid=,ppid=,rss='],
+                            capture_output=True, text=True, check=True).stdout
+    rows = [tuple(int(field) for field in line.split()) for line in output.splitlines() if line.strip()]
+    return sum(rss for child, parent, rss in rows if pid in (child, parent))
+
+
+def board_ms(port, timeout):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        start = time.perf_counter()
+        conn.request('GET', '/api/board')
+        conn.getresponse().read()
+        return round((time.perf_counter() - start) * 1000, 2)
+    finally:
+        conn.close()
+
+
+def soak(port, pid, connections, step, timeout=10):
+    """Open up to connections streams; returns one sample per step.
+
+    Stops early, recording the error, when the server stops accepting
+    streams within timeout seconds.
+    """
+    streams = []
+    samples = [{'connections': 0, 'rss_kib': resident_kib(pid), 'board_ms': board_ms(port, timeout)}]
+    try:
+        while len(streams) < connections:
+            for _ in range(min(step, connections - len(streams))):
+                try:
+                    streams.append(open_stream(port, timeout))
+                except OSError as e:
+                    samples.append({'connections': len(streams), 'error': str(e) or type(e).__name__})
+                    return samples
+            sample = {'connections': len(streams), 'rss_kib': resident_kib(pid)}
+            try:
+                sample['board_ms'] = board_ms(port, timeout)
+            except OSError as e:
+                sample['error'] = str(e) or type(e).__name__
+                samples.append(sample)
+                return samples
+            samples.append(sample)
+    finally:
+        for sock in streams:
+            sock.close()
+    return samples
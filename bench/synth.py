@@ -0,0 +1,129 @@
+"""Synthetic household databases at several scales."""
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import random
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'server'))
+
+import bcrypt
+
+import database
+
+# children, chores per child and years of history
+SCALES = {
+    'small': {'children': 2, 'chores': 8, 'years': 1},
+    'medium': {'children': 4, 'chores': 15, 'years': 3},
+    'large': {'children': 8, 'chores': 30, 'years': 5},
+}
+
+# Share of chores per frequency, and how often each period gets done
+FREQUENCY_MIX = [('daily', 0.6), ('weekly', 0.25), ('monthly', 0.1), ('oneoff', 0.05)]
+COMPLETION_RATE = {'daily': 0.8, 'weekly': 0.85, 'monthly': 0.9, 'oneoff': 0.9}
+# Share of chores that were deleted (soft) at some point
+RETIRED_RATE = 0.1
+
+PIN = '1234'
+NAMES = ['Ada', 'Ben', 'Cleo', 'Dev', 'Eli', 'Fay', 'Gus', 'Hana', 'Ivo', 'June']
+TITLES = ['Make bed', 'Dishes', 'Feed cat', 'Homework', 'Tidy room', 'Trash',
+          'Laundry', 'Water plants', 'Vacuum', 'Set table', 'Walk dog', 'Read']
+
+BATCH_SIZE = 10000
+
+
+def period_days(frequency, first, last):
+    """Yield (period_start, period_end) for each period from first to last."""
+    day = first
+    while day <= last:
+        if frequency == 'weekly':
+            start = day - timedelta(days=day.weekday())
+            end = start + timedelta(days=6)
+        elif frequency == 'monthly':
+            start = day.replace(day=1)
+            end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        else:
+            start = end = day
+        yield max(start, first), min(end, last)
+        day = end + timedelta(days=1)
+
+
+def completed_at(rng, day):
+    """A plausible completion time: mornings and after school."""
+    hour = rng.choice([7, 7, 8, 15, 16, 17, 18, 19])
+    return datetime.combine(day, datetime.min.time()).replace(
+        hour=hour, minute=rng.randrange(60), second=rng.randrange(60)
+    ).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def generate(path, scale='medium', seed=1, today=None):
+    """Create a database at path for a scale; returns row counts."""
+    params = SCALES[scale]
+    rng = random.Random(seed)
+    today = today or date.today()
+    first = today - timedelta(days=365 * params['years'])
+
+    path = Path(path)
+    for stale in (path, path.with_name('chores-archive.db')):
+        stale.unlink(missing_ok=True)
+    database.DB_PATH = path
+    database.init_db()
+
+    conn = database.connect()
+    children, chores, completions = [], [], []
+    for i in range(params['children']):
+        child_id = i + 1
+        children.append((child_id, NAMES[i % len(NAMES)], i + 1, f"{first} 09:00:00"))
+        for j in range(params['chores']):
+            chore_id = len(chores) + 1
+            frequency = rng.choices(*zip(*FREQUENCY_MIX))[0]
+            created = first
+            if frequency == 'oneoff':
+                created = first + timedelta(days=rng.randrange((today - first).days + 1))
+            retired = rng.random() < RETIRED_RATE
+            # One-off chores stop showing once done, as the sweeper would leave them
+            active = not retired and not (frequency == 'oneoff' and created < today)
+            chores.append((chore_id, child_id, f"{rng.choice(TITLES)} {j + 1}", frequency,
+                           j + 1, int(active), f"{created} 09:00:00"))
+
+            last = today if not retired else first + timedelta(days=rng.randrange((today - first).days + 1))
+            if frequency == 'oneoff':
+                periods = [(created, min(created + timedelta(days=1), today))]
+            else:
+                periods = period_days(frequency, created, last)
+            for start, end in periods:
+                if rng.random() < COMPLETION_RATE[frequency]:
+                    day = start + timedelta(days=rng.randrange((end - start).days + 1))
+                    completions.append((chore_id, day.isoformat(), completed_at(rng, day)))
+
+    conn.executemany(
+        "INSERT INTO children (id, name, display_order, created_at) VALUES (?, ?, ?, ?)", children)
+    conn.executemany(
+        "INSERT INTO chores (id, child_id, title, frequency, display_order, is_active, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)", chores)
+    for i in range(0, len(completions), BATCH_SIZE):
+        conn.executemany(
+            "INSERT INTO chore_completions (chore_id, date, completed_at) VALUES (?, ?, ?)",
+            completions[i:i + BATCH_SIZE])
+    pin_hash = bcrypt.hashpw(PIN.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('pin_hash', ?)", [pin_hash])
+    conn.commit()
+
+    # Derived tables, then the state the daily sweeper would leave behind
+    from archive import DEFAULT_ARCHIVE_DAYS, archive_old_data, compact
+    from period_state import rebuild_period_state
+    from rollups import rebuild_rollups
+    with conn:
+        rebuild_period_state(conn)
+        rebuild_rollups(conn)
+    # As a deployment with archiving turned on
+    archived = archive_old_data(conn, DEFAULT_ARCHIVE_DAYS)
+    compact(conn, full=True)
+    conn.execute("PRAGMA optimize")
+    conn.close()
+
+    return {
+        'children': len(children),
+        'chores': len(chores),
+        'completions': len(completions),
+        'archived_completions': archived[0],
+    }
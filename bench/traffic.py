@@ -0,0 +1,227 @@
+"""Traffic mixes and the replay loop, in-process or over HTTP."""
+from collections import defaultdict
+import http.client
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .synth import PIN
+
+# Operation weights per mix
+MIXES = {
+    # Tablets on the wall polling the board, kids ticking chores off
+    'kiosk': {'board': 55, 'child_chores': 15, 'complete': 15, 'uncomplete': 5,
+              'history': 4, 'stats': 4, 'pin': 2},
+    # Everyone finishing their morning chores at once
+    'morning': {'board': 30, 'child_chores': 20, 'complete': 35, 'uncomplete': 10,
+                'history': 2, 'stats': 2, 'pin': 1},
+    # Several tablets tapping at once; write contention
+    'burst': {'board': 10, 'complete': 60, 'uncomplete': 30},
+    # A parent looking through reports
+    'parent': {'board': 20, 'child_chores': 10, 'complete': 5, 'uncomplete': 5,
+               'history': 35, 'stats': 20, 'pin': 5},
+}
+
+
+class InProcessClient:
+    """Sends requests straight to the Flask app through its test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        response = self.client.open(path, method=method, json=body, headers=headers or {})
+        return response.status_code, response.headers, response.get_data()
+
+    def close(self):
+        pass
+
+
+class HttpClient:
+    """Sends requests over one keep-alive HTTP connection."""
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=30)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        self.conn.request(method, path, body=data, headers=headers)
+        response = self.conn.getresponse()
+        return response.status, response.headers, response.read()
+
+    def close(self):
+        self.conn.close()
+
+
+class Household:
+    """What a client knows about the data: children, chores and a parent token."""
+
+    def __init__(self, client):
+        status, _, body = client.request('GET', '/api/board')
+        board = json.loads(body)['children']
+        self.children = [child['id'] for child in board]
+        self.chores = {child['id']: [c['id'] for c in child['chores']] for child in board}
+        status, _, body = client.request('POST', '/api/auth/verify-pin', {'pin': PIN})
+        self.token = json.loads(body).get('token', '')
+
+
+class Session:
+    """One simulated device: its own connection, random stream and ETags."""
+
+    def __init__(self, client, household, rng):
+        self.client = client
+        self.household = household
+        self.rng = rng
+        self.etags = {}
+
+    def get(self, path):
+        headers = {}
+        if path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        status, response_headers, _ = self.client.request('GET', path, headers=headers)
+        if response_headers.get('ETag'):
+            self.etags[path] = response_headers['ETag']
+        return status
+
+    def pick_chores(self):
+        chores = self.household.chores[self.rng.choice(self.household.children)]
+        return self.rng.sample(chores, min(len(chores), self.rng.randint(1, 4)))
+
+    # Each operation returns (endpoint, status); endpoint is the route rule,
+    # so it matches the labels in /api/metrics
+
+    def board(self):
+        return '/api/board', self.get('/api/board')
+
+    def child_chores(self):
+        child_id = self.rng.choice(self.household.children)
+        return '/api/children/<int:child_id>/chores', self.get(f'/api/children/{child_id}/chores')
+
+    def complete(self):
+        status, _, _ = self.client.request(
+            'POST', '/api/chores/complete', {'chore_ids': self.pick_chores()})
+        return '/api/chores/complete', status
+
+    def uncomplete(self):
+        status, _, _ = self.client.request(
+            'POST', '/api/chores/uncomplete', {'chore_ids': self.pick_chores()},
+            headers={'X-Parent-Token': self.household.token})
+        return '/api/chores/uncomplete', status
+
+    def history(self):
+        days = self.rng.choice([7, 14, 30])
+        return '/api/history', self.get(f'/api/history?days={days}')
+
+    def stats(self):
+        return '/api/stats', self.get('/api/stats?days=30')
+
+    def pin(self):
+        status, _, _ = self.client.request('POST', '/api/auth/verify-pin', {'pin': PIN})
+        return '/api/auth/verify-pin', status
+
+
+def replay(make_client, mix, requests, concurrency, seed=1):
+    """Replay requests operations from a mix; returns per-request samples and wall time.
+
+    Each of concurrency threads acts as one device with its own client.
+    Samples are (endpoint, status, seconds).
+    """
+    weights = MIXES[mix]
+    operations, operation_weights = zip(*weights.items())
+    setup = make_client()
+    household = Household(setup)
+    setup.close()
+
+    samples = []
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = make_client()
+        session = Session(client, household, rng)
+        local = []
+        try:
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+                operation = rng.choices(operations, weights=operation_weights)[0]
+                start = time.perf_counter()
+                endpoint, status = getattr(session, operation)()
+                local.append((endpoint, status, time.perf_counter() - start))
+        finally:
+            client.close()
+            with lock:
+                samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def sql_statements(client):
+    """Scrape SQL statements and requests per route from /api/metrics."""
+    _, _, body = client.request('GET', '/api/metrics')
+    counts = defaultdict(int)
+    for route, value in re.findall(
+            r'^chores_http_sql_statements_total\{route="([^"]*)"\} (\d+)$', body.decode(), re.M):
+        counts[route] = int(value)
+    return counts
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(samples, elapsed, sql_before, sql_after):
+    """Per-endpoint throughput, latency percentiles (ms) and SQL per request."""
+    by_endpoint = defaultdict(list)
+    errors = defaultdict(int)
+    for endpoint, status, seconds in samples:
+        by_endpoint[endpoint].append(seconds)
+        if status >= 400:
+            errors[endpoint] += 1
+
+    endpoints = {}
+    for endpoint, latencies in sorted(by_endpoint.items()):
+        latencies.sort()
+        statements = sql_after.get(endpoint, 0) - sql_before.get(endpoint, 0)
+        endpoints[endpoint] = {
+            'requests': len(latencies),
+            'errors': errors[endpoint],
+            'rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'sql_per_request': round(statements / len(latencies), 2),
+        }
+
+    latencies = sorted(seconds for _, _, seconds in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(errors.values()),
+        'seconds': round(elapsed, 3),
+        'rps': round(len(samples) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'endpoints': endpoints,
+    }
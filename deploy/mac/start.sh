@@ -1,6 +1,6 @@
 #!/bin/bash
 # Start Chores App on Mac with mDNS registration
-# This script starts the Flask server and registers it as chores.local
+# This script starts the server (server/serve.py) and registers it as chores.local
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 APP_DIR="$(dirname "$(dirname "$SCRIPT_DIR")")"
@@ -12,7 +12,7 @@ if [ -d "venv" ]; then
     source venv/bin/activate
 fi
 
-# Start the Flask server
+# Start the server
 echo "Starting Chores App..."
 echo "Access locally at: http://localhost:8080"
 echo "Access from iPad at: http://chores.local:8080"
@@ -33,5 +33,5 @@ cleanup() {
 }
 trap cleanup SIGINT SIGTERM
 
-# Run the server
-python server/app.py
+# Run the server (use python server/app.py for the development server)
+python server/serve.py
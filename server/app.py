@@ -1,4 +1,4 @@
-from flask import Flask, send_from_directory
+from flask import Flask, abort, current_app, jsonify, request
 from pathlib import Path
 import os
 import sys
@@ -6,36 +6,125 @@ import sys
 # Add server directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from database import init_db
-from routes import auth, children, chores, history
+from assets import AssetManifest, send_asset
+from cache import cache
+from database import init_app, init_db, pool_stats
+import households
+import metrics
+from routes import auth, children, chores, events, history, settings, stats, sync, transfer
+from routes.auth import parent_session_valid
 
-app = Flask(__name__, static_folder=str(Path(__file__).parent.parent / 'static'))
+STATIC_FOLDER = str(Path(__file__).parent.parent / 'static')
+
+# Requests from these addresses may read the monitoring endpoints
+LOCAL_ADDRESSES = {'127.0.0.1', '::1'}
+
+# API blueprints and where they are mounted
+BLUEPRINTS = [
+    (auth.bp, '/api/auth'),
+    (children.bp, '/api/children'),
+    (chores.bp, '/api'),
+    (history.bp, '/api/history'),
+    (settings.bp, '/api/settings'),
+    (events.bp, '/api/events'),
+    (stats.bp, '/api/stats'),
+    (sync.bp, '/api/sync'),
+    (transfer.bp, '/api'),
+]
 
 
-# Serve static files
-@app.route('/')
 def serve_index():
-    return send_from_directory(app.static_folder, 'index.html')
+    assets = current_app.extensions['assets']
+    if current_app.debug:
+        assets.refresh()
+    return send_asset(*assets.lookup('index.html'))
 
 
-@app.route('/<path:path>')
 def serve_static(path):
-    # Try to serve the exact file
-    file_path = Path(app.static_folder) / path
-    if file_path.is_file():
-        return send_from_directory(app.static_folder, path)
+    assets = current_app.extensions['assets']
+    if current_app.debug:
+        assets.refresh()
+    entry = assets.lookup(path)
+    if entry:
+        return send_asset(*entry)
+    # Unknown API routes and missing files are real 404s
+    if path.startswith('api/') or '.' in path.rsplit('/', 1)[-1]:
+        abort(404)
     # For SPA routing, serve index.html for non-file routes
-    return send_from_directory(app.static_folder, 'index.html')
+    return send_asset(*assets.lookup('index.html'))
+
+
+def monitoring_allowed():
+    """Monitoring is for requests from the machine itself, or a parent.
+
+    In multi-household mode the endpoints answer for every household, so
+    no single household's PIN opens them.
+    """
+    if request.remote_addr in LOCAL_ADDRESSES:
+        return True
+    return not households.ENABLED and parent_session_valid()
+
+
+def cache_stats():
+    if not monitoring_allowed():
+        abort(403)
+    return jsonify(cache.stats())
+
+
+def metrics_endpoint():
+    if not monitoring_allowed():
+        abort(403)
+    stats = cache.stats()
+    pool = pool_stats()
+    return metrics.metrics_response([
+        ('chores_cache_hits_total', 'counter', 'Read cache hits.', stats['hits']),
+        ('chores_cache_misses_total', 'counter', 'Read cache misses.', stats['misses']),
+        ('chores_cache_entries', 'gauge', 'Entries in the read cache.', stats['size']),
+        ('chores_household_databases_open', 'gauge',
+         'Household databases with an open connection.', pool['databases']),
+        ('chores_household_connections_open', 'gauge',
+         'Open connections to household databases.', pool['connections']),
+    ])
+
+
+def create_app():
+    """Build the Flask app, bringing the database schema up to date first.
+
+    Under gunicorn --preload ('app:create_app()') this runs once, in the
+    master: migrations are applied before any worker starts, and the
+    workers share the loaded modules and static assets copy-on-write.
+    Database connections, caches and background threads belong to each
+    process and are only created on first use, after the fork.
+    """
+    # Household databases are migrated the first time they are opened
+    if not households.ENABLED:
+        init_db()
+
+    app = Flask(__name__, static_folder=STATIC_FOLDER)
+    init_app(app)
+    metrics.init_app(app)
+    households.init_app(app)
+
+    # Serve static files from the in-memory manifest
+    app.extensions['assets'] = AssetManifest(app.static_folder)
+    app.add_url_rule('/', view_func=serve_index)
+    app.add_url_rule('/<path:path>', view_func=serve_static)
+    app.add_url_rule('/api/cache/stats', view_func=cache_stats)
+    app.add_url_rule('/api/metrics', view_func=metrics_endpoint)
+
+    for blueprint, url_prefix in BLUEPRINTS:
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+    return app
 
 
-# Register API blueprints
-app.register_blueprint(auth.bp, url_prefix='/api/auth')
-app.register_blueprint(children.bp, url_prefix='/api/children')
-app.register_blueprint(chores.bp, url_prefix='/api')
-app.register_blueprint(history.bp, url_prefix='/api/history')
+def __getattr__(name):
+    # 'app:app' (gunicorn without --preload, the benchmarks) builds the app on first use
+    if name == 'app':
+        app = globals()['app'] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == '__main__':
-    init_db()
     print("Starting Chores App on http://0.0.0.0:8080")
-    app.run(host='0.0.0.0', port=8080, debug=True)
+    create_app().run(host='0.0.0.0', port=8080, debug=True)
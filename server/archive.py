@@ -0,0 +1,214 @@
+"""Archival of old completions and retired chores into a cold database.
+
+Completions older than the horizon, and inactive chores with no history
+left in the main database, are moved into an attached archive database
+(chores-archive.db next to chores.db). The main database keeps only the
+working set the board, stats and recent history read. History requests
+that reach past the horizon union the archive back in; see
+routes/history.py. Rollups are not archived: the horizon is always longer
+than the longest stats window.
+
+Archiving is opt-in: the one-off sweeper runs archive_old_data() once a
+day only if CHORES_ARCHIVE_DAYS is set. The command line archives
+whenever it is run, and also converts the main database to incremental
+auto-vacuum on first use.
+
+Usage: python server/archive.py run [--days N]
+"""
+from datetime import timedelta
+from pathlib import Path
+import argparse
+import os
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import database
+from schedules import local_today, read_calendar
+
+# Completions older than this many days are archived daily (0, the default, turns it off)
+ARCHIVE_DAYS = int(os.environ.get('CHORES_ARCHIVE_DAYS', 0))
+# Horizon of a run from the command line when CHORES_ARCHIVE_DAYS is not set
+DEFAULT_ARCHIVE_DAYS = 400
+# Stats read up to 53 weeks of rollups, which must stay in the main database
+MIN_ARCHIVE_DAYS = 372
+
+# Settings key holding the date before which completions live in the archive
+HORIZON_KEY = 'archive_before'
+
+ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS archive.chores (
+        id INTEGER PRIMARY KEY,
+        child_id INTEGER NOT NULL,
+        title TEXT NOT NULL,
+        frequency TEXT DEFAULT 'daily',
+        display_order INTEGER DEFAULT 0,
+        is_active BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS archive.chore_completions (
+        id INTEGER PRIMARY KEY,
+        chore_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        completed_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_completions_date "
+    "ON chore_completions(date, chore_id, completed_at)",
+]
+
+
+def archive_path():
+    """Path of the archive database, next to the main database."""
+    return Path(database.current_path()).with_name('chores-archive.db')
+
+
+def attach_archive(conn, create=False):
+    """Attach the archive to conn as 'archive'; returns False if there is none.
+
+    Must be called outside a transaction. With create, a missing archive is
+    created (with incremental auto-vacuum) along with its tables.
+    """
+    attached = [row[1] for row in conn.execute("PRAGMA database_list")]
+    if 'archive' not in attached:
+        path = archive_path()
+        if not create and not path.exists():
+            return False
+        conn.execute("ATTACH DATABASE ? AS archive", [str(path)])
+        if create:
+            # Only takes effect while the archive is still empty
+            conn.execute("PRAGMA archive.auto_vacuum = INCREMENTAL")
+    if create:
+        for sql in ARCHIVE_SCHEMA:
+            conn.execute(sql)
+        conn.commit()
+    return True
+
+
+def get_archive_horizon(conn):
+    """Get the date (ISO string) before which completions are archived, or None."""
+    row = conn.execute("SELECT value FROM settings WHERE key = ?", [HORIZON_KEY]).fetchone()
+    return row['value'] if row else None
+
+
+def archive_old_data(conn, days=ARCHIVE_DAYS):
+    """Move completions older than days, and retired chores, into the archive.
+
+    Returns (completions, chores) moved. Runs in one write transaction, so
+    readers see either the old or the new split, never both or neither.
+    """
+    if days <= 0:
+        return 0, 0
+    # Days in the household's timezone, as completion dates are
+    today = local_today(read_calendar(conn))
+    cutoff = (today - timedelta(days=max(days, MIN_ARCHIVE_DAYS))).isoformat()
+
+    # Deleted chores whose whole history is (or is about to be) archived
+    retired = """
+        FROM main.chores c
+        WHERE c.is_active = 0
+          AND NOT EXISTS (
+              SELECT 1 FROM main.chore_completions cc
+              WHERE cc.chore_id = c.id AND cc.date >= :cutoff
+          )
+    """
+    pending = conn.execute(f"""
+        SELECT EXISTS (SELECT 1 FROM main.chore_completions WHERE date < :cutoff)
+            OR EXISTS (SELECT 1 {retired})
+    """, {'cutoff': cutoff}).fetchone()[0]
+    if not pending:
+        return 0, 0
+    attach_archive(conn, create=True)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Keep a copy of every chore the archived history refers to
+        conn.execute("""
+            INSERT INTO archive.chores
+                (id, child_id, title, frequency, display_order, is_active, created_at)
+            SELECT id, child_id, title, frequency, display_order, is_active, created_at
+            FROM main.chores c
+            WHERE EXISTS (
+                SELECT 1 FROM main.chore_completions cc
+                WHERE cc.chore_id = c.id AND cc.date < ?
+            )
+            ON CONFLICT (id) DO UPDATE SET
+                title = excluded.title,
+                frequency = excluded.frequency,
+                display_order = excluded.display_order,
+                is_active = excluded.is_active
+        """, [cutoff])
+        completions = conn.execute("""
+            INSERT OR IGNORE INTO archive.chore_completions (id, chore_id, date, completed_at)
+            SELECT id, chore_id, date, completed_at
+            FROM main.chore_completions
+            WHERE date < ?
+        """, [cutoff]).rowcount
+        conn.execute("DELETE FROM main.chore_completions WHERE date < ?", [cutoff])
+        conn.execute("DELETE FROM main.chore_period_state WHERE period_start < ?", [cutoff])
+
+        conn.execute(f"""
+            INSERT INTO archive.chores
+                (id, child_id, title, frequency, display_order, is_active, created_at)
+            SELECT id, child_id, title, frequency, display_order, is_active, created_at
+            {retired}
+            ON CONFLICT (id) DO UPDATE SET is_active = excluded.is_active
+        """, {'cutoff': cutoff})
+        chores = conn.execute(
+            f"DELETE FROM main.chores WHERE id IN (SELECT c.id {retired})", {'cutoff': cutoff}
+        ).rowcount
+
+        conn.execute("""
+            INSERT INTO settings (key, value) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)
+        """, [HORIZON_KEY, cutoff])
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    return completions, chores
+
+
+def compact(conn, full=False):
+    """Return free pages to the filesystem and refresh planner statistics.
+
+    With incremental auto-vacuum this only releases the free pages. A
+    database created without it is rewritten once by a full VACUUM, but
+    only when full is set, since that locks the database while it runs.
+    """
+    auto_vacuum = conn.execute("PRAGMA main.auto_vacuum").fetchone()[0]
+    if auto_vacuum == 2:
+        conn.execute("PRAGMA main.incremental_vacuum").fetchall()
+    elif full:
+        conn.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM main")
+    if 'archive' in [row[1] for row in conn.execute("PRAGMA database_list")]:
+        conn.execute("PRAGMA archive.incremental_vacuum").fetchall()
+    for table in ('chores', 'chore_completions', 'chore_period_state'):
+        conn.execute(f"ANALYZE main.{table}")
+    conn.commit()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Archive old chore history.")
+    parser.add_argument('command', choices=['run'])
+    parser.add_argument('--days', type=int, default=ARCHIVE_DAYS or DEFAULT_ARCHIVE_DAYS,
+                        help=f"archive completions older than this (minimum {MIN_ARCHIVE_DAYS})")
+    args = parser.parse_args(argv[1:])
+
+    database.migrate_db()
+    conn = database.connect()
+    try:
+        completions, chores = archive_old_data(conn, args.days)
+        compact(conn, full=True)
+    finally:
+        conn.close()
+    print(f"Archived {completions} completions and {chores} chores to {archive_path()}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
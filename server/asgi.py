@@ -0,0 +1,323 @@
+"""ASGI entry point, for holding many long-lived connections in one process.
+
+The Flask app runs unchanged, each request on a bounded pool of
+CHORES_ASGI_THREADS threads, so SQLite and bcrypt never block the event
+loop and a process opens at most that many database connections. Streamed
+responses (exports, streamed history) are pulled from the pool one chunk
+at a time, so a slow client only holds a thread while its next chunk is
+being read. Successive chunks may be read on different threads, so a
+streamed view reads from a connection of its own, never from get_db()'s
+connection, which belongs to whichever request its thread serves next.
+
+/api/events is served here instead of by its Flask view: each open SSE
+stream is a coroutine waiting on this process's EventHub rather than a
+thread, so tablets left open on the board cost a few kilobytes each.
+In multi-household mode the stream's household is found the same way
+households.py routes every other request.
+
+Serve with server/serve.py.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs
+import asyncio
+import os
+import sys
+import tempfile
+import weakref
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app import create_app
+from database import get_db, release_db, use_database
+from events import events_since, get_hub
+import households
+from routes.events import (HEARTBEAT_INTERVAL, HEARTBEAT_MESSAGE, RETRY_MESSAGE,
+                           STREAM_HEADERS, format_event, parse_last_event_id, resume_from)
+
+# Threads running Flask views (and so SQLite connections) per process
+THREADS = int(os.environ.get('CHORES_ASGI_THREADS', 8))
+# Request bodies larger than this (bytes) are spooled to a temporary file
+SPOOL_MAX_SIZE = 1024 * 1024
+
+EVENTS_PATH = '/api/events'
+
+executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='asgi')
+wsgi_app = create_app()
+
+
+def run_sync(func, *args):
+    """Run a blocking call on the thread pool."""
+    return asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+def in_database(path, func, *args):
+    """Call func against the database at path (None for the default) and let go of it."""
+    with use_database(path):
+        try:
+            return func(*args)
+        finally:
+            release_db()
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+# Flask requests
+
+async def read_body(receive):
+    """Read the request body into a file; returns None if the client went away."""
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            body.seek(0)
+            return body
+
+
+def build_environ(scope, body, length):
+    """Translate an ASGI HTTP scope into a WSGI environ."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        value = value.decode('latin-1')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    # The body has been read in full, so its length is known even if it was chunked
+    environ['CONTENT_LENGTH'] = str(length)
+    return environ
+
+
+def start_response(environ):
+    """Call the Flask app; returns (status, headers, chunks, body).
+
+    Empty responses and those with a Content-Length are read in full here,
+    in one trip to the pool, and chunks is None. Otherwise body is the first chunk and the
+    rest are pulled with next_chunk().
+    """
+    started = {}
+
+    def start(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = headers
+
+    chunks = wsgi_app(environ, start)
+    iterator = iter(chunks)
+    first = next(iterator, None)
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+               for name, value in started['headers']]
+    if first is None or any(name == b'content-length' for name, _ in headers):
+        body = b''.join([first or b'', *iterator])
+        close(chunks)
+        return started['status'], headers, None, body
+    return started['status'], headers, (chunks, iterator), first
+
+
+def next_chunk(chunks, iterator):
+    """Get the next chunk of a streamed response, or None once it is finished."""
+    chunk = next(iterator, None)
+    if chunk is None:
+        close(chunks)
+    return chunk
+
+
+def close(chunks):
+    if hasattr(chunks, 'close'):
+        chunks.close()
+
+
+async def call_wsgi(scope, receive, send):
+    body = await read_body(receive)
+    if body is None:
+        return
+    try:
+        length = body.seek(0, os.SEEK_END)
+        body.seek(0)
+        status, headers, stream, chunk = await run_sync(
+            start_response, build_environ(scope, body, length))
+    finally:
+        # Views have read everything they need once the response has started
+        body.close()
+
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    if stream is None:
+        await send({'type': 'http.response.body', 'body': chunk})
+        return
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if disconnected.done():
+                await run_sync(close, stream[0])
+                return
+            chunk = await run_sync(next_chunk, *stream)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+
+
+# Server-Sent Events
+
+class EventFeed:
+    """Wakes the SSE streams on this process's event loop when a hub has news."""
+
+    def __init__(self, hub, loop):
+        self.changed = asyncio.Event()
+        hub.subscribe(lambda: loop.call_soon_threadsafe(self.notify))
+
+    def notify(self):
+        # Wake every stream waiting on this generation and start the next
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+# One feed per hub; a feed goes away with its hub once that has stopped
+_feeds = weakref.WeakKeyDictionary()
+
+
+async def get_feed(path):
+    """Get the hub for a database and its EventFeed, starting the hub on first use."""
+    hub = await run_sync(in_database, path, get_hub)
+    feed = _feeds.get(hub)
+    if feed is None:
+        feed = _feeds[hub] = EventFeed(hub, asyncio.get_running_loop())
+    return hub, feed
+
+
+def resume_at(last_id):
+    return resume_from(get_db(), last_id)
+
+
+def catch_up(last_seen):
+    return events_since(get_db(), last_seen)
+
+
+async def pending_events(hub, last_seen):
+    """Get the events after last_seen without blocking the loop."""
+    events = hub.wait_for(last_seen, 0)
+    if events is None:
+        # Fell behind the hub's in-memory window; catch up from the log
+        events = await run_sync(in_database, hub.path, catch_up, last_seen)
+    return events
+
+
+def events_database(scope):
+    """Get (served, path) for an SSE request in multi-household mode.
+
+    served is False when the stream should go to the Flask app instead,
+    which answers for unknown or moving households.
+    """
+    headers = dict(scope['headers'])
+    token = households.request_token(
+        headers.get(b'x-household-token', b'').decode('latin-1'),
+        scope['query_string'].decode('latin-1'))
+    household, path = households.route(
+        headers.get(b'host', b'').decode('latin-1'), scope['path'], token)
+    if household is None or household.moving or path != EVENTS_PATH:
+        return False, None
+    return True, household.database
+
+
+async def stream_events(scope, receive, send, path=None):
+    """Stream change events; the same protocol as routes/events.py."""
+    headers = dict(scope['headers'])
+    last_id = parse_last_event_id(
+        headers.get(b'last-event-id', b'').decode('latin-1')
+        or parse_qs(scope['query_string'].decode('latin-1')).get('last_event_id', [None])[0])
+
+    hub, feed = await get_feed(path)
+    last_seen, messages = await run_sync(in_database, path, resume_at, last_id)
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream; charset=utf-8'),
+        *((name.lower().encode('latin-1'), value.encode('latin-1'))
+          for name, value in STREAM_HEADERS.items()),
+    ]})
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        message = RETRY_MESSAGE + ''.join(messages)
+        # A stopped hub's database has moved; the client reconnects to the new one
+        while not hub.stopped.is_set():
+            await send({'type': 'http.response.body', 'body': message.encode('utf-8'),
+                        'more_body': True})
+            # Take the generation before looking, so a notify in between isn't lost
+            changed = feed.changed
+            events = await pending_events(hub, last_seen)
+            if not events:
+                waiter = asyncio.ensure_future(changed.wait())
+                try:
+                    await asyncio.wait([waiter, disconnected], timeout=HEARTBEAT_INTERVAL,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                if disconnected.done():
+                    return
+                events = await pending_events(hub, last_seen)
+            if events:
+                message = ''.join(format_event(*event) for event in events)
+                last_seen = events[-1][0]
+            else:
+                message = HEARTBEAT_MESSAGE
+        await send({'type': 'http.response.body', 'body': b''})
+    except asyncio.CancelledError:
+        # Cancelled at shutdown; end the stream so the client reconnects
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+
+
+# Entry point
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http':
+        served, path = False, None
+        if scope['method'] == 'GET' and scope['path'].endswith(EVENTS_PATH):
+            if households.ENABLED:
+                served, path = await run_sync(events_database, scope)
+            else:
+                served = scope['path'] == EVENTS_PATH
+        if served:
+            await stream_events(scope, receive, send, path)
+        else:
+            await call_wsgi(scope, receive, send)
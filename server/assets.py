@@ -0,0 +1,144 @@
+"""Fingerprinted, precompressed static assets served from memory.
+
+At startup every file under static/ is read once, given a content-hashed
+name (js/app.js -> js/app.3b1f0c9a2d4e.js) and compressed with gzip, plus
+brotli when the optional brotli package is installed. index.html is
+rewritten to reference the hashed names, so those can be cached forever
+(Cache-Control: immutable) while index.html itself is revalidated by
+ETag. Requests are answered from the in-memory manifest without touching
+the filesystem.
+"""
+import gzip
+import hashlib
+import mimetypes
+import re
+import threading
+from pathlib import Path
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    # Optional: gzip is always available
+    brotli = None
+
+STATIC_DIR = Path(__file__).parent.parent / 'static'
+INDEX = 'index.html'
+
+# Fingerprinted names change whenever the content does
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Everything else must be revalidated, which is cheap with an ETag
+REVALIDATE = 'no-cache'
+
+# Smaller files aren't worth a Content-Encoding
+MIN_COMPRESS_SIZE = 256
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# Local src/href references in index.html
+ASSET_REF = re.compile(r'(src|href)="/([^"?#]+)"')
+
+
+class Asset:
+    """One static file: its body in each encoding and its validators."""
+
+    __slots__ = ('content_type', 'bodies', 'digest')
+
+    def __init__(self, body, content_type):
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        self.bodies = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.bodies['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.bodies['br'] = compressed
+
+    def encoding_for(self, accept_encodings):
+        """Pick the smallest encoding the client accepts."""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+
+def fingerprint(path, digest):
+    """Insert digest before the extension: js/app.js -> js/app.<digest>.js."""
+    stem, dot, ext = path.rpartition('.')
+    if not dot or '/' in ext:
+        return f"{path}.{digest}"
+    return f"{stem}.{digest}.{ext}"
+
+
+def guess_content_type(path):
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type == 'application/javascript':
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+class AssetManifest:
+    """Maps request paths to (asset, immutable) for everything under static/."""
+
+    def __init__(self, static_dir=STATIC_DIR):
+        self.static_dir = Path(static_dir)
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.urls = {}
+        self.mtimes = {}
+        self.build()
+
+    def scan(self):
+        """Get {relative path: mtime} for every file under static/."""
+        return {
+            file.relative_to(self.static_dir).as_posix(): file.stat().st_mtime_ns
+            for file in self.static_dir.rglob('*')
+            if file.is_file() and not file.name.startswith('.')
+        }
+
+    def build(self):
+        """Read, fingerprint and compress every file, then swap in the new manifest."""
+        mtimes = self.scan()
+        entries, urls = {}, {}
+        for path in sorted(mtimes):
+            if path == INDEX:
+                continue
+            asset = Asset((self.static_dir / path).read_bytes(), guess_content_type(path))
+            hashed = fingerprint(path, asset.digest)
+            entries[path] = (asset, False)
+            entries[hashed] = (asset, True)
+            urls[path] = hashed
+
+        if INDEX in mtimes:
+            html = (self.static_dir / INDEX).read_text(encoding='utf-8')
+            html = ASSET_REF.sub(
+                lambda m: f'{m.group(1)}="/{urls.get(m.group(2), m.group(2))}"', html
+            )
+            entries[INDEX] = (Asset(html.encode('utf-8'), guess_content_type(INDEX)), False)
+
+        with self.lock:
+            self.entries, self.urls, self.mtimes = entries, urls, mtimes
+
+    def refresh(self):
+        """Rebuild if any file changed; for development, since it stats every file."""
+        if self.scan() != self.mtimes:
+            self.build()
+
+    def lookup(self, path):
+        return self.entries.get(path or INDEX)
+
+
+def send_asset(asset, immutable):
+    """Build the response for an asset, negotiating Content-Encoding."""
+    encoding = asset.encoding_for(request.accept_encodings)
+    response = Response(asset.bodies[encoding], content_type=asset.content_type)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    # Each encoding is a different representation, so it gets its own tag
+    response.set_etag(asset.digest if encoding == 'identity' else f"{asset.digest}-{encoding}")
+    response.headers['Cache-Control'] = IMMUTABLE if immutable else REVALIDATE
+    return response.make_conditional(request)
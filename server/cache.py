@@ -0,0 +1,192 @@
+"""In-process read cache for data that changes rarely.
+
+Entries expire after a TTL and the least recently used ones are evicted
+once the cache is full. Write paths in this process call invalidate()
+directly. Writes from other workers are noticed through SQLite: triggers
+created by migrate_db() bump the data_versions counters whenever children,
+chores or settings change, and sync() compares them with the version the
+cache was filled at. The counters are only read when PRAGMA data_version
+says another connection has committed something, so the common case costs
+one pragma.
+
+Each database (one per household in multi-household mode) gets its own
+ReadCache; only the most recently used ones are kept.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+import os
+
+from flask import g, has_request_context
+
+from database import current_path, get_data_version, get_db
+
+# Tables whose changes invalidate cached reads
+CACHED_TABLES = ['children', 'chores', 'settings']
+# Databases whose caches are kept; the rest are rebuilt on their next request
+MAX_CACHED_DATABASES = int(os.environ.get('CHORES_MAX_CACHED_DATABASES', 64))
+COUNTERS = ['hits', 'misses', 'evictions', 'invalidations']
+
+_MISSING = object()
+
+
+class ReadCache:
+    """Size-bounded LRU cache with per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize=128, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.version = None
+        self.local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached value for key, or _MISSING."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return _MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss."""
+        self.sync()
+        value = self.get(key)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self):
+        """Drop every entry; called by write paths after they commit."""
+        with self.lock:
+            self.entries.clear()
+            # Force the next sync() to re-read the shared version
+            self.version = None
+            self.invalidations += 1
+
+    def sync(self):
+        """Drop every entry if another connection changed a cached table.
+
+        Checks once per request; later lookups in the same request reuse
+        the answer.
+        """
+        if has_request_context():
+            synced = g.setdefault('synced_caches', set())
+            if id(self) in synced:
+                return
+            synced.add(id(self))
+        conn = get_db()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        # data_version is per connection, so track it per thread
+        if getattr(self.local, 'conn', None) is conn and self.local.data_version == data_version:
+            return
+        self.local.conn = conn
+        self.local.data_version = data_version
+
+        version = get_data_version(CACHED_TABLES)
+        with self.lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                self.entries.clear()
+                self.version = version
+
+    def stats(self):
+        """Counters for monitoring."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class DatabaseCaches:
+    """One ReadCache per database, with the same interface as ReadCache.
+
+    Calls go to the cache of the database the thread is working on (see
+    database.use_database). Past maxdatabases, the caches of the least
+    recently used databases are dropped; their counters are kept so the
+    totals in stats() never go backwards.
+    """
+
+    def __init__(self, maxdatabases=MAX_CACHED_DATABASES, **options):
+        self.maxdatabases = maxdatabases
+        self.options = options
+        self.caches = OrderedDict()
+        self.lock = threading.Lock()
+        self.retired = dict.fromkeys(COUNTERS, 0)
+
+    def current(self):
+        path = current_path()
+        with self.lock:
+            cache = self.caches.get(path)
+            if cache is None:
+                cache = self.caches[path] = ReadCache(**self.options)
+                while len(self.caches) > self.maxdatabases:
+                    _, dropped = self.caches.popitem(last=False)
+                    for name in COUNTERS:
+                        self.retired[name] += getattr(dropped, name)
+            else:
+                self.caches.move_to_end(path)
+        return cache
+
+    def get_or_load(self, key, loader):
+        return self.current().get_or_load(key, loader)
+
+    def invalidate(self):
+        # A database without a cache has nothing to drop
+        with self.lock:
+            cache = self.caches.get(current_path())
+        if cache is not None:
+            cache.invalidate()
+
+    def stats(self):
+        """Counters for monitoring, summed over every database."""
+        with self.lock:
+            caches = list(self.caches.values())
+            totals = dict(self.retired)
+        size = 0
+        for cache in caches:
+            stats = cache.stats()
+            size += stats['size']
+            for name in COUNTERS:
+                totals[name] += stats[name]
+        lookups = totals['hits'] + totals['misses']
+        return {
+            'databases': len(caches),
+            'size': size,
+            'maxsize': caches[0].maxsize if caches else None,
+            'ttl': caches[0].ttl if caches else None,
+            **totals,
+            'hit_rate': round(totals['hits'] / lookups, 4) if lookups else None,
+        }
+
+
+cache = DatabaseCaches()
@@ -1,59 +1,528 @@
+import atexit
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
 import sqlite3
+import threading
+import time
 from pathlib import Path
 
-DB_PATH = Path(__file__).parent.parent / 'data' / 'chores.db'
-SCHEMA_PATH = Path(__file__).parent / 'schema.sql'
+DB_PATH = Path(os.environ.get('CHORES_DB_PATH', Path(__file__).parent.parent / 'data' / 'chores.db'))
 
+# Storage profiles: per-connection pragmas applied by connect().
+# 'wal' lets readers keep going while a completion is being written.
+STORAGE_PROFILES = {
+    'default': {},
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -8000,          # ~8 MB page cache
+        'mmap_size': 64 * 1024 * 1024,
+        'busy_timeout': 5000,         # ms
+    },
+}
+STORAGE_PROFILE = os.environ.get('CHORES_STORAGE_PROFILE', 'default')
+CHECKPOINT_INTERVAL = int(os.environ.get('CHORES_CHECKPOINT_INTERVAL', 300))
+# Idle connections kept open across household databases (see DatabasePool)
+MAX_IDLE_CONNECTIONS = int(os.environ.get('CHORES_MAX_IDLE_CONNECTIONS', 32))
 
-def get_db():
-    """Get a database connection with row factory enabled."""
-    conn = sqlite3.connect(DB_PATH)
+# One long-lived connection per worker thread, reused across requests.
+_local = threading.local()
+
+# In multi-household mode (households.py) each request works on its own
+# household's database, selected with use_database(); otherwise DB_PATH.
+_target = threading.local()
+
+
+def current_path():
+    """Path of the database this thread is working on."""
+    return getattr(_target, 'path', None) or DB_PATH
+
+
+@contextmanager
+def use_database(path):
+    """Point connect(), get_db() and everything built on them at path.
+
+    None (or DB_PATH itself) means the default database.
+    """
+    previous = getattr(_target, 'path', None)
+    _target.path = None if path is None or Path(path) == DB_PATH else Path(path)
+    try:
+        yield
+    finally:
+        _target.path = previous
+
+
+# Optional instrumentation hook (see metrics.py). When set, connections
+# report connection_opened(), query(sql, seconds) for each statement and
+# rows(sql, count, seconds) for each fetch.
+_observer = None
+
+
+def set_observer(observer):
+    """Install the instrumentation observer; affects connections opened later."""
+    global _observer
+    _observer = observer
+
+
+class ObservedCursor(sqlite3.Cursor):
+    """Cursor that reports statement timings and rows fetched to the observer."""
+
+    sql = None
+
+    def execute(self, sql, parameters=()):
+        self.sql = sql
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _observer.query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        self.sql = sql
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _observer.query(sql, time.perf_counter() - start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        _observer.rows(self.sql, row is not None, time.perf_counter() - start)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _observer.rows(self.sql, len(rows), time.perf_counter() - start)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        _observer.rows(self.sql, len(rows), time.perf_counter() - start)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        row = super().__next__()
+        _observer.rows(self.sql, 1, time.perf_counter() - start)
+        return row
+
+
+class ObservedConnection(sqlite3.Connection):
+    """Connection whose execute() shortcuts go through ObservedCursor."""
+
+    def cursor(self, factory=ObservedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect():
+    """Open a new database connection configured for the active storage profile."""
+    path = current_path()
+    if _observer is not None:
+        conn = sqlite3.connect(path, check_same_thread=False, factory=ObservedConnection)
+        _observer.connection_opened()
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
+    for pragma, value in STORAGE_PROFILES[STORAGE_PROFILE].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
     return conn
 
 
-def init_db():
-    """Initialize the database with schema if needed."""
-    DB_PATH.parent.mkdir(exist_ok=True)
-    conn = get_db()
-    with open(SCHEMA_PATH) as f:
-        conn.executescript(f.read())
-    conn.close()
-    # Run migrations for existing databases
-    migrate_db()
+def get_db():
+    """Get this thread's database connection, opening it on first use.
 
+    The connection is shared by every request served on this thread and
+    must not be closed by callers; it goes when the process exits.
+    A household database's connection comes from the pool instead and is
+    only held until release_db().
+    """
+    path = getattr(_target, 'path', None)
+    if path is not None:
+        return _pool.checkout(path)
 
-def migrate_db():
-    """Run database migrations for schema updates."""
-    conn = get_db()
+    conn = getattr(_local, 'conn', None)
+    # A connection inherited across fork() belongs to the parent process
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+
+    conn = connect()
+    _local.conn = conn
+    _local.pid = os.getpid()
+    start_checkpointer()
+    return conn
+
+
+def release_db(exc=None):
+    """Return this thread's connection to a clean state at the end of a request."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid() and conn.in_transaction:
+        conn.rollback()
+    _pool.checkin()
+
+
+def hold_for_stream(response):
+    """Keep a streamed response's household connection checked out until its body is read.
+
+    Flask tears the request down before a streamed body is read, and
+    release_db() would hand the connection to the next request while the
+    body may still read from it. take_stream_connection() gets it back for
+    households.DatabaseIterator, which checks it in once the body is closed.
+    """
+    if response.is_streamed:
+        _local.stream_held = _pool.detach()
+    return response
+
+
+def take_stream_connection():
+    """Get the connection hold_for_stream() kept for this thread's last response, or None."""
+    held = getattr(_local, 'stream_held', None)
+    _local.stream_held = None
+    return held
+
+
+def release_stream_connection(held):
+    """Check in a connection from take_stream_connection()."""
+    if held is not None:
+        _pool.give_back(held)
+
+
+class DatabasePool:
+    """Connections to the household databases, bounded across databases.
+
+    A thread holds one connection at a time: get_db() checks it out and
+    release_db() hands it back at the end of the request. Idle connections
+    are kept for the next request to the same database, up to max_idle in
+    all; past that, those of the least recently used databases are
+    closed, so open connections follow the households in use rather than
+    how many there are. Each database is migrated the first time this
+    process opens it.
+    """
+
+    def __init__(self, max_idle):
+        self.max_idle = max_idle
+        self.pid = os.getpid()
+        self.idle = OrderedDict()
+        self.idle_count = 0
+        self.open = {}
+        self.prepared = set()
+        self.lock = threading.Lock()
+        self.prepare_lock = threading.Lock()
+
+    def reset_after_fork(self):
+        # Connections inherited across fork() belong to the parent process
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.idle.clear()
+            self.idle_count = 0
+            self.open.clear()
+
+    def checkout(self, path):
+        held = getattr(_local, 'held', None)
+        if held is not None and held[2] == os.getpid():
+            if held[0] == path:
+                return held[1]
+            # This thread moved on to another database
+            self.checkin()
+
+        conn = None
+        with self.lock:
+            self.reset_after_fork()
+            conns = self.idle.get(path)
+            if conns:
+                conn = conns.pop()
+                self.idle_count -= 1
+                if not conns:
+                    del self.idle[path]
+        if conn is None:
+            self.prepare(path)
+            conn = connect()
+            with self.lock:
+                self.open[path] = self.open.get(path, 0) + 1
+        _local.held = (path, conn, os.getpid())
+        return conn
+
+    def prepare(self, path):
+        """Create or migrate the database at path once per process."""
+        if path in self.prepared:
+            return
+        with self.prepare_lock:
+            if path not in self.prepared:
+                init_db()
+                self.prepared.add(path)
+
+    def detach(self):
+        """Take this thread's connection from it without checking it in; see give_back()."""
+        held = getattr(_local, 'held', None)
+        _local.held = None
+        return held
+
+    def checkin(self):
+        """Hand this thread's connection back to the pool, if it holds one."""
+        held = self.detach()
+        if held is not None:
+            self.give_back(held)
 
-    # Check if frequency column exists in chores table
-    cursor = conn.execute("PRAGMA table_info(chores)")
-    columns = [row[1] for row in cursor.fetchall()]
+    def give_back(self, held):
+        """Return a connection taken with detach() to the pool."""
+        if held[2] != os.getpid():
+            return
+        path, conn, _ = held
+        if conn.in_transaction:
+            conn.rollback()
+        closing = []
+        with self.lock:
+            self.idle.setdefault(path, []).append(conn)
+            self.idle.move_to_end(path)
+            self.idle_count += 1
+            while self.idle_count > self.max_idle:
+                oldest, conns = next(iter(self.idle.items()))
+                closing.append((oldest, conns.pop(0)))
+                self.idle_count -= 1
+                if not conns:
+                    del self.idle[oldest]
+        self.close(closing)
 
-    if 'frequency' not in columns:
-        # Add frequency column with default 'daily' for existing chores
-        conn.execute("ALTER TABLE chores ADD COLUMN frequency TEXT DEFAULT 'daily'")
-        conn.commit()
+    def discard(self, path):
+        """Close the idle connections to path, e.g. after it was moved."""
+        with self.lock:
+            conns = self.idle.pop(path, [])
+            self.idle_count -= len(conns)
+            self.prepared.discard(path)
+        self.close([(path, conn) for conn in conns])
 
-    conn.close()
+    def close(self, conns):
+        for path, conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            with self.lock:
+                self.open[path] -= 1
+                if not self.open[path]:
+                    del self.open[path]
+
+    def close_all(self):
+        with self.lock:
+            self.reset_after_fork()
+            conns = [(path, conn) for path, idle in self.idle.items() for conn in idle]
+            self.idle.clear()
+            self.idle_count = 0
+        self.close(conns)
+
+    def stats(self):
+        """Counters for monitoring."""
+        with self.lock:
+            return {
+                'databases': len(self.open),
+                'connections': sum(self.open.values()),
+                'idle': self.idle_count,
+            }
+
+
+_pool = DatabasePool(MAX_IDLE_CONNECTIONS)
+
+
+def pool_stats():
+    return _pool.stats()
+
+
+def close_database(path):
+    """Close this process's idle connections to a household database."""
+    _pool.discard(Path(path))
+
+
+class Checkpointer(threading.Thread):
+    """Background thread that checkpoints the WAL on a fixed schedule."""
+
+    def __init__(self, interval):
+        super().__init__(name='wal-checkpointer', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        conn = connect()
+        try:
+            while not self.stopped.wait(self.interval):
+                try:
+                    conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                except sqlite3.Error:
+                    # Another worker holds the lock; try again next round
+                    pass
+        finally:
+            conn.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def start_checkpointer():
+    """Start this process's WAL checkpointer if the storage profile needs one."""
+    global _checkpointer
+    if STORAGE_PROFILES[STORAGE_PROFILE].get('journal_mode') != 'WAL':
+        return
+    with _checkpointer_lock:
+        # Threads don't survive fork(), so each worker starts its own
+        if _checkpointer is not None and _checkpointer.pid == os.getpid():
+            return
+        _checkpointer = Checkpointer(CHECKPOINT_INTERVAL)
+        _checkpointer.pid = os.getpid()
+        _checkpointer.start()
+
+
+def close_db():
+    """Close this thread's connection, if it has one; get_db() opens a new one."""
+    conn = getattr(_local, 'conn', None)
+    _local.conn = None
+    if conn is None or _local.pid != os.getpid():
+        return
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def close_all():
+    """Close the calling thread's connection and the idle pooled ones at exit.
+
+    Connections of other threads are left to them: background threads are
+    daemons that may still be running a query, and closing a connection
+    under a running statement crashes the interpreter. The checkpointer
+    closes its own once stopped; the rest go when the process exits.
+    """
+    if _checkpointer is not None and _checkpointer.pid == os.getpid():
+        _checkpointer.stop()
+    close_db()
+    _pool.close_all()
+
+
+atexit.register(close_all)
+
+
+def init_app(app):
+    """Hook connection handling into the Flask app context."""
+    app.after_request(hold_for_stream)
+    app.teardown_appcontext(release_db)
+
+
+# Indexes created by migrations.py, by name. A change to the set needs a
+# new migration.
+INDEXES = {
+    # Period lookups: chore_id = ? AND date = ? / date >= ?
+    'idx_completions_chore_date': 'chore_completions(chore_id, date, completed_at)',
+    # History and period aggregation: date range, then join to chores
+    'idx_completions_date_chore': 'chore_completions(date, chore_id, completed_at)',
+    # A child's active chores
+    'idx_chores_child_active': 'chores(child_id, is_active, frequency, display_order)',
+    # Chores whose period has rolled over: is_active = 1 AND period_end <= ?
+    'idx_chores_active_period': 'chores(is_active, period_end)',
+    # Completion state for the currently open periods
+    'idx_period_state_start': 'chore_period_state(period_start, chore_id, completion_id, completed_at)',
+    'idx_rollups_date': 'daily_rollups(date, child_id, chore_id, completed)',
+    # Expected and done periods for /api/stats
+    'idx_rollups_periods': 'daily_rollups(date, child_id, chore_id, expected, done)',
+}
+
+# Superseded by INDEXES
+DROPPED_INDEXES = ['idx_completions_date', 'idx_completions_chore', 'idx_chores_child',
+                   'idx_chores_frequency_active']
+
+# Tables with a change counter in data_versions
+VERSIONED_TABLES = ['children', 'chores', 'chore_completions', 'settings']
+
+
+def init_db():
+    """Create the database if needed and bring its schema up to date."""
+    current_path().parent.mkdir(parents=True, exist_ok=True)
+    return migrate_db()
+
+
+def migrate_db():
+    """Apply pending schema migrations; returns their versions (see migrations.py).
+
+    A database that is already current costs one pragma.
+    """
+    from migrations import migrate
+    conn = connect()
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
 
 
 def query_db(query, args=(), one=False):
     """Execute a query and return results."""
-    conn = get_db()
-    cur = conn.execute(query, args)
+    cur = get_db().execute(query, args)
     rv = cur.fetchall()
-    conn.close()
+    cur.close()
     return (rv[0] if rv else None) if one else rv
 
 
+def query_tuples(query, args=()):
+    """Execute a query and return its rows as plain tuples.
+
+    Cheaper than sqlite3.Row for results read by position, such as rows
+    of JSON fragments for the serialize module to join.
+    """
+    cur = tuple_cursor(query, args)
+    rv = cur.fetchall()
+    cur.close()
+    return rv
+
+
+def tuple_cursor(query, args=(), conn=None):
+    """Execute a query on conn (default this thread's) and return a cursor that yields plain tuples."""
+    cur = (conn or get_db()).cursor()
+    cur.row_factory = None
+    return cur.execute(query, args)
+
+
+def get_data_version(tables):
+    """Get a combined change counter for tables; it grows on every write to them."""
+    placeholders = ', '.join('?' * len(tables))
+    row = get_db().execute(
+        f"SELECT SUM(version) FROM data_versions WHERE name IN ({placeholders})",
+        list(tables)
+    ).fetchone()
+    return row[0] or 0
+
+
+@contextmanager
+def transaction():
+    """Run a block as one write transaction on this thread's connection.
+
+    The write lock is taken up front (BEGIN IMMEDIATE) so checks made
+    inside the block can't be invalidated by another writer.
+    """
+    conn = get_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
 def execute_db(query, args=()):
     """Execute a query and return lastrowid."""
     conn = get_db()
     cur = conn.execute(query, args)
     conn.commit()
     lastrowid = cur.lastrowid
-    conn.close()
+    cur.close()
     return lastrowid
@@ -0,0 +1,49 @@
+"""Conditional GET support for the JSON read endpoints.
+
+ETags are derived from the data_versions change counters (see migrate_db)
+rather than from the response body, so a request whose If-None-Match still
+matches is answered with 304 before any heavy query or serialization runs.
+"""
+from functools import wraps
+import hashlib
+
+from flask import Response, make_response, request
+
+from database import current_path, get_data_version
+from schedules import local_today
+
+
+def compute_etag(tables, per_day):
+    """Build a strong ETag for the current request from change counters.
+
+    The database's path is part of it, so households served at the same
+    URL (routed by token) never share ETags.
+    """
+    parts = [str(current_path()), str(get_data_version(tables)), request.full_path]
+    if per_day:
+        parts.append(local_today().isoformat())
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:20]
+
+
+def conditional(*tables, per_day=False):
+    """Answer If-None-Match with 304 while tables are unchanged.
+
+    per_day makes the ETag roll over at the household's midnight too, for responses
+    that depend on the current day or period.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            etag = compute_etag(tables, per_day)
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Let clients keep the body but always check back first
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,179 @@
+"""Change events for the /api/events Server-Sent Events feed.
+
+Write handlers call publish() inside their transaction, which appends a
+row to the change_events table. Each worker runs one EventHub thread that
+tails the table (only when PRAGMA data_version says another connection
+committed) and wakes the SSE streams it serves. Because the log lives in
+SQLite, an event written by any gunicorn worker reaches clients on every
+worker, and a reconnecting client can resume from its Last-Event-ID.
+
+There is one hub per database (per household in multi-household mode).
+A hub no stream has waited on for a while stops, as does one whose
+database has been moved away; its streams end and their clients
+reconnect.
+"""
+from collections import deque
+import json
+import os
+import threading
+import time
+
+from database import connect, current_path, use_database
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS change_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT NOT NULL,
+        data TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# How often the hub looks for new events (seconds)
+POLL_INTERVAL = 0.5
+# Events kept in memory per worker for streams that fall slightly behind
+RECENT_EVENTS = 500
+# Events older than this are pruned from the log (hours)
+RETENTION_HOURS = 24
+# A hub stops once no stream has waited on it for this long (seconds);
+# longer than the SSE heartbeat, so an open stream keeps its hub running
+IDLE_TIMEOUT = 60
+
+
+def publish(conn, type, **data):
+    """Append a change event; call inside the transaction making the change."""
+    conn.execute(
+        "INSERT INTO change_events (type, data) VALUES (?, ?)",
+        [type, json.dumps(data, separators=(',', ':'))]
+    )
+
+
+def events_since(conn, last_id, limit=RECENT_EVENTS):
+    """Read up to limit events after last_id from the log."""
+    return conn.execute(
+        "SELECT id, type, data FROM change_events WHERE id > ? ORDER BY id LIMIT ?",
+        [last_id, limit]
+    ).fetchall()
+
+
+def oldest_event_id(conn):
+    """Get the id of the oldest event still in the log, or None."""
+    return conn.execute("SELECT MIN(id) FROM change_events").fetchone()[0]
+
+
+def latest_event_id(conn):
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM change_events").fetchone()[0]
+
+
+class EventHub(threading.Thread):
+    """Tails change_events and wakes the SSE streams served by this worker."""
+
+    # Prune the log about once an hour
+    PRUNE_EVERY = int(3600 / POLL_INTERVAL)
+
+    def __init__(self, path):
+        super().__init__(name='event-hub', daemon=True)
+        self.path = path
+        self.last_used = time.monotonic()
+        self.pid = os.getpid()
+        self.changed = threading.Condition()
+        self.recent = deque(maxlen=RECENT_EVENTS)
+        self.last_id = None
+        self.stopped = threading.Event()
+        self.ready = threading.Event()
+        self.listeners = []
+
+    def run(self):
+        with use_database(self.path):
+            conn = connect()
+        try:
+            self.last_id = latest_event_id(conn)
+            self.ready.set()
+            data_version = None
+            polls = 0
+            while not self.stopped.wait(POLL_INTERVAL):
+                if self.retire():
+                    break
+                polls += 1
+                if polls % self.PRUNE_EVERY == 0:
+                    self.prune(conn)
+
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current == data_version:
+                    continue
+                data_version = current
+
+                rows = events_since(conn, self.last_id)
+                if rows:
+                    with self.changed:
+                        self.recent.extend(tuple(row) for row in rows)
+                        self.last_id = rows[-1][0]
+                        self.changed.notify_all()
+                        for callback in self.listeners:
+                            callback()
+        finally:
+            conn.close()
+            self.stop()
+
+    def retire(self):
+        """Leave the registry if idle or the database is gone; returns whether it did."""
+        with _hub_lock:
+            if time.monotonic() - self.last_used < IDLE_TIMEOUT and self.path.exists():
+                return False
+            if _hubs.get(self.path) is self:
+                del _hubs[self.path]
+        return True
+
+    def prune(self, conn):
+        with conn:
+            conn.execute(
+                "DELETE FROM change_events WHERE created_at < datetime('now', ?)",
+                [f'-{RETENTION_HOURS} hours']
+            )
+
+    def wait_for(self, last_seen, timeout):
+        """Wait until there are events after last_seen, or timeout.
+
+        Returns the events held in memory, or None if last_seen is older
+        than the in-memory window and the caller must read the log.
+        """
+        self.last_used = time.monotonic()
+        with self.changed:
+            if self.last_id <= last_seen:
+                self.changed.wait(timeout)
+            if self.last_id <= last_seen:
+                return []
+            if not self.recent or self.recent[0][0] > last_seen + 1:
+                return None
+            return [event for event in self.recent if event[0] > last_seen]
+
+    def subscribe(self, callback):
+        """Call callback() from the hub thread whenever new events arrive."""
+        with self.changed:
+            self.listeners.append(callback)
+
+    def stop(self):
+        """Stop tailing and wake every stream, so they can end."""
+        self.stopped.set()
+        with self.changed:
+            self.changed.notify_all()
+            for callback in self.listeners:
+                callback()
+
+
+_hubs = {}
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """Get this process's EventHub for the current database, starting it on first use."""
+    path = current_path()
+    with _hub_lock:
+        hub = _hubs.get(path)
+        # Threads don't survive fork(), so each worker starts its own
+        if hub is None or hub.pid != os.getpid():
+            hub = _hubs[path] = EventHub(path)
+            hub.start()
+        hub.last_used = time.monotonic()
+    hub.ready.wait()
+    return hub
@@ -0,0 +1,406 @@
+"""Multi-household mode: one deployment, one SQLite database per household.
+
+Set CHORES_HOUSEHOLDS_DIR to turn it on. The directory holds
+households.json, which lists every household and where its database is,
+and (by default) the databases themselves, one subdirectory each:
+
+    households/
+        households.json
+        smith/chores.db
+        smith/chores-archive.db
+
+Paths inside the directory are stored relative to it, so the whole
+directory can be moved or restored elsewhere. Each request is routed to
+a household by the first of these (CHORES_HOUSEHOLD_ROUTING, by default
+just token) that names one:
+
+    token  an X-Household-Token header or household_token parameter
+    path   a /h/<id>/ prefix, stripped before the app sees the request
+    host   the first label of the Host header, as in <id>.chores.example
+
+path and host hand a household to anyone who knows (or guesses) its id,
+so only turn them on where every client is trusted, such as a home
+network with no port forwarded to the service.
+
+The request is then served against that household's database (see
+database.use_database). API requests that name no household get a 404;
+static files are served to everyone. Connections, read caches and event
+hubs are only kept for the households in use, so memory follows the
+active households rather than how many are listed, and a household's
+database is migrated the first time each process opens it.
+
+Usage: python server/households.py list
+       python server/households.py add ID
+       python server/households.py token ID
+       python server/households.py move ID DEST
+"""
+from collections import namedtuple
+from pathlib import Path
+from urllib.parse import parse_qs
+import argparse
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import database
+
+HOUSEHOLDS_DIR = os.environ.get('CHORES_HOUSEHOLDS_DIR')
+ENABLED = bool(HOUSEHOLDS_DIR)
+ROUTING = [method.strip() for method in
+           os.environ.get('CHORES_HOUSEHOLD_ROUTING', 'token').split(',')]
+
+DIRECTORY_FILE = 'households.json'
+# Household ids double as host names, so they must be valid DNS labels
+ID_PATTERN = re.compile(r'^[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?$')
+PATH_PREFIX = re.compile(r'^/h/([^/]+)(/.*)?$')
+TOKEN_HEADER = 'HTTP_X_HOUSEHOLD_TOKEN'
+TOKEN_PARAM = 'household_token'
+# Served without a household: process-wide monitoring
+UNROUTED_PATHS = {'/api/metrics', '/api/cache/stats'}
+# How long a move keeps the old database locked once it is copied (seconds):
+# at least SQLite's busy timeout, so writes still waiting on the lock give up
+DRAIN_SECONDS = 5
+
+Household = namedtuple('Household', ['id', 'database', 'token_hash', 'moving'])
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class Directory:
+    """The household list in households.json, reloaded whenever the file changes."""
+
+    def __init__(self, root):
+        self.root = Path(root).resolve()
+        self.file = self.root / DIRECTORY_FILE
+        self.lock = threading.Lock()
+        self.signature = None
+        self.households = {}
+        self.tokens = {}
+
+    def load(self):
+        """Get the households by id, re-reading the file if it has changed."""
+        try:
+            stat = self.file.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+        with self.lock:
+            if signature != self.signature:
+                previous = self.households
+                self.households = self.read() if signature else {}
+                self.tokens = {h.token_hash: h for h in self.households.values() if h.token_hash}
+                self.signature = signature
+                # Let go of databases that are moving, were moved or were removed
+                current = {h.database for h in self.households.values() if not h.moving}
+                for household in previous.values():
+                    if household.database not in current:
+                        database.close_database(household.database)
+            return self.households
+
+    def read(self):
+        with open(self.file) as f:
+            entries = json.load(f)['households']
+        return {
+            id: Household(id, self.root / entry['database'], entry.get('token_sha256'),
+                          entry.get('moving', False))
+            for id, entry in entries.items()
+        }
+
+    def get(self, id):
+        return self.load().get(id)
+
+    def by_token(self, token):
+        self.load()
+        with self.lock:
+            return self.tokens.get(hash_token(token))
+
+    def save(self, households):
+        """Replace households.json atomically, so workers never read half a file."""
+        entries = {}
+        for household in sorted(households.values()):
+            path = household.database
+            entry = {'database': str(path.relative_to(self.root) if path.is_relative_to(self.root) else path)}
+            if household.token_hash:
+                entry['token_sha256'] = household.token_hash
+            if household.moving:
+                entry['moving'] = True
+            entries[household.id] = entry
+        self.root.mkdir(parents=True, exist_ok=True)
+        temp = self.file.with_suffix('.tmp')
+        with open(temp, 'w') as f:
+            json.dump({'households': entries}, f, indent=2)
+            f.write('\n')
+        os.replace(temp, self.file)
+
+
+directory = Directory(HOUSEHOLDS_DIR) if ENABLED else None
+
+
+def route(host, path, token):
+    """Find the household a request is for.
+
+    Returns (household, path), with a /h/<id> prefix removed from path;
+    household is None if the request names no known household.
+    """
+    for method in ROUTING:
+        if method == 'path':
+            match = PATH_PREFIX.match(path)
+            if match:
+                return directory.get(match.group(1)), match.group(2) or '/'
+        elif method == 'host':
+            household = directory.get(host.split(':', 1)[0].split('.', 1)[0].lower())
+            if household:
+                return household, path
+        elif method == 'token' and token:
+            household = directory.by_token(token)
+            if household:
+                return household, path
+    return None, path
+
+
+def request_token(headers_token, query_string):
+    """The household token sent in the header, or else the query string (EventSource)."""
+    if headers_token:
+        return headers_token
+    return parse_qs(query_string).get(TOKEN_PARAM, [None])[0]
+
+
+def database_paths():
+    """Every database to serve: the households' in this mode, else just the default."""
+    if not ENABLED:
+        return [None]
+    return [household.database for household in directory.load().values() if not household.moving]
+
+
+def error_response(start_response, status, message, headers=()):
+    body = json.dumps({'error': message}).encode('utf-8')
+    start_response(status, [
+        ('Content-Type', 'application/json'),
+        ('Content-Length', str(len(body))),
+        *headers,
+    ])
+    return [body]
+
+
+class DatabaseIterator:
+    """Keeps a streamed response on its household's database while it is read.
+
+    held is the connection the view had checked out, if the response is
+    streamed; it stays out of the pool until the body is closed.
+    """
+
+    def __init__(self, chunks, path, held=None):
+        self.chunks = chunks
+        self.iterator = iter(chunks)
+        self.path = path
+        self.held = held
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with database.use_database(self.path):
+            return next(self.iterator)
+
+    def close(self):
+        with database.use_database(self.path):
+            try:
+                if hasattr(self.chunks, 'close'):
+                    self.chunks.close()
+            finally:
+                database.release_db()
+                database.release_stream_connection(self.held)
+
+
+class HouseholdMiddleware:
+    """WSGI middleware that serves each request against its household's database."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path in UNROUTED_PATHS:
+            return self.app(environ, start_response)
+
+        token = request_token(environ.get(TOKEN_HEADER), environ.get('QUERY_STRING', ''))
+        household, rest = route(environ.get('HTTP_HOST', ''), path, token)
+        if household is None:
+            if path.startswith('/api/') or PATH_PREFIX.match(path):
+                return error_response(start_response, '404 NOT FOUND', 'Unknown household')
+            return self.app(environ, start_response)
+        if household.moving:
+            return error_response(start_response, '503 SERVICE UNAVAILABLE',
+                                  'Household is being moved', [('Retry-After', str(DRAIN_SECONDS))])
+
+        if rest != path:
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + path[:len(path) - len(rest)]
+            environ['PATH_INFO'] = rest
+        with database.use_database(household.database):
+            chunks = self.app(environ, start_response)
+            held = database.take_stream_connection()
+        return DatabaseIterator(chunks, household.database, held)
+
+
+def init_app(app):
+    """Route requests to their household's database if multi-household mode is on."""
+    if ENABLED:
+        app.wsgi_app = HouseholdMiddleware(app.wsgi_app)
+
+
+# Command line
+
+def create_database(path):
+    """Create (or migrate) a household database at path."""
+    with database.use_database(path):
+        database.init_db()
+
+
+def copy_database(source, dest):
+    """Copy a live database with SQLite's backup API, so the copy is consistent."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(dest)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def lock_database(path):
+    """Take path's write lock, once writes under way have committed.
+
+    Other connections can still read, but can't write until the returned
+    connection is closed.
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+    except BaseException:
+        conn.close()
+        raise
+    return conn
+
+
+def remove_database(path):
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        Path(f'{path}{suffix}').unlink(missing_ok=True)
+
+
+def list_households(households):
+    for household in sorted(households.values()):
+        size = household.database.stat().st_size if household.database.exists() else 0
+        status = ' (moving)' if household.moving else ''
+        print(f"{household.id}\t{household.database}\t{size // 1024} KiB{status}")
+
+
+def add_household(households, id):
+    if not ID_PATTERN.match(id):
+        raise SystemExit(f"Invalid household id {id!r}: use lowercase letters, digits and hyphens")
+    if id in households:
+        raise SystemExit(f"Household {id} already exists")
+    path = directory.root / id / 'chores.db'
+    create_database(path)
+    token = secrets.token_urlsafe(24)
+    households[id] = Household(id, path, hash_token(token), False)
+    directory.save(households)
+    print(f"Added {id} at {path}\nToken: {token}")
+
+
+def new_token(households, id):
+    token = secrets.token_urlsafe(24)
+    households[id] = households[id]._replace(token_hash=hash_token(token))
+    directory.save(households)
+    print(f"Token: {token}")
+
+
+def move_household(households, id, dest):
+    """Move a household's database (and archive) to the directory dest.
+
+    The household answers 503 while it moves, and workers close their
+    idle connections to it. The copy is taken holding the write lock, so
+    a write already under way commits before it or not at all: the lock
+    is held until the new location is saved and for DRAIN_SECONDS after,
+    so writes still waiting on it fail rather than land in the old file.
+    Workers pick up the new location on their next request; open event
+    streams end and reconnect.
+    """
+    household = households[id]
+    source = household.database
+    target = Path(dest).resolve() / source.name
+    for path in (target, target.with_name('chores-archive.db')):
+        if path.exists():
+            raise SystemExit(f"{path} already exists")
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    households[id] = household._replace(moving=True)
+    directory.save(households)
+    locks = []
+    try:
+        try:
+            for path in (source, source.with_name('chores-archive.db')):
+                if path.exists():
+                    locks.append(lock_database(path))
+                    copy_database(path, target.with_name(path.name))
+        except BaseException:
+            households[id] = household
+            directory.save(households)
+            for path in (target, target.with_name('chores-archive.db')):
+                remove_database(path)
+            raise
+        households[id] = household._replace(database=target)
+        directory.save(households)
+        time.sleep(DRAIN_SECONDS)
+    finally:
+        for conn in locks:
+            conn.close()
+
+    remove_database(source)
+    remove_database(source.with_name('chores-archive.db'))
+    if source.parent != directory.root and not any(source.parent.iterdir()):
+        shutil.rmtree(source.parent)
+    print(f"Moved {id} to {target}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Manage the households served by this deployment.")
+    parser.add_argument('command', choices=['list', 'add', 'token', 'move'])
+    parser.add_argument('id', nargs='?')
+    parser.add_argument('dest', nargs='?', help="directory to move the household's database to")
+    args = parser.parse_args(argv[1:])
+
+    if not ENABLED:
+        raise SystemExit("Set CHORES_HOUSEHOLDS_DIR to the households directory")
+    households = dict(directory.load())
+    if args.command == 'list':
+        list_households(households)
+        return 0
+    if not args.id:
+        parser.error(f"{args.command} needs a household id")
+    if args.command == 'add':
+        add_household(households, args.id)
+        return 0
+    if args.id not in households:
+        raise SystemExit(f"No household {args.id}")
+    if args.command == 'token':
+        new_token(households, args.id)
+    else:
+        if not args.dest:
+            parser.error("move needs a destination directory")
+        move_household(households, args.id, args.dest)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
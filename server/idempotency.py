@@ -0,0 +1,57 @@
+"""Idempotency keys for mutation endpoints that tablets may retry.
+
+A client sends the same Idempotency-Key header when it retries a request.
+The first response is stored in the same transaction as the change, so a
+retry gets the original response back instead of applying the change again.
+"""
+import json
+
+from flask import request
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        status INTEGER NOT NULL,
+        body TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Stored responses are kept this long (hours)
+RETENTION_HOURS = 24
+
+
+def request_key():
+    """Get this request's idempotency key, scoped to its method and path."""
+    key = request.headers.get('Idempotency-Key', '').strip()
+    if not key:
+        return None
+    return f"{request.method} {request.path} {key[:200]}"
+
+
+def stored_response(conn, key):
+    """Get the (body, status) stored for key, or None."""
+    if key is None:
+        return None
+    row = conn.execute(
+        "SELECT status, body FROM idempotency_keys WHERE key = ?", [key]
+    ).fetchone()
+    return (json.loads(row['body']), row['status']) if row else None
+
+
+def store_response(conn, key, body, status):
+    """Remember the response for key; call inside the same transaction."""
+    if key is None:
+        return
+    conn.execute(
+        "INSERT INTO idempotency_keys (key, status, body) VALUES (?, ?, ?)",
+        [key, status, json.dumps(body)]
+    )
+
+
+def prune_keys(conn):
+    """Forget stored responses older than RETENTION_HOURS."""
+    conn.execute(
+        "DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)",
+        [f'-{RETENTION_HOURS} hours']
+    )
@@ -0,0 +1,242 @@
+"""Request and SQL instrumentation, exposed as Prometheus text at /api/metrics.
+
+init_app() installs a before/after-request middleware and the database
+observer hook. Together they record:
+
+- latency histograms and response bytes per route
+- SQL time and statement count per route, so time spent outside the
+  database (serialization, bcrypt) is the difference
+- per-statement counts, timings and rows, keyed by normalized SQL text
+- connections opened and bcrypt time
+
+Metrics are kept per process; with several gunicorn workers each scrape
+sees the worker that answered it. Instrumentation costs every statement
+a trip through Python, so it is off unless CHORES_METRICS=1. Set
+CHORES_SLOW_QUERY_MS to log statements slower than that many
+milliseconds.
+"""
+from functools import lru_cache
+import logging
+import os
+import re
+import threading
+import time
+
+from flask import Response, g, request
+
+import database
+
+ENABLED = os.environ.get('CHORES_METRICS', '0') == '1'
+SLOW_QUERY_MS = float(os.environ.get('CHORES_SLOW_QUERY_MS', 0))
+
+# Histogram buckets (seconds)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1)
+
+slow_log = logging.getLogger('chores.slow_query')
+
+
+@lru_cache(maxsize=512)
+def normalize_sql(sql):
+    """Collapse whitespace and literals so one statement maps to one label."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    sql = ' '.join(sql.split())
+    return sql[:200]
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Process-wide metric store; also the database observer."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.requests = {}        # (route, method, status) -> count
+        self.latency = {}         # route -> Histogram
+        self.response_bytes = {}  # route -> bytes
+        self.request_sql = {}     # route -> [seconds, statements]
+        self.statements = {}      # normalized sql -> Histogram
+        self.fetched = {}         # normalized sql -> [rows, fetch seconds]
+        self.connections = 0
+        self.bcrypt = Histogram(REQUEST_BUCKETS)
+
+    # Database observer hooks
+
+    def connection_opened(self):
+        with self.lock:
+            self.connections += 1
+
+    def query(self, sql, seconds):
+        label = normalize_sql(sql)
+        with self.lock:
+            histogram = self.statements.get(label)
+            if histogram is None:
+                histogram = self.statements[label] = Histogram(SQL_BUCKETS)
+            histogram.observe(seconds)
+        self.add_request_sql(seconds, 1)
+        if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+            slow_log.warning("%.1f ms: %s", seconds * 1000, label)
+
+    def rows(self, sql, count, seconds):
+        if sql is None:
+            return
+        label = normalize_sql(sql)
+        with self.lock:
+            totals = self.fetched.setdefault(label, [0, 0.0])
+            totals[0] += count
+            totals[1] += seconds
+        self.add_request_sql(seconds, 0)
+
+    def add_request_sql(self, seconds, statements):
+        # Only statements run while a request is being handled on this thread
+        totals = getattr(self.local, 'sql', None)
+        if totals is not None:
+            totals[0] += seconds
+            totals[1] += statements
+
+    # Request middleware
+
+    def before_request(self):
+        g.metrics_start = time.perf_counter()
+        self.local.sql = [0.0, 0]
+
+    def after_request(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        sql = self.local.sql
+        self.local.sql = None
+        if response.is_streamed:
+            # Count streamed bodies as they are sent instead of consuming them here
+            response.response = self.count_stream(route, response.response)
+            size = 0
+        else:
+            size = response.calculate_content_length() or 0
+
+        with self.lock:
+            key = (route, request.method, response.status_code)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get(route)
+            if histogram is None:
+                histogram = self.latency[route] = Histogram(REQUEST_BUCKETS)
+            histogram.observe(elapsed)
+            self.response_bytes[route] = self.response_bytes.get(route, 0) + size
+            totals = self.request_sql.setdefault(route, [0.0, 0])
+            totals[0] += sql[0]
+            totals[1] += sql[1]
+        return response
+
+    def count_stream(self, route, chunks):
+        for chunk in chunks:
+            size = len(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            with self.lock:
+                self.response_bytes[route] = self.response_bytes.get(route, 0) + size
+            yield chunk
+
+    def observe_bcrypt(self, seconds):
+        with self.lock:
+            self.bcrypt.observe(seconds)
+
+    # Exposition
+
+    def render(self, extra=()):
+        """Render every metric in the Prometheus text format."""
+        lines = []
+
+        def header(name, type, help):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {type}")
+
+        def histogram(name, labels, h):
+            for bound, count in zip(h.buckets, h.counts):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+            lines.append(f'{name}_sum{{{labels}}} {h.sum:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {h.count}')
+
+        with self.lock:
+            header('chores_http_requests_total', 'counter', 'Requests by route, method and status.')
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'chores_http_requests_total{{route="{escape(route)}",'
+                             f'method="{method}",status="{status}"}} {count}')
+
+            header('chores_http_request_duration_seconds', 'histogram', 'Request latency by route.')
+            for route, h in sorted(self.latency.items()):
+                histogram('chores_http_request_duration_seconds', f'route="{escape(route)}"', h)
+
+            header('chores_http_response_bytes_total', 'counter', 'Response body bytes by route.')
+            for route, size in sorted(self.response_bytes.items()):
+                lines.append(f'chores_http_response_bytes_total{{route="{escape(route)}"}} {size}')
+
+            header('chores_http_sql_seconds_total', 'counter', 'Time spent in SQL while serving each route.')
+            for route, (seconds, _) in sorted(self.request_sql.items()):
+                lines.append(f'chores_http_sql_seconds_total{{route="{escape(route)}"}} {seconds:.6f}')
+
+            header('chores_http_sql_statements_total', 'counter', 'SQL statements run while serving each route.')
+            for route, (_, count) in sorted(self.request_sql.items()):
+                lines.append(f'chores_http_sql_statements_total{{route="{escape(route)}"}} {count}')
+
+            header('chores_sql_duration_seconds', 'histogram', 'Statement execution time by normalized SQL.')
+            for label, h in sorted(self.statements.items()):
+                histogram('chores_sql_duration_seconds', f'query="{escape(label)}"', h)
+
+            header('chores_sql_rows_total', 'counter', 'Rows fetched by normalized SQL.')
+            for label, (count, _) in sorted(self.fetched.items()):
+                lines.append(f'chores_sql_rows_total{{query="{escape(label)}"}} {count}')
+
+            header('chores_sql_fetch_seconds_total', 'counter', 'Time spent fetching rows by normalized SQL.')
+            for label, (_, seconds) in sorted(self.fetched.items()):
+                lines.append(f'chores_sql_fetch_seconds_total{{query="{escape(label)}"}} {seconds:.6f}')
+
+            header('chores_db_connections_opened_total', 'counter', 'SQLite connections opened.')
+            lines.append(f'chores_db_connections_opened_total {self.connections}')
+
+            header('chores_bcrypt_duration_seconds', 'histogram', 'Time spent hashing or checking PINs.')
+            histogram('chores_bcrypt_duration_seconds', 'pool="pin"', self.bcrypt)
+
+        for name, type, help, value in extra:
+            header(name, type, help)
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    """Escape a Prometheus label value."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+def init_app(app):
+    """Install the request middleware and database hook if metrics are enabled."""
+    if not ENABLED:
+        return
+    database.set_observer(metrics)
+    app.before_request(metrics.before_request)
+    app.after_request(metrics.after_request)
+
+
+def metrics_response(extra=()):
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,246 @@
+"""Versioned schema migrations, tracked in PRAGMA user_version.
+
+MIGRATIONS is the schema's history: migration N brings a database from
+version N - 1 to N, and user_version records the last one applied. A
+database that is already current costs one pragma to check, so starting
+a worker does no schema work. Pending migrations run together in one
+transaction that takes the write lock first and then re-reads the
+version, so when several processes start at once the first applies them
+and the rest find nothing to do.
+
+Databases created before versioning are at version 0. Every migration
+up to LATEST_VERSION at the time is written to cope with finding its
+changes already made, so such databases are brought forward the same
+way as new ones. Append new migrations to the list; never change one
+that has shipped.
+
+Usage: python server/migrations.py status | upgrade
+"""
+from pathlib import Path
+import argparse
+import sqlite3
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import database
+from database import DROPPED_INDEXES, INDEXES, VERSIONED_TABLES
+
+SCHEMA_PATH = Path(__file__).parent / 'schema.sql'
+
+
+def schema_statements():
+    """Split schema.sql into statements, so they run inside the migration's transaction."""
+    statement = ''
+    with open(SCHEMA_PATH) as f:
+        for line in f:
+            statement += line
+            if sqlite3.complete_statement(statement):
+                yield statement
+                statement = ''
+
+
+def create_base_tables(conn):
+    """Children, chores, completions and settings."""
+    for statement in schema_statements():
+        conn.execute(statement)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(chores)")]
+    if 'frequency' not in columns:
+        # Databases from before chores had a frequency were all daily
+        conn.execute("ALTER TABLE chores ADD COLUMN frequency TEXT DEFAULT 'daily'")
+
+
+def tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def create_period_state(conn):
+    """Materialized completion state, backfilled from existing completions."""
+    if 'chore_period_state' not in tables(conn):
+        from period_state import CREATE_TABLE_SQL, rebuild_period_state
+        conn.execute(CREATE_TABLE_SQL)
+        rebuild_period_state(conn)
+
+
+def create_daily_rollups(conn):
+    """Daily completion counts behind /api/stats."""
+    if 'daily_rollups' not in tables(conn):
+        from rollups import CREATE_TABLE_SQL, rebuild_rollups
+        conn.execute(CREATE_TABLE_SQL)
+        rebuild_rollups(conn)
+
+
+def create_change_events(conn):
+    """Change log behind the /api/events feed."""
+    from events import CREATE_TABLE_SQL
+    conn.execute(CREATE_TABLE_SQL)
+
+
+def create_idempotency_keys(conn):
+    """Stored responses for retried bulk requests."""
+    from idempotency import CREATE_TABLE_SQL
+    conn.execute(CREATE_TABLE_SQL)
+
+
+def create_data_versions(conn):
+    """Per-table change counters, bumped by triggers on every write.
+
+    The read cache and ETags compare them to notice changes from any worker.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for table in VERSIONED_TABLES:
+        conn.execute("INSERT OR IGNORE INTO data_versions (name) VALUES (?)", [table])
+        for op in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS data_versions_{table}_{op.lower()}
+                AFTER {op} ON {table}
+                BEGIN
+                    UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            """)
+    # Superseded by data_versions
+    for table in ('children', 'chores', 'settings'):
+        for op in ('insert', 'update', 'delete'):
+            conn.execute(f"DROP TRIGGER IF EXISTS cache_version_{table}_{op}")
+    conn.execute("DROP TABLE IF EXISTS cache_version")
+
+
+def create_indexes(conn, skip=()):
+    """Covering indexes for the routes' access paths, replacing the original ones."""
+    for name in DROPPED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    for name, definition in INDEXES.items():
+        if name not in skip:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+
+
+# Indexes on columns added after migration 7, with the migration that
+# adds the columns and creates them
+LATER_INDEXES = {'idx_chores_active_period': 8, 'idx_rollups_periods': 9}
+
+
+def later_indexes(version):
+    return {name for name, number in LATER_INDEXES.items() if number > version}
+
+
+def create_indexes_v7(conn):
+    """Covering indexes for the routes' access paths, replacing the original ones."""
+    create_indexes(conn, skip=later_indexes(7))
+
+
+def add_chore_periods(conn):
+    """Custom schedules and each chore's current period, stored on the chore."""
+    from schedules import local_today, read_calendar, refresh_periods
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(chores)")]
+    for column, definition in [
+        ('schedule', 'TEXT'),
+        ('period_start', 'DATE'),
+        # Sorts before every real date, so new chores are refreshed at once
+        ('period_end', "DATE NOT NULL DEFAULT '0000-01-01'"),
+    ]:
+        if column not in columns:
+            conn.execute(f"ALTER TABLE chores ADD COLUMN {column} {definition}")
+    create_indexes(conn, skip=later_indexes(8))
+    cal = read_calendar(conn)
+    refresh_periods(conn, local_today(cal), cal)
+
+
+def add_rollup_periods(conn):
+    """Expected and done periods in the daily rollups, backfilled from the schedules."""
+    from rollups import LATER_COLUMNS, rebuild_rollups
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(daily_rollups)")]
+    missing = [(column, definition) for column, definition in LATER_COLUMNS if column not in columns]
+    for column, definition in missing:
+        conn.execute(f"ALTER TABLE daily_rollups ADD COLUMN {column} {definition}")
+    create_indexes(conn)
+    if missing:
+        rebuild_rollups(conn)
+
+
+MIGRATIONS = [
+    create_base_tables,
+    create_period_state,
+    create_daily_rollups,
+    create_change_events,
+    create_idempotency_keys,
+    create_data_versions,
+    create_indexes_v7,
+    add_chore_periods,
+    add_rollup_periods,
+]
+LATEST_VERSION = len(MIGRATIONS)
+
+
+class SchemaTooNew(RuntimeError):
+    """The database was migrated by a newer version of the app."""
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply the migrations conn's database is missing; returns their versions."""
+    if schema_version(conn) == LATEST_VERSION:
+        return []
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another process may have migrated while this one waited for the lock
+        version = schema_version(conn)
+        if version > LATEST_VERSION:
+            raise SchemaTooNew(
+                f"Database is at schema version {version}; this app only knows up to {LATEST_VERSION}")
+        applied = list(range(version + 1, LATEST_VERSION + 1))
+        for number in applied:
+            MIGRATIONS[number - 1](conn)
+        conn.execute(f"PRAGMA user_version = {LATEST_VERSION}")
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+    if applied:
+        conn.execute("PRAGMA optimize")
+    return applied
+
+
+def describe(number):
+    return MIGRATIONS[number - 1].__doc__.split('\n', 1)[0]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Show or apply schema migrations.")
+    parser.add_argument('command', choices=['status', 'upgrade'])
+    args = parser.parse_args(argv[1:])
+
+    # Every household's database in multi-household mode
+    from households import database_paths
+    for path in database_paths():
+        with database.use_database(path):
+            name = database.current_path()
+            if args.command == 'upgrade':
+                applied = database.init_db()
+                print(f"{name}: applied {', '.join(map(str, applied))}" if applied
+                      else f"{name}: up to date")
+                continue
+            if not name.exists():
+                print(f"{name}: not created yet")
+                continue
+            conn = database.connect()
+            try:
+                version = schema_version(conn)
+            finally:
+                conn.close()
+            print(f"{name}: version {version} of {LATEST_VERSION}")
+            for number in range(version + 1, LATEST_VERSION + 1):
+                print(f"  pending {number}: {describe(number)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,165 @@
+"""Materialized per-period completion state.
+
+chore_period_state holds one row per (chore, period) in which the chore
+was completed, so "is this chore done" is a primary-key lookup instead of
+a scan over chore_completions. The write paths keep it in step with
+chore_completions inside the same transaction; rebuild_period_state()
+regenerates it from scratch.
+
+Usage: python server/period_state.py rebuild
+"""
+from datetime import date
+from pathlib import Path
+import json
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from database import connect, migrate_db
+from rollups import add_completions, remove_completions
+from schedules import chore_period, read_calendar
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS chore_period_state (
+        chore_id INTEGER NOT NULL,
+        period_start DATE NOT NULL,
+        completion_id INTEGER NOT NULL,
+        completed_at TIMESTAMP,
+        PRIMARY KEY (chore_id, period_start),
+        FOREIGN KEY (chore_id) REFERENCES chores(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+"""
+
+
+def get_period_state(conn, chore_id, period_start):
+    """Get the state row for a chore's period, or None if not completed."""
+    return conn.execute(
+        "SELECT * FROM chore_period_state WHERE chore_id = ? AND period_start = ?",
+        [chore_id, period_start]
+    ).fetchone()
+
+
+def get_period_states(conn, items):
+    """Get state rows for many (chore_id, period_start) pairs, keyed by chore_id."""
+    rows = conn.execute("""
+        SELECT ps.*
+        FROM json_each(?) p
+        JOIN chore_period_state ps
+            ON ps.chore_id = json_extract(p.value, '$[0]')
+            AND ps.period_start = json_extract(p.value, '$[1]')
+    """, [json.dumps(items)]).fetchall()
+    return {row['chore_id']: row for row in rows}
+
+
+def record_completions(conn, items, day):
+    """Insert completions on day and their period state for (chore_id, period_start) pairs.
+
+    Must be called inside a write transaction after checking that none of
+    the periods is already completed. Returns state rows keyed by chore_id.
+    """
+    pending = json.dumps(items)
+    conn.execute("""
+        INSERT INTO chore_completions (chore_id, date)
+        SELECT json_extract(value, '$[0]'), ? FROM json_each(?)
+    """, [day, pending])
+    conn.execute("""
+        INSERT INTO chore_period_state (chore_id, period_start, completion_id, completed_at)
+        SELECT cc.chore_id, json_extract(p.value, '$[1]'), cc.id, cc.completed_at
+        FROM json_each(?) p
+        JOIN chore_completions cc
+            ON cc.chore_id = json_extract(p.value, '$[0]') AND cc.date = ?
+    """, [pending, day])
+    add_completions(conn, items, day)
+    return get_period_states(conn, items)
+
+
+def record_completion(conn, chore_id, period_start, day):
+    """Insert a completion and its period state; returns the state row."""
+    return record_completions(conn, [(chore_id, period_start)], day)[chore_id]
+
+
+def clear_completions(conn, items):
+    """Delete completions and state for many (chore_id, period_start, period_end) periods.
+
+    Only completions dated inside each period, [period_start, period_end),
+    are deleted; the chore's other periods keep theirs.
+    """
+    pending = json.dumps(items)
+    remove_completions(conn, items)
+    conn.execute("""
+        DELETE FROM chore_completions
+        WHERE id IN (
+            SELECT cc.id
+            FROM json_each(?) p
+            JOIN chore_completions cc
+                ON cc.chore_id = json_extract(p.value, '$[0]')
+                AND cc.date >= json_extract(p.value, '$[1]')
+                AND cc.date < json_extract(p.value, '$[2]')
+        )
+    """, [pending])
+    conn.execute("""
+        DELETE FROM chore_period_state
+        WHERE (chore_id, period_start) IN (
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+            FROM json_each(?)
+        )
+    """, [pending])
+
+
+def clear_completion(conn, chore_id, period_start, period_end):
+    """Delete a chore's completions and state for the period [period_start, period_end)."""
+    clear_completions(conn, [(chore_id, period_start, period_end)])
+
+
+def rebuild_period_state(conn, chore_id=None):
+    """Regenerate period state from chore_completions, for one chore or all."""
+    if chore_id is None:
+        where, chore_where, args = "", "", []
+    else:
+        where, chore_where, args = "WHERE chore_id = ?", "WHERE id = ?", [chore_id]
+
+    # Databases being migrated from before chores had schedules
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(chores)")}
+    schedule = 'schedule' if 'schedule' in columns else 'NULL AS schedule'
+    chores = {row['id']: row for row in conn.execute(
+        f"SELECT id, frequency, {schedule}, created_at FROM chores {chore_where}", args
+    )}
+    rows = conn.execute(f"""
+        SELECT id, chore_id, date, completed_at
+        FROM chore_completions {where}
+        ORDER BY chore_id, date, id
+    """, args).fetchall()
+
+    # Keep the latest completion in each period
+    cal = read_calendar(conn)
+    state = {}
+    for completion_id, cid, day, completed_at in rows:
+        if cid in chores:
+            period_start = chore_period(chores[cid], date.fromisoformat(day), cal)[0]
+            state[(cid, period_start)] = (completion_id, completed_at)
+
+    conn.execute(f"DELETE FROM chore_period_state {where}", args)
+    conn.executemany(
+        "INSERT INTO chore_period_state (chore_id, period_start, completion_id, completed_at) "
+        "VALUES (?, ?, ?, ?)",
+        [(cid, start, cmp_id, at) for (cid, start), (cmp_id, at) in state.items()]
+    )
+    return len(state)
+
+
+def main(argv):
+    if argv[1:] != ['rebuild']:
+        print(__doc__.strip().splitlines()[-1])
+        return 2
+
+    migrate_db()
+    conn = connect()
+    with conn:
+        count = rebuild_period_state(conn)
+    conn.close()
+    print(f"Rebuilt {count} period state rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,156 @@
+"""Query-plan regression guard for the SQL in server/routes.
+
+Finds every SQL statement passed to query_db/query_tuples/execute (directly
+or through a module-level constant) in the route modules and the modules
+they write through, runs EXPLAIN QUERY PLAN against a fresh database built
+from schema.sql and migrate_db(), and fails if any statement scans chores
+or chore_completions from end to end.
+
+Usage: python server/query_plans.py (tests/test_query_plans.py runs the
+same check under pytest)
+"""
+import ast
+import re
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import database
+from archive import attach_archive
+
+ROUTES_DIR = Path(__file__).parent / 'routes'
+
+# Modules outside routes/ whose SQL runs on the request path
+SHARED_MODULES = [Path(__file__).parent / name for name in ('period_state.py', 'rollups.py', 'schedules.py')]
+
+# Tables that grow with use; a full scan of these is a regression.
+# children and settings stay a handful of rows and may be scanned.
+GUARDED_TABLES = {'chores', 'chore_completions'}
+
+SQL_CALLS = {'query_db', 'query_tuples', 'tuple_cursor', 'execute_db', 'execute', 'executemany'}
+
+
+def find_statements(path):
+    """Yield (lineno, sql) for each SQL statement in a route module."""
+    tree = ast.parse(path.read_text(), filename=str(path))
+    constants = {}
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)
+                and isinstance(node.value, ast.Constant)
+                and isinstance(node.value.value, str)):
+            constants[node.targets[0].id] = node.value.value
+
+    used = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or not node.args:
+            continue
+        func = node.func
+        name = func.attr if isinstance(func, ast.Attribute) else getattr(func, 'id', None)
+        if name not in SQL_CALLS:
+            continue
+        arg = node.args[0]
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            yield node.lineno, arg.value
+        elif isinstance(arg, ast.Name) and arg.id in constants:
+            used.add(arg.id)
+            yield node.lineno, constants[arg.id]
+
+    # Queries picked at run time are held in module-level *_SQL constants
+    for node in tree.body:
+        if (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name)):
+            name = node.targets[0].id
+            if name in constants and name.endswith('_SQL') and name not in used:
+                yield node.lineno, constants[name]
+
+
+def bind_nulls(sql):
+    """Build a NULL parameter set matching the statement's placeholders."""
+    # Ignore placeholders that appear inside string literals or comments
+    stripped = re.sub(r"'[^']*'|--[^\n]*", '', sql)
+    named = re.findall(r':(\w+)', stripped)
+    if named:
+        return {n: None for n in named}
+    numbered = [int(n) for n in re.findall(r'\?(\d+)', stripped)]
+    if numbered:
+        return [None] * max(numbered)
+    return [None] * stripped.count('?')
+
+
+def guarded_aliases(sql):
+    """Map every name a guarded table is referred to by in the plan."""
+    names = set(GUARDED_TABLES)
+    for table, alias in re.findall(
+            r'\b(?:FROM|JOIN|UPDATE)\s+(?:\w+\.)?(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.I):
+        if table in GUARDED_TABLES and alias and alias.upper() not in {
+                'WHERE', 'SET', 'ON', 'JOIN', 'LEFT', 'INNER', 'GROUP', 'ORDER', 'USING'}:
+            names.add(alias)
+    return names
+
+
+def full_scans(conn, sql):
+    """Return the plan lines where a guarded table is scanned without a search."""
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", bind_nulls(sql)).fetchall()
+    names = guarded_aliases(sql)
+    bad = []
+    for row in plan:
+        detail = row[3]
+        match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+        if match and match.group(1) in names:
+            bad.append(detail)
+    return bad
+
+
+def statements():
+    """List (where, sql) for every statement to check, where being file:line."""
+    return [
+        (f"{path.relative_to(ROUTES_DIR.parent)}:{lineno}", sql)
+        for path in sorted(ROUTES_DIR.glob('*.py')) + SHARED_MODULES
+        for lineno, sql in find_statements(path)
+    ]
+
+
+def open_database(db_path):
+    """Create a database at db_path from the schema and migrations, and connect to it."""
+    with database.use_database(db_path):
+        database.init_db()
+        conn = database.connect()
+        # History reads the archive when a window reaches past the horizon
+        attach_archive(conn, create=True)
+    return conn
+
+
+def check(db_path):
+    """Check every route statement against a new database at db_path."""
+    conn = open_database(db_path)
+    found = statements()
+    failures = []
+    for where, sql in found:
+        try:
+            scans = full_scans(conn, sql)
+        except sqlite3.Error as e:
+            failures.append(f"{where}: {e}")
+            continue
+        for detail in scans:
+            failures.append(f"{where}: {detail}")
+
+    conn.close()
+    return len(found), failures
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        count, failures = check(Path(tmp) / 'plans.db')
+
+    for failure in failures:
+        print(failure)
+    print(f"{count} statements checked, {len(failures)} full scans")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Pre-aggregated daily completion counts and expected periods for stats and streaks.
+
+daily_rollups holds one row per chore per day that has something to
+count: completed is the number of completions dated that day, and
+expected and done are set on the first day of each of the chore's
+periods, once the period has ended or been completed respectively. The
+completion write paths in period_state.py keep it up to date in the same
+transaction, and refresh_periods() marks periods expected as it rolls
+chores forward, so /api/stats reads a few hundred rollup rows per child
+instead of scanning chore_completions or walking schedules.
+rebuild_rollups() regenerates it from scratch.
+
+Usage: python server/rollups.py rebuild
+"""
+from datetime import date
+from pathlib import Path
+import json
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from database import connect, migrate_db
+from schedules import ended_periods, local_date, local_today, read_calendar
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS daily_rollups (
+        chore_id INTEGER NOT NULL,
+        date DATE NOT NULL,
+        child_id INTEGER NOT NULL,
+        completed INTEGER NOT NULL DEFAULT 0,
+        expected INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (chore_id, date),
+        FOREIGN KEY (chore_id) REFERENCES chores(id) ON DELETE CASCADE
+    )
+"""
+
+# Columns added to daily_rollups after it was created, by migration 9.
+# Tables from before then have no default for completed, so inserts give it.
+LATER_COLUMNS = [
+    ('expected', 'INTEGER NOT NULL DEFAULT 0'),
+    ('done', 'INTEGER NOT NULL DEFAULT 0'),
+]
+
+
+def add_completions(conn, items, day):
+    """Count completions on day for (chore_id, period_start) pairs and mark their periods done.
+
+    Call inside the write transaction.
+    """
+    pending = json.dumps(items)
+    conn.execute("""
+        INSERT INTO daily_rollups (chore_id, date, child_id, completed)
+        SELECT c.id, ?, c.child_id, 1
+        FROM json_each(?) p
+        JOIN chores c ON c.id = json_extract(p.value, '$[0]')
+        WHERE true
+        ON CONFLICT (chore_id, date) DO UPDATE SET completed = completed + 1
+    """, [day, pending])
+    conn.execute("""
+        INSERT INTO daily_rollups (chore_id, date, child_id, completed, done)
+        SELECT c.id, json_extract(p.value, '$[1]'), c.child_id, 0, 1
+        FROM json_each(?) p
+        JOIN chores c ON c.id = json_extract(p.value, '$[0]')
+        WHERE true
+        ON CONFLICT (chore_id, date) DO UPDATE SET done = 1
+    """, [pending])
+
+
+def mark_expected(conn, items):
+    """Count (chore_id, period_start) periods that have ended as expected.
+
+    Call inside the write transaction.
+    """
+    conn.execute("""
+        INSERT INTO daily_rollups (chore_id, date, child_id, completed, expected)
+        SELECT c.id, json_extract(p.value, '$[1]'), c.child_id, 0, 1
+        FROM json_each(?) p
+        JOIN chores c ON c.id = json_extract(p.value, '$[0]')
+        WHERE true
+        ON CONFLICT (chore_id, date) DO UPDATE SET expected = 1
+    """, [json.dumps(items)])
+
+
+def remove_completions(conn, items):
+    """Drop the counts for (chore_id, period_start, period_end) periods being cleared.
+
+    Mirrors period_state.clear_completions(), which deletes the chore's
+    completions dated in [period_start, period_end); the period stays
+    expected if it has ended.
+    """
+    pending = json.dumps(items)
+    conn.execute("""
+        DELETE FROM daily_rollups
+        WHERE (chore_id, date) IN (
+            SELECT r.chore_id, r.date
+            FROM json_each(?) p
+            JOIN daily_rollups r
+                ON r.chore_id = json_extract(p.value, '$[0]')
+                AND r.date >= json_extract(p.value, '$[1]')
+                AND r.date < json_extract(p.value, '$[2]')
+            WHERE r.expected = 0
+        )
+    """, [pending])
+    conn.execute("""
+        UPDATE daily_rollups SET completed = 0, done = 0
+        WHERE (chore_id, date) IN (
+            SELECT r.chore_id, r.date
+            FROM json_each(?) p
+            JOIN daily_rollups r
+                ON r.chore_id = json_extract(p.value, '$[0]')
+                AND r.date >= json_extract(p.value, '$[1]')
+                AND r.date < json_extract(p.value, '$[2]')
+        )
+    """, [pending])
+
+
+def rebuild_rollups(conn, chore_id=None):
+    """Regenerate daily_rollups, for one chore or all.
+
+    Completions come from chore_completions and done periods from
+    chore_period_state. Active chores' periods are expected from the day
+    they were created (or first completed) until today.
+    """
+    if chore_id is None:
+        where, chore_where, args = "", "", []
+    else:
+        where, chore_where, args = "WHERE chore_id = ?", "AND id = ?", [chore_id]
+
+    conn.execute(f"DELETE FROM daily_rollups {where}", args)
+    conn.execute(f"""
+        INSERT INTO daily_rollups (chore_id, date, child_id, completed)
+        SELECT cc.chore_id, cc.date, c.child_id, COUNT(*)
+        FROM (SELECT * FROM chore_completions {where}) cc
+        JOIN chores c ON c.id = cc.chore_id
+        GROUP BY cc.chore_id, cc.date
+    """, args)
+    conn.execute(f"""
+        INSERT INTO daily_rollups (chore_id, date, child_id, completed, done)
+        SELECT ps.chore_id, ps.period_start, c.child_id, 0, 1
+        FROM (SELECT * FROM chore_period_state {where}) ps
+        JOIN chores c ON c.id = ps.chore_id
+        WHERE true
+        ON CONFLICT (chore_id, date) DO UPDATE SET done = 1
+    """, args)
+
+    # Databases being migrated from before chores had schedules
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(chores)")}
+    schedule = 'schedule' if 'schedule' in columns else 'NULL AS schedule'
+    first_dates = dict(conn.execute(f"""
+        SELECT chore_id, MIN(date) FROM daily_rollups {where} GROUP BY chore_id
+    """, args).fetchall())
+    cal = read_calendar(conn)
+    today = local_today(cal)
+    ended = []
+    for chore in conn.execute(f"""
+        SELECT id, frequency, {schedule}, created_at FROM chores WHERE is_active = 1 {chore_where}
+    """, args).fetchall():
+        if chore['created_at']:
+            first = local_date(chore['created_at'], cal)
+        elif chore['id'] in first_dates:
+            first = date.fromisoformat(first_dates[chore['id']])
+        else:
+            continue
+        ended.extend((chore['id'], start) for start in ended_periods(chore, first, today, cal))
+    if ended:
+        mark_expected(conn, ended)
+    return conn.execute(f"SELECT COUNT(*) FROM daily_rollups {where}", args).fetchone()[0]
+
+
+def chore_summary(done):
+    """Completion counts, rate and streaks from the done flags of a chore's periods, oldest first."""
+    completed = sum(done)
+    expected = len(done)
+
+    longest = run = 0
+    for flag in done:
+        run = run + 1 if flag else 0
+        longest = max(longest, run)
+
+    return {
+        'completed': completed,
+        'expected': expected,
+        'rate': round(completed / expected, 4) if expected else None,
+        'current_streak': run,
+        'longest_streak': longest,
+    }
+
+
+def child_stats(conn, start, end, child_id=None):
+    """Per-child and per-chore completion stats for the periods starting in start..end (dates).
+
+    A period counts once it has ended or been completed, so the one in
+    progress only counts towards the rate and streaks when it's done.
+    """
+    children = conn.execute(
+        "SELECT id, name FROM children WHERE ? IS NULL OR id = ? ORDER BY display_order, id",
+        [child_id, child_id]
+    ).fetchall()
+    chores = conn.execute("""
+        SELECT c.id, c.child_id, c.title, c.frequency
+        FROM children ch
+        CROSS JOIN chores c ON c.child_id = ch.id AND c.is_active = 1
+        WHERE ? IS NULL OR ch.id = ?
+        ORDER BY c.display_order, c.id
+    """, [child_id, child_id]).fetchall()
+
+    periods = {}
+    for row in conn.execute("""
+        SELECT chore_id, done
+        FROM daily_rollups
+        WHERE date >= ? AND date <= ? AND (? IS NULL OR child_id = ?) AND (expected = 1 OR done = 1)
+        ORDER BY chore_id, date
+    """, [start.isoformat(), end.isoformat(), child_id, child_id]):
+        periods.setdefault(row['chore_id'], []).append(row['done'])
+
+    result = []
+    for child in children:
+        child_chores = []
+        for chore in chores:
+            if chore['child_id'] != child['id']:
+                continue
+            child_chores.append({
+                'id': chore['id'],
+                'title': chore['title'],
+                'frequency': chore['frequency'] or 'daily',
+                **chore_summary(periods.get(chore['id'], []))
+            })
+        completed = sum(c['completed'] for c in child_chores)
+        expected = sum(c['expected'] for c in child_chores)
+        result.append({
+            'id': child['id'],
+            'name': child['name'],
+            'completed': completed,
+            'expected': expected,
+            'rate': round(completed / expected, 4) if expected else None,
+            'chores': child_chores
+        })
+    return result
+
+
+def weekly_totals(conn, since, week_start=0):
+    """Completions per child per week since a date; weeks start on week_start (Monday is 0)."""
+    # strftime('%w') counts from Sunday
+    return conn.execute("""
+        SELECT
+            date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 13 - :week_start) % 7) || ' days')
+                as week_start,
+            child_id,
+            SUM(completed) as completed
+        FROM daily_rollups
+        WHERE date >= :since AND completed > 0
+        GROUP BY week_start, child_id
+        ORDER BY week_start DESC, child_id
+    """, {'since': since.isoformat(), 'week_start': week_start}).fetchall()
+
+
+def main(argv):
+    if argv[1:] != ['rebuild']:
+        print(__doc__.strip().splitlines()[-1])
+        return 2
+
+    migrate_db()
+    conn = connect()
+    with conn:
+        count = rebuild_rollups(conn)
+    conn.close()
+    print(f"Rebuilt {count} daily rollup rows")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,16 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import wraps
 from flask import Blueprint, request, jsonify
+from itsdangerous import BadSignature, URLSafeTimedSerializer
 import bcrypt
-import sys
-sys.path.append('..')
-from database import query_db, execute_db, get_db
+import hashlib
+import secrets
+import threading
+import time
+from cache import cache
+from database import current_path, query_db, execute_db
+from metrics import metrics
 
 bp = Blueprint('auth', __name__)
 
+# bcrypt costs ~250 ms of CPU per call, so hashing runs on a small pool
+# instead of the request thread, with a cap on how many calls may wait.
+PIN_WORKERS = 2
+PIN_QUEUE_LIMIT = 8
+PIN_TIMEOUT = 5  # seconds
+
+_pin_pool = ThreadPoolExecutor(max_workers=PIN_WORKERS, thread_name_prefix='pin-hash')
+_pin_slots = threading.BoundedSemaphore(PIN_WORKERS + PIN_QUEUE_LIMIT)
+
+# How long a verified parent session stays valid (seconds)
+SESSION_MAX_AGE = 30 * 60
+SESSION_HEADER = 'X-Parent-Token'
+
+# Per database, as each household signs its own tokens
+_session_secrets = {}
+
+
+class PinBusy(Exception):
+    """Raised when the PIN hashing pool is saturated or too slow."""
+
+
+def timed_bcrypt(func, *args):
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        metrics.observe_bcrypt(time.perf_counter() - start)
+
+
+def run_bcrypt(func, *args):
+    """Run a bcrypt call on the PIN pool and wait for its result."""
+    if not _pin_slots.acquire(blocking=False):
+        raise PinBusy()
+    try:
+        future = _pin_pool.submit(timed_bcrypt, func, *args)
+    except BaseException:
+        _pin_slots.release()
+        raise
+    future.add_done_callback(lambda f: _pin_slots.release())
+    try:
+        return future.result(timeout=PIN_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        raise PinBusy()
+
+
+def check_pin(pin, stored_hash):
+    """Check a PIN against the stored bcrypt hash."""
+    return run_bcrypt(bcrypt.checkpw, pin.encode('utf-8'), stored_hash.encode('utf-8'))
+
 
 def get_pin_hash():
     """Get the stored PIN hash from settings."""
-    result = query_db("SELECT value FROM settings WHERE key = 'pin_hash'", one=True)
-    return result['value'] if result else None
+    def load():
+        result = query_db("SELECT value FROM settings WHERE key = 'pin_hash'", one=True)
+        return result['value'] if result else None
+
+    return cache.get_or_load('pin_hash', load)
+
+
+def get_session_secret():
+    """Get the key used to sign parent session tokens, creating it once."""
+    path = current_path()
+    if path not in _session_secrets:
+        # Every worker must sign with the same key, so it lives in the database
+        execute_db(
+            "INSERT OR IGNORE INTO settings (key, value) VALUES ('session_secret', ?)",
+            [secrets.token_hex(32)]
+        )
+        row = query_db("SELECT value FROM settings WHERE key = 'session_secret'", one=True)
+        _session_secrets[path] = row['value']
+    return _session_secrets[path]
+
+
+def pin_fingerprint(pin_hash):
+    """Short digest of the PIN hash; changing the PIN invalidates old tokens."""
+    return hashlib.sha256(pin_hash.encode('utf-8')).hexdigest()[:16]
+
+
+def session_serializer():
+    return URLSafeTimedSerializer(get_session_secret(), salt='parent-session')
+
+
+def issue_session_token(pin_hash):
+    """Create a signed token proving the parent PIN was just verified."""
+    return session_serializer().dumps({'pin': pin_fingerprint(pin_hash)})
+
+
+def session_token_valid(token, pin_hash):
+    """Check a parent session token's signature, age and PIN fingerprint."""
+    try:
+        data = session_serializer().loads(token, max_age=SESSION_MAX_AGE)
+    except BadSignature:
+        return False
+    return data.get('pin') == pin_fingerprint(pin_hash)
+
+
+def parent_session_valid():
+    """Check whether this request carries a valid parent session token."""
+    stored_hash = get_pin_hash()
+    # Until a PIN is set there is nothing to protect
+    if not stored_hash:
+        return True
+    token = request.headers.get(SESSION_HEADER, '')
+    return bool(token) and session_token_valid(token, stored_hash)
+
+
+def parent_required(view):
+    """Require a valid parent session token for a route."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not parent_session_valid():
+            return jsonify({'error': 'Parent PIN required'}), 401
+        return view(*args, **kwargs)
+    return wrapped
 
 
 @bp.route('/pin-exists', methods=['GET'])
@@ -29,8 +146,13 @@ def verify_pin():
     if not stored_hash:
         return jsonify({'error': 'No PIN set'}), 400
 
-    if bcrypt.checkpw(pin.encode('utf-8'), stored_hash.encode('utf-8')):
-        return jsonify({'valid': True})
+    try:
+        valid = check_pin(pin, stored_hash)
+    except PinBusy:
+        return jsonify({'error': 'Server busy, try again'}), 503
+
+    if valid:
+        return jsonify({'valid': True, 'token': issue_session_token(stored_hash)})
     else:
         return jsonify({'valid': False}), 401
 
@@ -47,23 +169,24 @@ def set_pin():
 
     stored_hash = get_pin_hash()
 
-    # If PIN already exists, verify current PIN first
-    if stored_hash:
-        if not current_pin:
-            return jsonify({'error': 'Current PIN required'}), 401
-        if not bcrypt.checkpw(current_pin.encode('utf-8'), stored_hash.encode('utf-8')):
-            return jsonify({'error': 'Invalid current PIN'}), 401
+    try:
+        # If PIN already exists, verify current PIN first
+        if stored_hash:
+            if not current_pin:
+                return jsonify({'error': 'Current PIN required'}), 401
+            if not check_pin(current_pin, stored_hash):
+                return jsonify({'error': 'Invalid current PIN'}), 401
 
-    # Hash the new PIN
-    new_hash = bcrypt.hashpw(new_pin.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        # Hash the new PIN
+        new_hash = run_bcrypt(bcrypt.hashpw, new_pin.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    except PinBusy:
+        return jsonify({'error': 'Server busy, try again'}), 503
 
     # Store the new PIN hash
-    conn = get_db()
-    conn.execute(
+    execute_db(
         "INSERT OR REPLACE INTO settings (key, value) VALUES ('pin_hash', ?)",
         [new_hash]
     )
-    conn.commit()
-    conn.close()
+    cache.invalidate()
 
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'token': issue_session_token(new_hash)})
@@ -1,21 +1,32 @@
 from flask import Blueprint, request, jsonify
-import sys
-sys.path.append('..')
-from database import query_db, execute_db, get_db
+from cache import cache
+from database import query_db, query_tuples, transaction
+from etag import conditional
+from events import publish
+from serialize import json_response
+from .auth import parent_required
 
 bp = Blueprint('children', __name__)
 
 
 @bp.route('', methods=['GET'])
+@conditional('children')
 def list_children():
     """Get all children."""
-    children = query_db(
-        "SELECT id, name, display_order, created_at FROM children ORDER BY display_order, id"
-    )
-    return jsonify([dict(c) for c in children])
+    def load():
+        children = query_tuples("""
+            SELECT json_object('created_at', created_at, 'display_order', display_order, 'id', id, 'name', name)
+            FROM children
+            ORDER BY display_order, id
+        """)
+        return '[%s]\n' % ','.join([child for child, in children])
+
+    # Cache the serialized body, not just the rows
+    return json_response(cache.get_or_load('children', load))
 
 
 @bp.route('', methods=['POST'])
+@parent_required
 def create_child():
     """Create a new child."""
     data = request.get_json()
@@ -28,16 +39,20 @@ def create_child():
     max_order = query_db("SELECT MAX(display_order) as max_ord FROM children", one=True)
     new_order = (max_order['max_ord'] or 0) + 1
 
-    child_id = execute_db(
-        "INSERT INTO children (name, display_order) VALUES (?, ?)",
-        [name, new_order]
-    )
+    with transaction() as conn:
+        child_id = conn.execute(
+            "INSERT INTO children (name, display_order) VALUES (?, ?)",
+            [name, new_order]
+        ).lastrowid
+        publish(conn, 'child.created', child_id=child_id)
+    cache.invalidate()
 
     child = query_db("SELECT * FROM children WHERE id = ?", [child_id], one=True)
     return jsonify(dict(child)), 201
 
 
 @bp.route('/<int:child_id>', methods=['GET'])
+@conditional('children')
 def get_child(child_id):
     """Get a single child."""
     child = query_db("SELECT * FROM children WHERE id = ?", [child_id], one=True)
@@ -47,6 +62,7 @@ def get_child(child_id):
 
 
 @bp.route('/<int:child_id>', methods=['PUT'])
+@parent_required
 def update_child(child_id):
     """Update a child."""
     data = request.get_json()
@@ -61,21 +77,28 @@ def update_child(child_id):
     if not name:
         return jsonify({'error': 'Name is required'}), 400
 
-    execute_db(
-        "UPDATE children SET name = ?, display_order = ? WHERE id = ?",
-        [name, display_order, child_id]
-    )
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE children SET name = ?, display_order = ? WHERE id = ?",
+            [name, display_order, child_id]
+        )
+        publish(conn, 'child.updated', child_id=child_id)
+    cache.invalidate()
 
     child = query_db("SELECT * FROM children WHERE id = ?", [child_id], one=True)
     return jsonify(dict(child))
 
 
 @bp.route('/<int:child_id>', methods=['DELETE'])
+@parent_required
 def delete_child(child_id):
     """Delete a child and all their chores."""
     child = query_db("SELECT * FROM children WHERE id = ?", [child_id], one=True)
     if not child:
         return jsonify({'error': 'Child not found'}), 404
 
-    execute_db("DELETE FROM children WHERE id = ?", [child_id])
+    with transaction() as conn:
+        conn.execute("DELETE FROM children WHERE id = ?", [child_id])
+        publish(conn, 'child.deleted', child_id=child_id)
+    cache.invalidate()
     return jsonify({'success': True})
@@ -1,134 +1,260 @@
 from flask import Blueprint, request, jsonify
 from datetime import date, datetime, timedelta
 import calendar
-import sys
-sys.path.append('..')
-from database import query_db, execute_db, get_db
+import json
+import os
+import sqlite3
+import threading
+from archive import archive_old_data, compact
+from cache import cache
+from database import query_db, query_tuples, get_db, release_db, transaction, use_database
+from etag import conditional
+from events import publish
+from households import database_paths
+from idempotency import prune_keys, request_key, stored_response, store_response
+from period_state import (
+    get_period_state, get_period_states, record_completion,
+    record_completions, clear_completion, clear_completions, rebuild_period_state
+)
+from rollups import rebuild_rollups
+from schedules import (
+    current_period, current_period_start, get_calendar, local_today, parse_schedule, read_calendar,
+    refresh_periods, whole
+)
+from serialize import encode, json_response
+from writer import run_write
+from .auth import parent_required
 
 bp = Blueprint('chores', __name__)
 
 
-def get_period_start(frequency):
-    """Get the start date for the current period based on frequency."""
-    today = date.today()
-
-    if frequency == 'daily' or frequency == 'oneoff':
-        return today.isoformat()
-
-    elif frequency == 'weekly':
-        # Monday of current week (week starts Monday)
-        # If today is Sunday, we want this week's Monday
-        days_since_monday = today.weekday()  # Monday=0, Sunday=6
-        monday = today - timedelta(days=days_since_monday)
-        return monday.isoformat()
-
-    elif frequency == 'monthly':
-        # First day of current month
-        return date(today.year, today.month, 1).isoformat()
-
-    return today.isoformat()
-
-
-def cleanup_expired_oneoff_chores():
-    """Deactivate one-off chores that were completed before today."""
-    today = date.today().isoformat()
-
-    # Find one-off chores that have completions before today
-    # and deactivate them
-    execute_db("""
-        UPDATE chores
-        SET is_active = 0
-        WHERE frequency = 'oneoff'
-          AND is_active = 1
-          AND id IN (
-              SELECT DISTINCT chore_id
-              FROM chore_completions
-              WHERE date < ?
-          )
-    """, [today])
-
-    # Also deactivate one-off chores created before today that were never completed
-    # (they should only be visible on their creation day)
-    execute_db("""
-        UPDATE chores
-        SET is_active = 0
-        WHERE frequency = 'oneoff'
-          AND is_active = 1
-          AND DATE(created_at) < ?
-          AND id NOT IN (
-              SELECT DISTINCT chore_id
-              FROM chore_completions
-              WHERE date = DATE(chores.created_at)
-          )
-    """, [today])
+def roll_periods_forward(today, cal):
+    """Refresh stored chore periods if any has ended; the first read after rollover does it."""
+    stale = query_db(
+        "SELECT 1 FROM chores WHERE is_active = 1 AND period_end <= ? LIMIT 1",
+        [today.isoformat()], one=True
+    )
+    if stale:
+        with transaction() as conn:
+            refresh_periods(conn, today, cal)
+
+
+class OneoffSweeper(threading.Thread):
+    """Background thread that rolls chore periods over once per local day.
+
+    That retires expired one-off chores too. It also forgets stored
+    idempotency-key responses that are too old to be retried, and moves
+    history past the horizon into the archive.
+    """
+
+    # Wake at least this often (seconds) so clock changes are noticed
+    MAX_SLEEP = 3600
+
+    def __init__(self):
+        super().__init__(name='oneoff-sweeper', daemon=True)
+        self.stopped = threading.Event()
+
+    def run(self):
+        # Local day each database was last swept on, as households may
+        # have their own timezones
+        swept_on = {}
+        while True:
+            # Every household's database in multi-household mode
+            for path in database_paths():
+                with use_database(path):
+                    try:
+                        cal = read_calendar(get_db())
+                        today = local_today(cal)
+                        if swept_on.get(path) != today:
+                            self.sweep(today, cal)
+                            swept_on[path] = today
+                    except sqlite3.Error:
+                        # Database busy; retry on the next wake-up
+                        pass
+                    finally:
+                        release_db()
+
+            # Sleep until just after the server's midnight; other timezones'
+            # midnights are caught by the hourly wake-up
+            today = date.today()
+            tomorrow = datetime.combine(today + timedelta(days=1), datetime.min.time())
+            wait = (tomorrow - datetime.now()).total_seconds() + 1
+            if self.stopped.wait(min(max(wait, 1), self.MAX_SLEEP)):
+                return
+
+    def sweep(self, today, cal):
+        with transaction() as conn:
+            refresh_periods(conn, today, cal)
+            prune_keys(conn)
+        cache.invalidate()
+        if any(archive_old_data(get_db())):
+            compact(get_db())
+            cache.invalidate()
+
+    def stop(self):
+        self.stopped.set()
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+@bp.before_app_request
+def start_sweeper():
+    """Start this process's one-off sweeper on its first request."""
+    global _sweeper
+    if _sweeper is not None and _sweeper.pid == os.getpid():
+        return
+    with _sweeper_lock:
+        # Threads don't survive fork(), so each worker starts its own
+        if _sweeper is not None and _sweeper.pid == os.getpid():
+            return
+        _sweeper = OneoffSweeper()
+        _sweeper.pid = os.getpid()
+        _sweeper.start()
+
+
+# Every child with their active chores. This rarely changes, so it is
+# served from the read cache; completion state is looked up separately.
+# SQLite encodes each child's and chore's fields as JSON, keys in the
+# sorted order jsonify() writes them, for query_chore_status() to join.
+CHORE_DEFINITIONS_SQL = """
+    SELECT
+        ch.id as child_id,
+        json_object(
+            'created_at', ch.created_at,
+            'display_order', ch.display_order,
+            'id', ch.id,
+            'name', ch.name
+        ) as child_json,
+        c.id,
+        c.period_start,
+        json_object(
+            'display_order', c.display_order,
+            'frequency', COALESCE(c.frequency, 'daily'),
+            'id', c.id,
+            'period_end', c.period_end,
+            'period_start', c.period_start,
+            'schedule', json(c.schedule),
+            'title', c.title
+        ) as chore_json
+    FROM children ch
+    LEFT JOIN chores c
+        ON c.child_id = ch.id
+        AND c.is_active = 1
+        -- Expired one-off chores that haven't been retired yet
+        AND c.period_end > :today
+    ORDER BY
+        ch.display_order,
+        ch.id,
+        CASE c.frequency
+            WHEN 'daily' THEN 1
+            WHEN 'weekdays' THEN 2
+            WHEN 'interval' THEN 3
+            WHEN 'weekly' THEN 4
+            WHEN 'monthday' THEN 5
+            WHEN 'monthly' THEN 6
+            WHEN 'oneoff' THEN 7
+            ELSE 8
+        END,
+        c.display_order,
+        c.id
+"""
+
+# Completion state for each chore's current period, one primary-key
+# lookup per chore whatever its schedule
+PERIOD_STATE_SQL = """
+    SELECT ps.chore_id, ps.completed_at
+    FROM json_each(:periods) p
+    JOIN chore_period_state ps
+        ON ps.chore_id = json_extract(p.value, '$[0]')
+        AND ps.period_start = json_extract(p.value, '$[1]')
+"""
+
+
+def load_chore_definitions(today, cal):
+    """Get every child with their active chore definitions, as JSON fragments.
+
+    Returns (children, periods). children holds a (child_id, fields,
+    chores) tuple per child and chores a (chore_id, fields) pair per chore,
+    where fields is the JSON object's members after its opening brace.
+    periods is the JSON list of [chore_id, period_start] pairs
+    PERIOD_STATE_SQL looks up.
+    """
+    roll_periods_forward(today, cal)
+    children = []
+    periods = []
+    for child_id, child_json, chore_id, period_start, chore_json in query_tuples(
+            CHORE_DEFINITIONS_SQL, {'today': today.isoformat()}):
+        if not children or children[-1][0] != child_id:
+            children.append((child_id, child_json[1:], []))
+        if chore_id is not None:
+            children[-1][2].append((chore_id, chore_json[1:]))
+            periods.append([chore_id, period_start])
+    return children, json.dumps(periods)
+
+
+def chore_status():
+    """Get the chore definitions and each chore's completion time this period.
+
+    Returns (children, completed) with children as load_chore_definitions()
+    returns them and completed mapping chore ids to completed_at.
+    """
+    cal = get_calendar()
+    today = local_today(cal)
+
+    definitions, periods = cache.get_or_load(
+        ('chores', today), lambda: load_chore_definitions(today, cal))
+    return definitions, dict(query_tuples(PERIOD_STATE_SQL, {'periods': periods}))
+
+
+def encode_chores(chores, completed):
+    """Encode a child's chores with their completion status as JSON objects, comma-separated."""
+    return ','.join([
+        '{"completed":true,"completed_at":%s,%s' % (encode(completed[chore_id]), fields)
+        if chore_id in completed else '{"completed":false,"completed_at":null,' + fields
+        for chore_id, fields in chores
+    ])
+
+
+def query_chore_status():
+    """Get every child with their active chores and completion status.
+
+    Returns (child_id, JSON object) pairs in board order.
+    """
+    definitions, completed = chore_status()
+    return [
+        (child_id, '{"chores":[%s],%s' % (encode_chores(chores, completed), fields))
+        for child_id, fields, chores in definitions
+    ]
+
+
+def chore_json(row):
+    """A chores row as the API returns it, with its schedule decoded."""
+    chore = dict(row)
+    chore['schedule'] = json.loads(chore['schedule']) if chore['schedule'] else None
+    return chore
+
+
+@bp.route('/board', methods=['GET'])
+@conditional('children', 'chores', 'chore_completions', per_day=True)
+def get_board():
+    """Get every child with their chores and completion status."""
+    children = ','.join([child for _, child in query_chore_status()])
+    return json_response('{"children":[%s]}\n' % children)
 
 
 @bp.route('/children/<int:child_id>/chores', methods=['GET'])
+@conditional('children', 'chores', 'chore_completions', per_day=True)
 def get_chores_for_child(child_id):
     """Get all chores for a child with completion status based on frequency."""
-    # Clean up expired one-off chores first
-    cleanup_expired_oneoff_chores()
-
-    today = date.today()
-    today_str = today.isoformat()
-
-    # Get period starts for each frequency
-    daily_start = today_str
-    weekly_start = get_period_start('weekly')
-    monthly_start = get_period_start('monthly')
-
-    # Query all active chores with completion status based on frequency
-    chores = query_db("""
-        SELECT
-            c.id,
-            c.title,
-            c.frequency,
-            c.display_order,
-            c.created_at,
-            CASE
-                WHEN c.frequency = 'daily' OR c.frequency = 'oneoff' THEN
-                    (SELECT id FROM chore_completions WHERE chore_id = c.id AND date = ?)
-                WHEN c.frequency = 'weekly' THEN
-                    (SELECT id FROM chore_completions WHERE chore_id = c.id AND date >= ?)
-                WHEN c.frequency = 'monthly' THEN
-                    (SELECT id FROM chore_completions WHERE chore_id = c.id AND date >= ?)
-                ELSE NULL
-            END as completion_id,
-            CASE
-                WHEN c.frequency = 'daily' OR c.frequency = 'oneoff' THEN
-                    (SELECT completed_at FROM chore_completions WHERE chore_id = c.id AND date = ?)
-                WHEN c.frequency = 'weekly' THEN
-                    (SELECT completed_at FROM chore_completions WHERE chore_id = c.id AND date >= ? ORDER BY date DESC LIMIT 1)
-                WHEN c.frequency = 'monthly' THEN
-                    (SELECT completed_at FROM chore_completions WHERE chore_id = c.id AND date >= ? ORDER BY date DESC LIMIT 1)
-                ELSE NULL
-            END as completed_at
-        FROM chores c
-        WHERE c.child_id = ?
-            AND c.is_active = 1
-        ORDER BY
-            CASE c.frequency
-                WHEN 'daily' THEN 1
-                WHEN 'weekly' THEN 2
-                WHEN 'monthly' THEN 3
-                WHEN 'oneoff' THEN 4
-                ELSE 5
-            END,
-            c.display_order,
-            c.id
-    """, [daily_start, weekly_start, monthly_start, daily_start, weekly_start, monthly_start, child_id])
-
-    return jsonify([{
-        'id': c['id'],
-        'title': c['title'],
-        'frequency': c['frequency'] or 'daily',
-        'display_order': c['display_order'],
-        'completed': c['completion_id'] is not None,
-        'completed_at': c['completed_at']
-    } for c in chores])
+    definitions, completed = chore_status()
+    chores = next((chores for cid, _, chores in definitions if cid == child_id), [])
+    return json_response('[%s]\n' % encode_chores(chores, completed))
 
 
 @bp.route('/children/<int:child_id>/chores', methods=['POST'])
+@parent_required
 def create_chore(child_id):
     """Create a new chore for a child."""
     # Verify child exists
@@ -143,10 +269,12 @@ def create_chore(child_id):
     if not title:
         return jsonify({'error': 'Title is required'}), 400
 
-    # Validate frequency
-    valid_frequencies = ['daily', 'weekly', 'monthly', 'oneoff']
-    if frequency not in valid_frequencies:
-        return jsonify({'error': f'Invalid frequency. Must be one of: {", ".join(valid_frequencies)}'}), 400
+    cal = get_calendar()
+    today = local_today(cal)
+    try:
+        schedule = parse_schedule(frequency, data.get('schedule'), today)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     # Get max display_order for this child and frequency
     max_order = query_db(
@@ -155,16 +283,21 @@ def create_chore(child_id):
     )
     new_order = (max_order['max_ord'] or 0) + 1
 
-    chore_id = execute_db(
-        "INSERT INTO chores (child_id, title, frequency, display_order) VALUES (?, ?, ?, ?)",
-        [child_id, title, frequency, new_order]
-    )
+    with transaction() as conn:
+        chore_id = conn.execute(
+            "INSERT INTO chores (child_id, title, frequency, schedule, display_order) VALUES (?, ?, ?, ?, ?)",
+            [child_id, title, frequency, schedule, new_order]
+        ).lastrowid
+        refresh_periods(conn, today, cal, [chore_id])
+        publish(conn, 'chore.created', chore_id=chore_id, child_id=child_id)
+    cache.invalidate()
 
     chore = query_db("SELECT * FROM chores WHERE id = ?", [chore_id], one=True)
-    return jsonify(dict(chore)), 201
+    return jsonify(chore_json(chore)), 201
 
 
 @bp.route('/chores/<int:chore_id>', methods=['PUT'])
+@parent_required
 def update_chore(chore_id):
     """Update a chore."""
     chore = query_db("SELECT * FROM chores WHERE id = ?", [chore_id], one=True)
@@ -175,104 +308,343 @@ def update_chore(chore_id):
     title = data.get('title', chore['title']).strip()
     frequency = data.get('frequency', chore['frequency'])
     display_order = data.get('display_order', chore['display_order'])
+    if 'schedule' in data:
+        schedule = data['schedule']
+    elif frequency == chore['frequency'] and chore['schedule']:
+        schedule = json.loads(chore['schedule'])
+    else:
+        schedule = None
 
     if not title:
         return jsonify({'error': 'Title is required'}), 400
 
-    # Validate frequency
-    valid_frequencies = ['daily', 'weekly', 'monthly', 'oneoff']
-    if frequency not in valid_frequencies:
-        return jsonify({'error': f'Invalid frequency. Must be one of: {", ".join(valid_frequencies)}'}), 400
+    cal = get_calendar()
+    today = local_today(cal)
+    try:
+        schedule = parse_schedule(frequency, schedule, today)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def apply(conn):
+        conn.execute(
+            "UPDATE chores SET title = ?, frequency = ?, schedule = ?, display_order = ? WHERE id = ?",
+            [title, frequency, schedule, display_order, chore_id]
+        )
+        # Periods follow the schedule, so regroup this chore's history
+        if frequency != chore['frequency'] or schedule != chore['schedule']:
+            rebuild_period_state(conn, chore_id)
+            refresh_periods(conn, today, cal, [chore_id])
+            rebuild_rollups(conn, chore_id)
+        publish(conn, 'chore.updated', chore_id=chore_id, child_id=chore['child_id'])
 
-    execute_db(
-        "UPDATE chores SET title = ?, frequency = ?, display_order = ? WHERE id = ?",
-        [title, frequency, display_order, chore_id]
-    )
+    run_write(apply)
+    cache.invalidate()
 
     chore = query_db("SELECT * FROM chores WHERE id = ?", [chore_id], one=True)
-    return jsonify(dict(chore))
+    return jsonify(chore_json(chore))
 
 
 @bp.route('/chores/<int:chore_id>', methods=['DELETE'])
+@parent_required
 def delete_chore(chore_id):
     """Soft delete a chore (keeps history)."""
     chore = query_db("SELECT * FROM chores WHERE id = ?", [chore_id], one=True)
     if not chore:
         return jsonify({'error': 'Chore not found'}), 404
 
-    execute_db("UPDATE chores SET is_active = 0 WHERE id = ?", [chore_id])
+    with transaction() as conn:
+        conn.execute("UPDATE chores SET is_active = 0 WHERE id = ?", [chore_id])
+        publish(conn, 'chore.deleted', chore_id=chore_id, child_id=chore['child_id'])
+    cache.invalidate()
     return jsonify({'success': True})
 
 
 @bp.route('/chores/<int:chore_id>/complete', methods=['POST'])
 def complete_chore(chore_id):
     """Mark a chore as completed for the current period."""
+    cal = get_calendar()
+    today = local_today(cal)
+
     chore = query_db("SELECT * FROM chores WHERE id = ? AND is_active = 1", [chore_id], one=True)
-    if not chore:
+    # Expired one-off chores may not have been retired yet
+    period_start = chore and current_period_start(chore, today, cal)
+    if not period_start:
         return jsonify({'error': 'Chore not found'}), 404
-
-    today = date.today().isoformat()
-    frequency = chore['frequency'] or 'daily'
-    period_start = get_period_start(frequency)
-
-    # Check if already completed in this period
-    if frequency in ['daily', 'oneoff']:
-        existing = query_db(
-            "SELECT * FROM chore_completions WHERE chore_id = ? AND date = ?",
-            [chore_id, today], one=True
-        )
-    else:
-        existing = query_db(
-            "SELECT * FROM chore_completions WHERE chore_id = ? AND date >= ?",
-            [chore_id, period_start], one=True
-        )
-
-    if existing:
-        return jsonify({
+    today = today.isoformat()
+
+    def apply(conn):
+        # Check if already completed in this period
+        existing = get_period_state(conn, chore_id, period_start)
+        if existing:
+            return {
+                'success': True,
+                'completed_at': existing['completed_at'],
+                'already_completed': True
+            }
+
+        # Insert completion record with today's date
+        state = record_completion(conn, chore_id, period_start, today)
+        publish(conn, 'chore.completed', chore_id=chore_id, child_id=chore['child_id'],
+                completed_at=state['completed_at'])
+        return {
             'success': True,
-            'completed_at': existing['completed_at'],
-            'already_completed': True
-        })
-
-    # Insert completion record with today's date
-    conn = get_db()
-    cur = conn.execute(
-        "INSERT INTO chore_completions (chore_id, date) VALUES (?, ?)",
-        [chore_id, today]
-    )
-    conn.commit()
-
-    completion = query_db(
-        "SELECT completed_at FROM chore_completions WHERE id = ?",
-        [cur.lastrowid], one=True
-    )
-    conn.close()
+            'completed_at': state['completed_at']
+        }
 
-    return jsonify({
-        'success': True,
-        'completed_at': completion['completed_at']
-    })
+    return jsonify(run_write(apply))
 
 
 @bp.route('/chores/<int:chore_id>/complete', methods=['DELETE'])
+@parent_required
 def uncomplete_chore(chore_id):
     """Unmark a chore as completed for current period (parent only)."""
     chore = query_db("SELECT * FROM chores WHERE id = ?", [chore_id], one=True)
     if not chore:
         return jsonify({'error': 'Chore not found'}), 404
 
-    frequency = chore['frequency'] or 'daily'
-    period_start = get_period_start(frequency)
+    cal = get_calendar()
+    period = current_period(chore, local_today(cal), cal)
 
-    if frequency in ['daily', 'oneoff']:
-        execute_db(
-            "DELETE FROM chore_completions WHERE chore_id = ? AND date = ?",
-            [chore_id, date.today().isoformat()]
-        )
-    else:
-        execute_db(
-            "DELETE FROM chore_completions WHERE chore_id = ? AND date >= ?",
-            [chore_id, period_start]
-        )
+    def apply(conn):
+        # An expired one-off has no current period to clear
+        if period:
+            clear_completion(conn, chore_id, *period)
+        publish(conn, 'chore.uncompleted', chore_id=chore_id, child_id=chore['child_id'])
 
+    run_write(apply)
     return jsonify({'success': True})
+
+
+# Largest number of items accepted by the bulk endpoints
+MAX_BATCH = 100
+
+# Chores named in a bulk request, with what their current period needs
+CHORE_PERIODS_SQL = """
+    SELECT id, child_id, frequency, schedule, created_at, period_start, period_end
+    FROM chores
+    WHERE id IN (SELECT value FROM json_each(?))
+"""
+
+
+def parse_chore_ids(data):
+    """Get a de-duplicated list of chore ids from a bulk request body, or None."""
+    chore_ids = data.get('chore_ids')
+    if not isinstance(chore_ids, list) or not chore_ids or len(chore_ids) > MAX_BATCH:
+        return None
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in chore_ids):
+        return None
+    return list(dict.fromkeys(chore_ids))
+
+
+@bp.route('/chores/complete', methods=['POST'])
+def complete_chores():
+    """Mark several chores as completed in one transaction."""
+    data = request.get_json(silent=True) or {}
+    chore_ids = parse_chore_ids(data)
+    if chore_ids is None:
+        return jsonify({'error': f'chore_ids must be a list of 1 to {MAX_BATCH} chore ids'}), 400
+
+    cal = get_calendar()
+    today = local_today(cal)
+    key = request_key()
+
+    def apply(conn):
+        replay = stored_response(conn, key)
+        if replay:
+            return replay
+
+        chores = {row['id']: row for row in conn.execute(CHORE_PERIODS_SQL + " AND is_active = 1",
+                                                         [json.dumps(chore_ids)])}
+        # Expired one-off chores may not have been retired yet
+        starts = {chore_id: current_period_start(chore, today, cal) for chore_id, chore in chores.items()}
+        periods = [(chore_id, starts[chore_id]) for chore_id in chore_ids if starts.get(chore_id)]
+        existing = get_period_states(conn, periods)
+        pending = [p for p in periods if p[0] not in existing]
+        recorded = record_completions(conn, pending, today.isoformat()) if pending else {}
+
+        results = []
+        for chore_id in chore_ids:
+            if not starts.get(chore_id):
+                results.append({'chore_id': chore_id, 'success': False, 'error': 'Chore not found'})
+            elif chore_id in existing:
+                results.append({
+                    'chore_id': chore_id,
+                    'success': True,
+                    'completed_at': existing[chore_id]['completed_at'],
+                    'already_completed': True
+                })
+            else:
+                completed_at = recorded[chore_id]['completed_at']
+                publish(conn, 'chore.completed', chore_id=chore_id,
+                        child_id=chores[chore_id]['child_id'], completed_at=completed_at)
+                results.append({'chore_id': chore_id, 'success': True, 'completed_at': completed_at})
+
+        body = {'results': results}
+        store_response(conn, key, body, 200)
+        return body, 200
+
+    body, status = run_write(apply)
+    return jsonify(body), status
+
+
+@bp.route('/chores/uncomplete', methods=['POST'])
+@parent_required
+def uncomplete_chores():
+    """Unmark several chores for their current period in one transaction (parent only)."""
+    data = request.get_json(silent=True) or {}
+    chore_ids = parse_chore_ids(data)
+    if chore_ids is None:
+        return jsonify({'error': f'chore_ids must be a list of 1 to {MAX_BATCH} chore ids'}), 400
+
+    cal = get_calendar()
+    today = local_today(cal)
+    key = request_key()
+
+    def apply(conn):
+        replay = stored_response(conn, key)
+        if replay:
+            return replay
+
+        chores = {row['id']: row for row in conn.execute(CHORE_PERIODS_SQL, [json.dumps(chore_ids)])}
+        current = {chore_id: current_period(chore, today, cal) for chore_id, chore in chores.items()}
+        # An expired one-off has no current period to clear
+        periods = [(chore_id, *current[chore_id]) for chore_id in chore_ids if current.get(chore_id)]
+        if periods:
+            clear_completions(conn, periods)
+
+        results = []
+        for chore_id in chore_ids:
+            if chore_id not in chores:
+                results.append({'chore_id': chore_id, 'success': False, 'error': 'Chore not found'})
+            else:
+                publish(conn, 'chore.uncompleted', chore_id=chore_id,
+                        child_id=chores[chore_id]['child_id'])
+                results.append({'chore_id': chore_id, 'success': True})
+
+        body = {'results': results}
+        store_response(conn, key, body, 200)
+        return body, 200
+
+    body, status = run_write(apply)
+    return jsonify(body), status
+
+
+@bp.route('/chores/bulk', methods=['POST'])
+@parent_required
+def create_chores():
+    """Create several chores, possibly for different children, in one transaction."""
+    data = request.get_json(silent=True) or {}
+    items = data.get('chores')
+    if not isinstance(items, list) or not items or len(items) > MAX_BATCH:
+        return jsonify({'error': f'chores must be a list of 1 to {MAX_BATCH} chores'}), 400
+    if not all(whole(item.get('child_id')) for item in items if isinstance(item, dict)):
+        return jsonify({'error': 'Each chore needs a child_id number'}), 400
+
+    cal = get_calendar()
+    today = local_today(cal)
+    key = request_key()
+
+    with transaction() as conn:
+        replay = stored_response(conn, key)
+        if replay:
+            return jsonify(replay[0]), replay[1]
+
+        child_ids = {item.get('child_id') for item in items if isinstance(item, dict)}
+        children = {row['id'] for row in conn.execute(
+            "SELECT id FROM children WHERE id IN (SELECT value FROM json_each(?))",
+            [json.dumps(sorted(child_ids))]
+        )}
+        max_orders = {
+            (row['child_id'], row['frequency']): row['max_ord'] or 0
+            for row in conn.execute("""
+                SELECT child_id, frequency, MAX(display_order) as max_ord
+                FROM chores
+                WHERE child_id IN (SELECT value FROM json_each(?))
+                GROUP BY child_id, frequency
+            """, [json.dumps(sorted(children))])
+        }
+
+        results = []
+        for item in items:
+            if not isinstance(item, dict):
+                results.append({'success': False, 'error': 'Invalid chore'})
+                continue
+            child_id = item.get('child_id')
+            title = str(item.get('title', '')).strip()
+            frequency = item.get('frequency', 'daily')
+            try:
+                schedule, invalid = parse_schedule(frequency, item.get('schedule'), today), None
+            except ValueError as e:
+                schedule, invalid = None, str(e)
+            if child_id not in children:
+                results.append({'success': False, 'error': 'Child not found'})
+            elif not title:
+                results.append({'success': False, 'error': 'Title is required'})
+            elif invalid:
+                results.append({'success': False, 'error': invalid})
+            else:
+                order = max_orders.get((child_id, frequency), 0) + 1
+                max_orders[(child_id, frequency)] = order
+                chore_id = conn.execute(
+                    "INSERT INTO chores (child_id, title, frequency, schedule, display_order) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [child_id, title, frequency, schedule, order]
+                ).lastrowid
+                publish(conn, 'chore.created', chore_id=chore_id, child_id=child_id)
+                results.append({'success': True, 'id': chore_id, 'child_id': child_id,
+                                'title': title, 'frequency': frequency,
+                                'schedule': json.loads(schedule) if schedule else None,
+                                'display_order': order})
+
+        created = [result['id'] for result in results if result['success']]
+        if created:
+            refresh_periods(conn, today, cal, created)
+        body = {'results': results}
+        store_response(conn, key, body, 200)
+
+    cache.invalidate()
+    return jsonify(body)
+
+
+@bp.route('/chores/reorder', methods=['POST'])
+@parent_required
+def reorder_chores():
+    """Set display_order from the position of each id in chore_ids (parent only)."""
+    data = request.get_json(silent=True) or {}
+    chore_ids = parse_chore_ids(data)
+    if chore_ids is None:
+        return jsonify({'error': f'chore_ids must be a list of 1 to {MAX_BATCH} chore ids'}), 400
+
+    key = request_key()
+
+    def apply(conn):
+        replay = stored_response(conn, key)
+        if replay:
+            return replay
+
+        order = json.dumps(chore_ids)
+        chores = {row['id']: row['child_id'] for row in conn.execute(
+            "SELECT id, child_id FROM chores WHERE id IN (SELECT value FROM json_each(?))",
+            [order]
+        )}
+        conn.execute("""
+            UPDATE chores
+            SET display_order = (SELECT key + 1 FROM json_each(?1) WHERE value = chores.id)
+            WHERE id IN (SELECT value FROM json_each(?1))
+        """, [order])
+
+        results = []
+        for position, chore_id in enumerate(chore_ids, start=1):
+            if chore_id not in chores:
+                results.append({'chore_id': chore_id, 'success': False, 'error': 'Chore not found'})
+            else:
+                publish(conn, 'chore.updated', chore_id=chore_id, child_id=chores[chore_id])
+                results.append({'chore_id': chore_id, 'success': True, 'display_order': position})
+
+        body = {'results': results}
+        store_response(conn, key, body, 200)
+        return body, 200
+
+    body, status = run_write(apply)
+    cache.invalidate()
+    return jsonify(body), status
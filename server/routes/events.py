@@ -0,0 +1,77 @@
+from flask import Blueprint, Response, request
+from database import get_db
+from events import events_since, get_hub, latest_event_id, oldest_event_id
+
+bp = Blueprint('events', __name__)
+
+# Send a comment this often (seconds) so proxies and tablets keep the
+# connection open and dead clients are noticed
+HEARTBEAT_INTERVAL = 15
+
+# Tell clients how long to wait before reconnecting (ms)
+RETRY_MESSAGE = 'retry: 3000\n\n'
+HEARTBEAT_MESSAGE = ': heartbeat\n\n'
+
+STREAM_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+
+def format_event(event_id, type, data):
+    """Format one change event as an SSE message."""
+    return f'id: {event_id}\ndata: {{"type":"{type}","data":{data}}}\n\n'
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def resume_from(conn, last_id):
+    """Get (last_seen, messages): where to resume a stream and what to send first."""
+    if last_id is None:
+        return latest_event_id(conn), []
+    oldest = oldest_event_id(conn)
+    if oldest is not None and oldest > last_id + 1:
+        # Missed events were pruned; the client must reload everything
+        last_seen = latest_event_id(conn)
+        return last_seen, [f'id: {last_seen}\ndata: {{"type":"reset","data":{{}}}}\n\n']
+    return last_id, []
+
+
+@bp.route('', methods=['GET'])
+def stream_events():
+    """Stream change events as Server-Sent Events.
+
+    Under the ASGI server (asgi.py) this path is served without a thread
+    per connection; this view is used by the WSGI servers.
+    """
+    last_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+
+    hub = get_hub()
+
+    def generate():
+        conn = get_db()
+        yield RETRY_MESSAGE
+
+        last_seen, messages = resume_from(conn, last_id)
+        yield from messages
+
+        # A stopped hub's database has moved; the client reconnects to the new one
+        while not hub.stopped.is_set():
+            events = hub.wait_for(last_seen, HEARTBEAT_INTERVAL)
+            if events is None:
+                # Fell behind the hub's in-memory window; catch up from the log
+                events = events_since(conn, last_seen)
+            if not events:
+                yield HEARTBEAT_MESSAGE
+                continue
+            for event_id, type, data in events:
+                yield format_event(event_id, type, data)
+            last_seen = events[-1][0]
+
+    return Response(generate(), mimetype='text/event-stream', headers=STREAM_HEADERS)
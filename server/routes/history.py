@@ -1,132 +1,256 @@
-from flask import Blueprint, request, jsonify
-from datetime import date, timedelta
-import sys
-sys.path.append('..')
-from database import query_db
+from flask import Blueprint, jsonify, request
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+import base64
+import json
+from archive import attach_archive, get_archive_horizon
+from cache import cache
+from database import connect, get_db, tuple_cursor
+from etag import conditional
+from schedules import local_today, whole
+from serialize import batched, encode, json_response
 
 bp = Blueprint('history', __name__)
 
+# Largest page accepted by ?limit= (completions per page)
+MAX_PAGE_SIZE = 500
+# Longest window accepted by ?days=, ten years. It must reach past the archive
+# horizon (at least archive.MIN_ARCHIVE_DAYS), or archived history could
+# never be read back; windows that do also read the archive.
+MAX_DAYS = 3660
+
+# Completions in the window, ordered so that every (date, child) group is
+# contiguous. The optional cursor continues after the last row of the
+# previous page (keyset pagination on the ORDER BY columns). The last
+# column is the completion's entry in the response, encoded by SQLite.
+HISTORY_SQL = """
+    SELECT
+        cc.id,
+        cc.date,
+        cc.completed_at,
+        c.id as chore_id,
+        c.title as chore_title,
+        ch.id as child_id,
+        ch.name as child_name,
+        json_object('chore_id', c.id, 'completed_at', cc.completed_at, 'title', c.title) as entry
+    FROM chore_completions cc
+    JOIN chores c ON cc.chore_id = c.id
+    JOIN children ch ON c.child_id = ch.id
+    WHERE cc.date >= :start_date AND cc.date <= :end_date
+        AND (:child_id IS NULL OR ch.id = :child_id)
+        AND (
+            :after_date IS NULL
+            OR cc.date < :after_date
+            OR (cc.date = :after_date
+                AND (ch.name, ch.id, cc.completed_at, cc.id)
+                    > (:after_name, :after_child, :after_completed_at, :after_id))
+        )
+    ORDER BY cc.date DESC, ch.name, ch.id, cc.completed_at, cc.id
+    LIMIT :limit
+"""
+
+# HISTORY_SQL for windows that reach past the archive horizon: archived
+# completions are unioned in, with titles from the live chore if it still
+# exists and from the archived copy otherwise.
+ARCHIVE_HISTORY_SQL = """
+    SELECT
+        h.id,
+        h.date,
+        h.completed_at,
+        h.chore_id,
+        h.chore_title,
+        ch.id as child_id,
+        ch.name as child_name,
+        json_object('chore_id', h.chore_id, 'completed_at', h.completed_at, 'title', h.chore_title) as entry
+    FROM (
+        SELECT cc.id, cc.date, cc.completed_at, c.id as chore_id, c.title as chore_title, c.child_id
+        FROM main.chore_completions cc
+        JOIN main.chores c ON cc.chore_id = c.id
+        WHERE cc.date >= :start_date AND cc.date <= :end_date
+        UNION ALL
+        SELECT cc.id, cc.date, cc.completed_at, cc.chore_id,
+            COALESCE(live.title, c.title), COALESCE(live.child_id, c.child_id)
+        FROM archive.chore_completions cc
+        JOIN archive.chores c ON cc.chore_id = c.id
+        LEFT JOIN main.chores live ON live.id = cc.chore_id
+        WHERE cc.date >= :start_date AND cc.date <= :end_date
+    ) h
+    JOIN children ch ON h.child_id = ch.id
+    WHERE (:child_id IS NULL OR ch.id = :child_id)
+        AND (
+            :after_date IS NULL
+            OR h.date < :after_date
+            OR (h.date = :after_date
+                AND (ch.name, ch.id, h.completed_at, h.id)
+                    > (:after_name, :after_child, :after_completed_at, :after_id))
+        )
+    ORDER BY h.date DESC, ch.name, ch.id, h.completed_at, h.id
+    LIMIT :limit
+"""
+
+
+# Positions of the HISTORY_SQL columns in its tuple rows
+ID, DATE, COMPLETED_AT, CHORE_ID, CHORE_TITLE, CHILD_ID, CHILD_NAME, ENTRY = range(8)
+
+
+def encode_cursor(row):
+    """Encode the sort key of a history row as an opaque cursor."""
+    key = [row[DATE], row[CHILD_NAME], row[CHILD_ID], row[COMPLETED_AT], row[ID]]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor(), or None if it is malformed.
+
+    Its values are bound into the query, so each must be a string or a
+    whole number.
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except ValueError:
+        return None
+    if not isinstance(key, list) or len(key) != 5:
+        return None
+    if not all(isinstance(value, str) or whole(value) for value in key):
+        return None
+    return key
+
+
+def query_history(days, child_id=None, cursor=None, page_size=None, conn=None):
+    """Run the history query and return a cursor over its rows, as tuples.
+
+    Runs on conn if given, or this thread's connection.
+    """
+    days = min(max(days, 1), MAX_DAYS)
+    after = cursor or [None] * 5
+    today = local_today()
+    start_date = (today - timedelta(days=days-1)).isoformat()
+
+    conn = conn or get_db()
+    sql = HISTORY_SQL
+    # Only pay for the archive when the window reaches into it
+    horizon = cache.get_or_load('archive_horizon', lambda: get_archive_horizon(conn))
+    if horizon and start_date < horizon and attach_archive(conn):
+        sql = ARCHIVE_HISTORY_SQL
+
+    return tuple_cursor(sql, {
+        'start_date': start_date,
+        'end_date': today.isoformat(),
+        'child_id': child_id,
+        'after_date': after[0],
+        'after_name': after[1],
+        'after_child': after[2],
+        'after_completed_at': after[3],
+        'after_id': after[4],
+        # One extra row tells whether another page follows
+        'limit': page_size + 1 if page_size is not None else -1,
+    }, conn=conn)
+
+
+def encode_days(rows):
+    """Encode ordered history rows as JSON days with their children and chores.
+
+    Yields one JSON object per day.
+    """
+    for d, day_rows in groupby(rows, key=itemgetter(DATE)):
+        children = [
+            '{"chores":[%s],"id":%s,"name":%s}' % (
+                ','.join([r[ENTRY] for r in child_rows]), encode(child_id), encode(child_name))
+            for (child_id, child_name), child_rows in groupby(day_rows, key=itemgetter(CHILD_ID, CHILD_NAME))
+        ]
+        yield '{"children":[%s],"date":%s}' % (','.join(children), encode(d))
+
+
+def encode_child_days(rows):
+    """Encode ordered history rows for a single child as JSON days."""
+    for d, day_rows in groupby(rows, key=itemgetter(DATE)):
+        yield '{"chores":[%s],"date":%s}' % (','.join([r[ENTRY] for r in day_rows]), encode(d))
+
+
+def page_args():
+    """Get the cursor and page size (None for everything) for the current request.
+
+    Raises ValueError for a malformed cursor.
+    """
+    cursor = request.args.get('cursor')
+    if cursor:
+        cursor = decode_cursor(cursor)
+        if cursor is None:
+            raise ValueError('Invalid cursor')
+    else:
+        cursor = None
+    page_size = request.args.get('limit', type=int)
+    if page_size is not None:
+        page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+    return cursor, page_size
+
+
+def stream_connection(page_size):
+    """Open a connection of its own for a streamed response (?stream=1), or get None.
+
+    A streamed body is read after the request has ended, possibly on
+    another thread, so it must not use the thread's shared connection.
+    """
+    if page_size is None and request.args.get('stream', type=int):
+        return connect()
+    return None
+
+
+def history_response(rows, encode_group, page_size, conn=None):
+    """Respond with one page (?limit=), a streamed body (?stream=1) or everything.
+
+    A streamed body reads rows from conn, its own connection, and closes it.
+    """
+    if page_size is not None:
+        page = rows.fetchmany(page_size + 1)
+        has_more = len(page) > page_size
+        if has_more:
+            page.pop()
+        # The next page may continue the last day of this one
+        next_cursor = encode_cursor(page[-1]) if has_more else None
+        return json_response('{"history":[%s],"next_cursor":%s}\n' % (
+            ','.join(encode_group(page)), encode(next_cursor)))
+
+    if conn is not None:
+        def generate():
+            yield '{"history":['
+            for i, day in enumerate(encode_group(batched(rows))):
+                yield (',' if i else '') + day
+            yield ']}'
+        response = json_response(generate())
+        response.call_on_close(conn.close)
+        return response
+
+    return json_response('{"history":[%s]}\n' % ','.join(encode_group(rows.fetchall())))
+
 
 @bp.route('', methods=['GET'])
+@conditional('children', 'chores', 'chore_completions', per_day=True)
 def get_history():
     """Get chore completion history."""
     days = request.args.get('days', 7, type=int)
     child_id = request.args.get('child_id', type=int)
+    try:
+        cursor, page_size = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    # Limit to reasonable range
-    days = min(max(days, 1), 365)
-
-    start_date = (date.today() - timedelta(days=days-1)).isoformat()
-    end_date = date.today().isoformat()
-
-    # Build query based on whether filtering by child
-    if child_id:
-        completions = query_db("""
-            SELECT
-                cc.date,
-                cc.completed_at,
-                c.id as chore_id,
-                c.title as chore_title,
-                ch.id as child_id,
-                ch.name as child_name
-            FROM chore_completions cc
-            JOIN chores c ON cc.chore_id = c.id
-            JOIN children ch ON c.child_id = ch.id
-            WHERE cc.date >= ? AND cc.date <= ?
-                AND ch.id = ?
-            ORDER BY cc.date DESC, ch.name, cc.completed_at
-        """, [start_date, end_date, child_id])
-    else:
-        completions = query_db("""
-            SELECT
-                cc.date,
-                cc.completed_at,
-                c.id as chore_id,
-                c.title as chore_title,
-                ch.id as child_id,
-                ch.name as child_name
-            FROM chore_completions cc
-            JOIN chores c ON cc.chore_id = c.id
-            JOIN children ch ON c.child_id = ch.id
-            WHERE cc.date >= ? AND cc.date <= ?
-            ORDER BY cc.date DESC, ch.name, cc.completed_at
-        """, [start_date, end_date])
-
-    # Group by date and child
-    history = {}
-    for comp in completions:
-        d = comp['date']
-        if d not in history:
-            history[d] = {}
-
-        child_name = comp['child_name']
-        if child_name not in history[d]:
-            history[d][child_name] = {
-                'child_id': comp['child_id'],
-                'chores': []
-            }
-
-        history[d][child_name]['chores'].append({
-            'chore_id': comp['chore_id'],
-            'title': comp['chore_title'],
-            'completed_at': comp['completed_at']
-        })
-
-    # Convert to list format
-    result = []
-    for d in sorted(history.keys(), reverse=True):
-        day_data = {
-            'date': d,
-            'children': []
-        }
-        for child_name, child_data in sorted(history[d].items()):
-            day_data['children'].append({
-                'id': child_data['child_id'],
-                'name': child_name,
-                'chores': child_data['chores']
-            })
-        result.append(day_data)
-
-    return jsonify({'history': result})
+    conn = stream_connection(page_size)
+    rows = query_history(days, child_id, cursor, page_size, conn)
+    return history_response(rows, encode_days, page_size, conn)
 
 
 @bp.route('/child/<int:child_id>', methods=['GET'])
+@conditional('children', 'chores', 'chore_completions', per_day=True)
 def get_child_history(child_id):
     """Get history for a specific child."""
     days = request.args.get('days', 30, type=int)
-    days = min(max(days, 1), 365)
-
-    start_date = (date.today() - timedelta(days=days-1)).isoformat()
-    end_date = date.today().isoformat()
-
-    completions = query_db("""
-        SELECT
-            cc.date,
-            cc.completed_at,
-            c.id as chore_id,
-            c.title as chore_title
-        FROM chore_completions cc
-        JOIN chores c ON cc.chore_id = c.id
-        WHERE c.child_id = ?
-            AND cc.date >= ? AND cc.date <= ?
-        ORDER BY cc.date DESC, cc.completed_at
-    """, [child_id, start_date, end_date])
-
-    # Group by date
-    history = {}
-    for comp in completions:
-        d = comp['date']
-        if d not in history:
-            history[d] = []
-        history[d].append({
-            'chore_id': comp['chore_id'],
-            'title': comp['chore_title'],
-            'completed_at': comp['completed_at']
-        })
-
-    result = [
-        {'date': d, 'chores': chores}
-        for d, chores in sorted(history.items(), reverse=True)
-    ]
-
-    return jsonify({'history': result})
+    try:
+        cursor, page_size = page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = stream_connection(page_size)
+    rows = query_history(days, child_id, cursor, page_size, conn)
+    return history_response(rows, encode_child_days, page_size, conn)
@@ -0,0 +1,46 @@
+from flask import Blueprint, request, jsonify
+from cache import cache
+from database import transaction
+from events import publish
+from period_state import rebuild_period_state
+from rollups import rebuild_rollups
+from schedules import (
+    TIMEZONE_KEY, WEEK_START_KEY, get_calendar, local_today, parse_calendar, refresh_periods
+)
+from .auth import parent_required
+
+bp = Blueprint('settings', __name__)
+
+
+@bp.route('', methods=['GET'])
+def get_settings():
+    """Get the household's calendar settings."""
+    cal = get_calendar()
+    return jsonify({'timezone': cal.timezone, 'week_start': cal.week_start, 'today': local_today(cal).isoformat()})
+
+
+@bp.route('', methods=['PUT'])
+@parent_required
+def update_settings():
+    """Change the household's timezone or the weekday weeks start on (parent only)."""
+    current = get_calendar()
+    try:
+        cal = parse_calendar(request.get_json(silent=True) or {}, current)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if cal != current:
+        with transaction() as conn:
+            conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", [
+                (TIMEZONE_KEY, cal.timezone or ''),
+                (WEEK_START_KEY, str(cal.week_start)),
+            ])
+            # Weekly periods are keyed by their first day, so regroup history
+            if cal.week_start != current.week_start:
+                rebuild_period_state(conn)
+                rebuild_rollups(conn)
+            # A new timezone can move today either way
+            refresh_periods(conn, local_today(cal), cal, everything=True)
+            publish(conn, 'settings.updated')
+        cache.invalidate()
+    return jsonify({'timezone': cal.timezone, 'week_start': cal.week_start, 'today': local_today(cal).isoformat()})
@@ -0,0 +1,46 @@
+from flask import Blueprint, request, jsonify
+from datetime import timedelta
+from database import get_db
+from etag import conditional
+from rollups import child_stats, weekly_totals
+from schedules import get_calendar, local_today
+
+bp = Blueprint('stats', __name__)
+
+# Longest reporting window accepted by ?days= and ?weeks=
+MAX_DAYS = 366
+MAX_WEEKS = 53
+
+
+@bp.route('', methods=['GET'])
+@conditional('children', 'chores', 'chore_completions', per_day=True)
+def get_stats():
+    """Get completion rates and streaks per child and chore."""
+    days = min(max(request.args.get('days', 30, type=int), 1), MAX_DAYS)
+    child_id = request.args.get('child_id', type=int)
+    cal = get_calendar()
+    end = local_today(cal)
+    start = end - timedelta(days=days-1)
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'children': child_stats(get_db(), start, end, child_id)
+    })
+
+
+@bp.route('/weekly', methods=['GET'])
+@conditional('children', 'chores', 'chore_completions', per_day=True)
+def get_weekly_totals():
+    """Get completions per child for each recent week (weeks start on the household's week start)."""
+    weeks = min(max(request.args.get('weeks', 12, type=int), 1), MAX_WEEKS)
+    cal = get_calendar()
+    today = local_today(cal)
+    since = today - timedelta(days=(today.weekday() - cal.week_start) % 7 + 7 * (weeks - 1))
+
+    result = []
+    for row in weekly_totals(get_db(), since, cal.week_start):
+        if not result or result[-1]['week_start'] != row['week_start']:
+            result.append({'week_start': row['week_start'], 'children': []})
+        result[-1]['children'].append({'id': row['child_id'], 'completed': row['completed']})
+    return jsonify({'weeks': result})
@@ -0,0 +1,209 @@
+"""Delta sync for tablets that keep a local copy of the board.
+
+change_events is the change log: every mutation in chores.py and
+children.py appends to it in its own transaction, naming the child it
+touched. GET /api/sync?since=<seq>&date=<day> returns the board entries
+of just the children touched after seq. A client that is too far behind
+(its events were pruned, or data was imported) or whose date is no
+longer today, so every period may have rolled over, gets the full board.
+
+POST /api/sync applies chore completions queued while a tablet was
+offline, resolving conflicts with what happened on the server meanwhile.
+"""
+from flask import Blueprint, request, jsonify
+from datetime import date, datetime, timedelta, timezone
+import json
+from database import get_db
+from events import events_since, latest_event_id, oldest_event_id, publish
+from idempotency import stored_response, store_response
+from period_state import clear_completion, get_period_state, record_completion
+from schedules import chore_period, get_calendar, local_today
+from serialize import encode, json_response
+from writer import run_write
+from .auth import parent_session_valid
+from .chores import MAX_BATCH, query_chore_status
+
+bp = Blueprint('sync', __name__)
+
+# A client more events than this behind gets the full board
+MAX_DELTA_EVENTS = 500
+# Events that can't be narrowed down to the children they touched
+RESET_EVENTS = {'data.imported'}
+# Queued mutations for days further back than this are rejected
+MAX_OFFLINE_DAYS = 7
+
+MUTATION_TYPES = ['complete', 'uncomplete']
+
+
+def changed_children(conn, since, seq):
+    """Get the ids of children touched by events in (since, seq].
+
+    Returns None when the client must reload the full board instead.
+    """
+    if since is None or since > seq:
+        return None
+    if since == seq:
+        return set()
+    oldest = oldest_event_id(conn)
+    if oldest is None or oldest > since + 1:
+        # Events the client hasn't seen were pruned
+        return None
+    events = events_since(conn, since, MAX_DELTA_EVENTS + 1)
+    if len(events) > MAX_DELTA_EVENTS:
+        return None
+
+    child_ids = set()
+    for event_id, type, data in events:
+        if event_id > seq:
+            break
+        child_id = json.loads(data).get('child_id')
+        if type in RESET_EVENTS or child_id is None:
+            return None
+        child_ids.add(child_id)
+    return child_ids
+
+
+@bp.route('', methods=['GET'])
+def get_changes():
+    """Get the board entries of the children changed since a sequence number."""
+    since = request.args.get('since', type=int)
+    today = local_today().isoformat()
+    conn = get_db()
+    # Read before the board, so a change committed in between is sent again next time
+    seq = latest_event_id(conn)
+
+    child_ids = None
+    if request.args.get('date') == today:
+        child_ids = changed_children(conn, since, seq)
+    if child_ids is None:
+        children = [child for _, child in query_chore_status()]
+        return json_response('{"children":[%s],"date":%s,"full":true,"seq":%s}\n' % (
+            ','.join(children), encode(today), encode(seq)))
+
+    children = []
+    if child_ids:
+        children = [(child_id, child) for child_id, child in query_chore_status() if child_id in child_ids]
+    # Touched but gone: deleted children
+    removed = sorted(child_ids - {child_id for child_id, _ in children})
+    return json_response('{"children":[%s],"date":%s,"full":false,"removed":%s,"seq":%s}\n' % (
+        ','.join([child for _, child in children]), encode(today), encode(removed), encode(seq)))
+
+
+def parse_timestamp(value):
+    """Convert an ISO timestamp to UTC in SQLite's CURRENT_TIMESTAMP format, or None."""
+    try:
+        at = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc).replace(tzinfo=None)
+    return at.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def check_mutation(mutation, chores, today, cal, is_parent):
+    """Get the error that rules a mutation out, or None."""
+    if mutation.get('type') not in MUTATION_TYPES:
+        return 'Invalid mutation type'
+    try:
+        day = date.fromisoformat(mutation.get('date'))
+    except (TypeError, ValueError):
+        return 'Invalid date'
+    if not today - timedelta(days=MAX_OFFLINE_DAYS) <= day <= today:
+        return 'Date out of range'
+
+    chore = chores.get(mutation.get('chore_id'))
+    if mutation['type'] == 'complete':
+        # Only chores that were on the board that day can be completed
+        if (not chore or not chore['is_active']
+                or (chore['frequency'] == 'oneoff' and chore_period(chore, day, cal)[1] <= day.isoformat())):
+            return 'Chore not found'
+    else:
+        if not chore:
+            return 'Chore not found'
+        if not is_parent:
+            return 'Parent PIN required'
+    return None
+
+
+def apply_mutation(conn, mutation, chores, today, cal, is_parent):
+    """Apply one queued mutation inside the sync transaction; returns its result.
+
+    A completion is applied unless the chore's period (for the day it was
+    tapped) is already complete. An uncompletion loses to a completion the
+    server recorded after it was queued. Each result is stored under the
+    mutation's id, so a batch that is sent again is not applied twice.
+    """
+    if not isinstance(mutation, dict):
+        return {'id': None, 'status': 'rejected', 'error': 'Invalid mutation'}
+    mutation_id = str(mutation.get('id') or '')[:200]
+    key = f"SYNC {mutation_id}" if mutation_id else None
+    replay = stored_response(conn, key)
+    if replay:
+        return replay[0]
+
+    result = {'id': mutation_id, 'chore_id': mutation.get('chore_id')}
+    error = check_mutation(mutation, chores, today, cal, is_parent)
+    if error:
+        result.update(status='rejected', error=error)
+        store_response(conn, key, result, 200)
+        return result
+
+    chore = chores[mutation['chore_id']]
+    period_start, period_end = chore_period(chore, date.fromisoformat(mutation['date']), cal)
+    existing = get_period_state(conn, chore['id'], period_start)
+
+    if mutation['type'] == 'complete':
+        if existing:
+            result.update(status='unchanged', completed_at=existing['completed_at'])
+        else:
+            state = record_completion(conn, chore['id'], period_start, mutation['date'])
+            publish(conn, 'chore.completed', chore_id=chore['id'], child_id=chore['child_id'],
+                    completed_at=state['completed_at'])
+            result.update(status='applied', completed_at=state['completed_at'])
+    elif not existing:
+        result.update(status='unchanged')
+    else:
+        # Without a timestamp the uncompletion counts as happening now
+        at = parse_timestamp(mutation.get('at'))
+        if at is not None and existing['completed_at'] > at:
+            result.update(status='conflict', completed_at=existing['completed_at'])
+        else:
+            clear_completion(conn, chore['id'], period_start, period_end)
+            publish(conn, 'chore.uncompleted', chore_id=chore['id'], child_id=chore['child_id'])
+            result.update(status='applied')
+
+    store_response(conn, key, result, 200)
+    return result
+
+
+@bp.route('', methods=['POST'])
+def apply_mutations():
+    """Apply mutations queued while offline, in order, in one transaction.
+
+    Each mutation is {"id", "type": "complete"|"uncomplete", "chore_id",
+    "date" (the day it was tapped), "at" (ISO timestamp)}. Uncompletions
+    need a parent session token. Returns a result per mutation with a
+    status of applied, unchanged, conflict or rejected.
+    """
+    data = request.get_json(silent=True) or {}
+    mutations = data.get('mutations')
+    if not isinstance(mutations, list) or not mutations or len(mutations) > MAX_BATCH:
+        return jsonify({'error': f'mutations must be a list of 1 to {MAX_BATCH} mutations'}), 400
+
+    cal = get_calendar()
+    today = local_today(cal)
+    is_parent = parent_session_valid()
+    chore_ids = [
+        m.get('chore_id') for m in mutations
+        if isinstance(m, dict) and isinstance(m.get('chore_id'), int) and not isinstance(m.get('chore_id'), bool)
+    ]
+
+    def apply(conn):
+        chores = {row['id']: row for row in conn.execute("""
+            SELECT id, child_id, frequency, schedule, is_active, created_at
+            FROM chores
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, [json.dumps(chore_ids)])}
+        return [apply_mutation(conn, mutation, chores, today, cal, is_parent) for mutation in mutations]
+
+    return jsonify({'results': run_write(apply)})
@@ -0,0 +1,76 @@
+from flask import Blueprint, Response, request, jsonify
+from datetime import date
+import io
+import sqlite3
+from cache import cache
+from database import get_db
+from transfer import (
+    DEFER_INDEXES_MIN_BYTES, FORMATS, TABLES, export_data, is_empty, load_records, read_csv,
+    read_ndjson
+)
+from .auth import parent_required
+
+bp = Blueprint('transfer', __name__)
+
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+def format_args():
+    """Get (format, table) for the request, or None if either is invalid."""
+    format = request.args.get('format', 'ndjson')
+    table = request.args.get('table', 'completions')
+    if format not in FORMATS or table not in TABLES:
+        return None
+    return format, table
+
+
+@bp.route('/export', methods=['GET'])
+@parent_required
+def export():
+    """Stream children, chores and completions as NDJSON, or one table as CSV."""
+    args = format_args()
+    if args is None:
+        return jsonify({'error': f'format must be one of {", ".join(FORMATS)} '
+                                 f'and table one of {", ".join(TABLES)}'}), 400
+    format, table = args
+
+    start = request.args.get('start')
+    end = request.args.get('end')
+    try:
+        for value in (start, end):
+            if value:
+                date.fromisoformat(value)
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates (YYYY-MM-DD)'}), 400
+
+    name = 'chores' if format == 'ndjson' else table
+    return Response(export_data(format, table, start, end), mimetype=MIMETYPES[format], headers={
+        'Content-Disposition': f'attachment; filename="{name}-{date.today().isoformat()}.{format}"'
+    })
+
+
+@bp.route('/import', methods=['POST'])
+@parent_required
+def import_():
+    """Load an export (NDJSON, or CSV for one table) from the request body."""
+    args = format_args()
+    if args is None:
+        return jsonify({'error': f'format must be one of {", ".join(FORMATS)} '
+                                 f'and table one of {", ".join(TABLES)}'}), 400
+    format, table = args
+
+    source = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    records = read_csv(source, table) if format == 'csv' else read_ndjson(source)
+    length = request.content_length
+    conn = get_db()
+    # Dropping the indexes of a database in use would slow every other request
+    defer_indexes = (length is None or length >= DEFER_INDEXES_MIN_BYTES) and is_empty(conn)
+
+    try:
+        counts = load_records(conn, records, defer_indexes)
+    except (ValueError, sqlite3.IntegrityError) as e:
+        cache.invalidate()
+        return jsonify({'error': f'Import stopped: {e}'}), 400
+
+    cache.invalidate()
+    return jsonify({'imported': counts})
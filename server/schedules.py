@@ -0,0 +1,302 @@
+"""Recurrence engine: when each chore's periods start and end.
+
+A chore's frequency names its kind of schedule, and the schedule column
+holds the parameters of the kinds that need some, as JSON:
+
+    daily                       every day
+    weekly                      weeks starting on the household's week start
+    monthly                     calendar months
+    oneoff                      only the local day it was created
+    interval  {"every": 3, "start": "2024-05-06"}
+                                every N days counted from start
+    weekdays  {"days": [0, 2, 4]}
+                                on the listed weekdays (Monday is 0); each
+                                period runs until the next listed day
+    monthday  {"day": 15}       from the nth of each month to the next
+                                (clamped to the month's last day)
+
+Periods are half-open [start, end) ranges of local dates. Each chore's
+current period is stored in chores.period_start / period_end, so the board
+and the completion paths compare dates instead of evaluating schedules
+row by row. refresh_periods() rolls the stored periods forward once the
+day passes period_end; it runs when the board is first read each day, in
+the daily sweep, and whenever a chore or the calendar settings change.
+
+The household's timezone and week start live in settings. Without a
+timezone, days follow the server's local time as they always have.
+"""
+from collections import namedtuple
+from datetime import date, datetime, timedelta, timezone
+import calendar
+import json
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+FREQUENCIES = ['daily', 'weekly', 'monthly', 'oneoff', 'interval', 'weekdays', 'monthday']
+# Frequencies whose schedule column holds parameters
+PARAMETERIZED = {'interval', 'weekdays', 'monthday'}
+# Longest gap accepted for interval schedules (days)
+MAX_INTERVAL = 366
+
+TIMEZONE_KEY = 'timezone'
+WEEK_START_KEY = 'week_start'
+
+# timezone None is the server's local time; week_start 0 is Monday
+Calendar = namedtuple('Calendar', ['timezone', 'week_start'])
+
+# Active chores whose stored period has ended (or was never computed)
+STALE_PERIODS_SQL = """
+    SELECT id, frequency, schedule, created_at, period_start, period_end
+    FROM chores
+    WHERE is_active = 1 AND period_end <= ?
+"""
+
+
+def read_calendar(conn):
+    """Read the household's timezone and week start from settings."""
+    values = dict(conn.execute(
+        "SELECT key, value FROM settings WHERE key IN (?, ?)", [TIMEZONE_KEY, WEEK_START_KEY]
+    ).fetchall())
+    return Calendar(values.get(TIMEZONE_KEY) or None, int(values.get(WEEK_START_KEY) or 0))
+
+
+def get_calendar():
+    """Get the current database's calendar settings, from the read cache.
+
+    Remembered for the rest of a request, which may ask several times.
+    """
+    from flask import g, has_request_context
+    from cache import cache
+    from database import get_db
+    if has_request_context() and 'calendar' in g:
+        return g.calendar
+    cal = cache.get_or_load('calendar', lambda: read_calendar(get_db()))
+    if has_request_context():
+        g.calendar = cal
+    return cal
+
+
+def zone(name):
+    """Get a timezone by IANA name, or None (server-local time) for an unknown one."""
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def local_today(cal=None):
+    """Get today's date in the household's timezone."""
+    tz = zone((cal or get_calendar()).timezone)
+    return datetime.now(tz).date() if tz else date.today()
+
+
+def local_date(timestamp, cal):
+    """Convert a UTC CURRENT_TIMESTAMP value to the household's local date."""
+    at = datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc)
+    return at.astimezone(zone(cal.timezone)).date()
+
+
+def month_day(year, month, day):
+    """The given day of a month, clamped to the month's last day."""
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def add_months(year, month, count):
+    """(year, month) count months after the given one."""
+    index = year * 12 + month - 1 + count
+    return index // 12, index % 12 + 1
+
+
+def period_bounds(frequency, params, day, week_start=0, created=None):
+    """Get the [start, end) dates of the period containing day.
+
+    params is the decoded schedule, created the local date a one-off was
+    created on (and the default start of an interval).
+    """
+    if frequency == 'weekly':
+        start = day - timedelta(days=(day.weekday() - week_start) % 7)
+        return start, start + timedelta(days=7)
+
+    elif frequency == 'monthly':
+        start = day.replace(day=1)
+        return start, date(*add_months(start.year, start.month, 1), 1)
+
+    elif frequency == 'oneoff':
+        start = created or day
+        return start, start + timedelta(days=1)
+
+    elif frequency == 'interval':
+        every = params['every']
+        anchor = date.fromisoformat(params['start']) if 'start' in params else created or day
+        start = anchor + timedelta(days=(day - anchor).days // every * every)
+        return start, start + timedelta(days=every)
+
+    elif frequency == 'weekdays':
+        weekday = day.weekday()
+        since = min((weekday - d) % 7 for d in params['days'])
+        until = min((d - weekday) % 7 or 7 for d in params['days'])
+        return day - timedelta(days=since), day + timedelta(days=until)
+
+    elif frequency == 'monthday':
+        this = month_day(day.year, day.month, params['day'])
+        if day >= this:
+            return this, month_day(*add_months(day.year, day.month, 1), params['day'])
+        return month_day(*add_months(day.year, day.month, -1), params['day']), this
+
+    return day, day + timedelta(days=1)
+
+
+def chore_schedule(chore, cal):
+    """Decode a chore row's schedule into period_bounds() arguments.
+
+    chore needs frequency, schedule and created_at columns. Returns a
+    function of day giving the period's [start, end) dates.
+    """
+    frequency = chore['frequency'] or 'daily'
+    params = json.loads(chore['schedule']) if chore['schedule'] else {}
+    if frequency in PARAMETERIZED and not params:
+        # Archived copies of chores don't keep their schedule
+        frequency = 'daily'
+    created = local_date(chore['created_at'], cal) if chore['created_at'] else None
+    return lambda day: period_bounds(frequency, params, day, cal.week_start, created)
+
+
+def chore_period(chore, day, cal):
+    """Get the (start, end) ISO dates of a chore row's period containing day."""
+    start, end = chore_schedule(chore, cal)(day)
+    return start.isoformat(), end.isoformat()
+
+
+def ended_periods(chore, first, today, cal):
+    """List the starts (ISO dates) of a chore row's periods that have ended by today.
+
+    Starts with the period containing first; a one-off has just the one.
+    """
+    period = chore_schedule(chore, cal)
+    starts = []
+    day = first
+    while True:
+        start, end = period(day)
+        if end > today:
+            return starts
+        starts.append(start.isoformat())
+        if (chore['frequency'] or 'daily') == 'oneoff':
+            return starts
+        day = end
+
+
+def current_period(chore, today, cal):
+    """Get the (start, end) ISO dates of a chore's current period, or None if it is an expired one-off.
+
+    Uses the stored period unless it has ended and the refresh hasn't run yet.
+    """
+    if chore['period_end'] > today.isoformat():
+        return chore['period_start'], chore['period_end']
+    if (chore['frequency'] or 'daily') == 'oneoff':
+        return None
+    return chore_period(chore, today, cal)
+
+
+def current_period_start(chore, today, cal):
+    """Get the start of a chore's current period, or None if it is an expired one-off."""
+    period = current_period(chore, today, cal)
+    return period[0] if period else None
+
+
+def refresh_periods(conn, today, cal, chore_ids=None, everything=False):
+    """Roll stored periods forward to the ones containing today.
+
+    Updates active chores whose period has ended; with chore_ids, those
+    chores whatever their stored period, and with everything, every
+    active chore (after the calendar settings change). One-off chores
+    whose day has passed are retired instead. The periods that ended
+    since the stored one began are counted as expected in the rollups.
+    Call inside a write transaction. Returns the number of chores changed.
+    """
+    from rollups import mark_expected
+    if chore_ids is not None:
+        rows = conn.execute("""
+            SELECT id, frequency, schedule, created_at, period_start, period_end
+            FROM chores
+            WHERE id IN (SELECT value FROM json_each(?))
+        """, [json.dumps(list(chore_ids))]).fetchall()
+    else:
+        # '9999-12-31' is after every stored period_end
+        rows = conn.execute(STALE_PERIODS_SQL, ['9999-12-31' if everything else today.isoformat()]).fetchall()
+
+    updates, expired, ended = [], [], []
+    for row in rows:
+        if row['period_start'] and row['period_end'] <= today.isoformat():
+            ended.extend((row['id'], start) for start in
+                         ended_periods(row, date.fromisoformat(row['period_start']), today, cal))
+        start, end = chore_period(row, today, cal)
+        if (row['frequency'] or 'daily') == 'oneoff' and end <= today.isoformat():
+            expired.append((row['id'],))
+        elif (start, end) != (row['period_start'], row['period_end']):
+            updates.append((start, end, row['id']))
+    if updates:
+        conn.executemany("UPDATE chores SET period_start = ?, period_end = ? WHERE id = ?", updates)
+    if expired:
+        conn.executemany("UPDATE chores SET is_active = 0 WHERE id = ? AND is_active = 1", expired)
+    if ended:
+        mark_expected(conn, ended)
+    return len(updates) + len(expired)
+
+
+def whole(value):
+    """Whether a value decoded from JSON is a whole number (true and false are not)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_schedule(frequency, schedule, today):
+    """Validate a schedule sent by a client; returns the JSON to store.
+
+    Raises ValueError with a message for the client.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f'Invalid frequency. Must be one of: {", ".join(FREQUENCIES)}')
+    if frequency not in PARAMETERIZED:
+        if schedule:
+            raise ValueError(f'{frequency} chores take no schedule')
+        return None
+    if not isinstance(schedule, dict):
+        raise ValueError(f'{frequency} chores need a schedule')
+
+    if frequency == 'interval':
+        every = schedule.get('every')
+        if not whole(every) or not 1 <= every <= MAX_INTERVAL:
+            raise ValueError(f'every must be a number of days from 1 to {MAX_INTERVAL}')
+        try:
+            start = date.fromisoformat(schedule.get('start') or today.isoformat())
+        except (TypeError, ValueError):
+            raise ValueError('start must be a date (YYYY-MM-DD)')
+        params = {'every': every, 'start': start.isoformat()}
+
+    elif frequency == 'weekdays':
+        days = schedule.get('days')
+        if not isinstance(days, list) or not days or not all(whole(d) and 0 <= d <= 6 for d in days):
+            raise ValueError('days must list weekdays from 0 (Monday) to 6 (Sunday)')
+        params = {'days': sorted(set(days))}
+
+    else:
+        day = schedule.get('day')
+        if not whole(day) or not 1 <= day <= 31:
+            raise ValueError('day must be a day of the month from 1 to 31')
+        params = {'day': day}
+
+    return json.dumps(params, separators=(',', ':'))
+
+
+def parse_calendar(data, current):
+    """Validate calendar settings sent by a client; returns the new Calendar.
+
+    Raises ValueError with a message for the client.
+    """
+    tz = data.get(TIMEZONE_KEY, current.timezone)
+    if tz is not None and (not isinstance(tz, str) or zone(tz) is None):
+        raise ValueError('timezone must be an IANA name such as Europe/London, or null')
+    week_start = data.get(WEEK_START_KEY, current.week_start)
+    if not isinstance(week_start, int) or isinstance(week_start, bool) or not 0 <= week_start <= 6:
+        raise ValueError('week_start must be a weekday from 0 (Monday) to 6 (Sunday)')
+    return Calendar(tz or None, week_start)
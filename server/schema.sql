@@ -38,7 +38,5 @@ CREATE TABLE IF NOT EXISTS settings (
     value TEXT NOT NULL
 );
 
--- Indexes for efficient queries
-CREATE INDEX IF NOT EXISTS idx_completions_date ON chore_completions(date);
-CREATE INDEX IF NOT EXISTS idx_completions_chore ON chore_completions(chore_id);
-CREATE INDEX IF NOT EXISTS idx_chores_child ON chores(child_id);
+-- The first migration in migrations.py; later tables, triggers and
+-- indexes are added by the migrations after it
@@ -0,0 +1,44 @@
+"""JSON responses assembled from fragments instead of jsonify().
+
+jsonify() copies every sqlite3.Row into a dict, nests the dicts into the
+response's shape and then has Flask's JSON provider walk all of it again,
+sorting each object's keys. For the board and long history windows that
+costs more CPU than the SQL does.
+
+The large responses are built another way. Their queries have SQLite
+encode each record with json_object(), keys listed in sorted order, and
+run with plain tuple rows (database.query_tuples / tuple_cursor). The
+routes join those fragments into the response with string templates
+whose keys are already in place, and encode() covers the few values
+that come from Python. The result is the same JSON jsonify() writes,
+except that SQLite leaves non-ASCII text unescaped in the UTF-8 body.
+"""
+import json
+
+from flask import current_app
+
+MIMETYPE = 'application/json'
+
+# Rows fetched per batch while streaming a response
+BATCH_SIZE = 500
+
+_encoder = json.JSONEncoder(ensure_ascii=True, sort_keys=True, separators=(',', ':'))
+
+
+def encode(value):
+    """Encode a Python value as jsonify() would, without the trailing newline."""
+    return _encoder.encode(value)
+
+
+def batched(cursor, size=BATCH_SIZE):
+    """Iterate over a cursor's rows, fetching them in batches."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def json_response(body, status=200):
+    """Respond with encoded JSON text, or stream an iterable of JSON chunks."""
+    return current_app.response_class(body, status=status, mimetype=MIMETYPE)
@@ -0,0 +1,58 @@
+"""Production launcher: serves asgi.py with uvicorn in a single process.
+
+Flask views run on a bounded thread pool and open SSE streams are
+coroutines, so tablets left open on the board don't pin workers. Settings
+come from the environment so the service files stay short:
+
+    CHORES_HOST             address to listen on (default 0.0.0.0)
+    CHORES_PORT             port (default 8080)
+    CHORES_ASGI_THREADS     threads running views and SQLite (default 8)
+    CHORES_MAX_CONNECTIONS  open connections before new ones get a 503 (default 1000)
+    CHORES_HOUSEHOLDS_DIR   serve many households, one database each (see households.py)
+
+For development with the reloader and debugger, run python server/app.py.
+
+Usage: python server/serve.py [--host HOST] [--port PORT]
+"""
+from pathlib import Path
+import argparse
+import os
+import sys
+
+import uvicorn
+
+HOST = os.environ.get('CHORES_HOST', '0.0.0.0')
+PORT = int(os.environ.get('CHORES_PORT', 8080))
+MAX_CONNECTIONS = int(os.environ.get('CHORES_MAX_CONNECTIONS', 1000))
+
+# Idle keep-alive connections are closed after this long (seconds); longer
+# than the SSE heartbeat so a tablet's reconnect reuses its socket
+KEEP_ALIVE = 30
+# SSE streams never end on their own, so shutdown closes them after this (seconds)
+GRACEFUL_SHUTDOWN = 5
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Serve the Chores App.")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args(argv[1:])
+
+    print(f"Starting Chores App on http://{args.host}:{args.port}")
+    uvicorn.run(
+        'asgi:app',
+        app_dir=str(Path(__file__).parent),
+        host=args.host,
+        port=args.port,
+        lifespan='on',
+        limit_concurrency=MAX_CONNECTIONS,
+        timeout_keep_alive=KEEP_ALIVE,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN,
+        # Requests are counted per route in /api/metrics
+        access_log=False,
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
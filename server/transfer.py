@@ -0,0 +1,316 @@
+"""Bulk export and import of children, chores and completions.
+
+Exports stream NDJSON (one {"type": ...} object per line: children, then
+chores, then completions) or CSV (one table per file), reading with
+fetchmany so memory stays flat however much history there is. Imports
+read the same formats record by record and load them with executemany in
+batched transactions. Rows keep their ids, so an export loads into an
+empty database unchanged and loading the same file twice changes nothing.
+
+Usage:
+    python server/transfer.py export [--format csv --table completions] [--start DATE] [--end DATE] > backup.ndjson
+    python server/transfer.py import [--format csv --table completions] backup.ndjson
+"""
+from pathlib import Path
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from archive import attach_archive
+from database import INDEXES, connect, migrate_db
+from events import publish
+from period_state import rebuild_period_state
+from rollups import rebuild_rollups
+from schedules import local_today, read_calendar, refresh_periods
+
+# Rows fetched per round trip when exporting
+FETCH_SIZE = 500
+# Rows written per transaction when importing
+BATCH_SIZE = 5000
+# Imports at least this large (bytes) drop the secondary indexes while
+# loading and rebuild them once at the end, from the command line or into
+# an empty database (see load_records)
+DEFER_INDEXES_MIN_BYTES = 1024 * 1024
+
+FORMATS = ['ndjson', 'csv']
+
+# Record type, table and exported columns, in load order
+TABLES = {
+    'children': ('child', ['id', 'name', 'display_order', 'created_at']),
+    'chores': ('chore', ['id', 'child_id', 'title', 'frequency', 'schedule', 'display_order',
+                         'is_active', 'created_at']),
+    'completions': ('completion', ['id', 'chore_id', 'date', 'completed_at']),
+}
+
+EXPORT_SQL = {
+    'children': "SELECT id, name, display_order, created_at FROM children ORDER BY id",
+    'chores': """
+        SELECT id, child_id, title, frequency, schedule, display_order, is_active, created_at
+        FROM chores ORDER BY id
+    """,
+    'completions': """
+        SELECT id, chore_id, date, completed_at
+        FROM chore_completions
+        WHERE date >= :start AND date <= :end
+        ORDER BY date, chore_id
+    """,
+}
+
+# EXPORT_SQL when an archive exists: retired chores and archived
+# completions are exported too, so an import restores the full history
+ARCHIVE_EXPORT_SQL = {
+    'children': EXPORT_SQL['children'],
+    'chores': """
+        SELECT id, child_id, title, frequency, schedule, display_order, is_active, created_at
+        FROM main.chores
+        UNION ALL
+        -- The archive doesn't keep schedules
+        SELECT id, child_id, title, frequency, NULL, display_order, is_active, created_at
+        FROM archive.chores a
+        WHERE NOT EXISTS (SELECT 1 FROM main.chores c WHERE c.id = a.id)
+            AND EXISTS (SELECT 1 FROM main.children ch WHERE ch.id = a.child_id)
+        ORDER BY id
+    """,
+    'completions': """
+        SELECT id, chore_id, date, completed_at
+        FROM archive.chore_completions cc
+        WHERE date >= :start AND date <= :end
+            AND EXISTS (SELECT 1 FROM main.children ch
+                        JOIN archive.chores c ON c.child_id = ch.id AND c.id = cc.chore_id)
+        UNION ALL
+        SELECT id, chore_id, date, completed_at
+        FROM main.chore_completions
+        WHERE date >= :start AND date <= :end
+        ORDER BY date, chore_id
+    """,
+}
+
+# Upserts keyed on the exported ids; a completion that already exists for
+# the chore and day is left alone
+IMPORT_SQL = {
+    'child': """
+        INSERT INTO children (id, name, display_order, created_at)
+        VALUES (:id, :name, COALESCE(:display_order, 0), COALESCE(:created_at, CURRENT_TIMESTAMP))
+        ON CONFLICT (id) DO UPDATE SET
+            name = excluded.name,
+            display_order = excluded.display_order
+    """,
+    'chore': """
+        INSERT INTO chores (id, child_id, title, frequency, schedule, display_order, is_active, created_at)
+        VALUES (:id, :child_id, :title, COALESCE(:frequency, 'daily'), :schedule, COALESCE(:display_order, 0),
+                COALESCE(:is_active, 1), COALESCE(:created_at, CURRENT_TIMESTAMP))
+        ON CONFLICT (id) DO UPDATE SET
+            child_id = excluded.child_id,
+            title = excluded.title,
+            frequency = excluded.frequency,
+            schedule = excluded.schedule,
+            display_order = excluded.display_order,
+            is_active = excluded.is_active
+    """,
+    'completion': """
+        INSERT INTO chore_completions (chore_id, date, completed_at)
+        VALUES (:chore_id, :date, COALESCE(:completed_at, CURRENT_TIMESTAMP))
+        ON CONFLICT (chore_id, date) DO NOTHING
+    """,
+}
+
+COLUMNS = {type: columns for type, columns in TABLES.values()}
+
+
+def export_rows(conn, table, start=None, end=None, archived=False):
+    """Yield batches of rows from one table, oldest completions first."""
+    sql = ARCHIVE_EXPORT_SQL[table] if archived else EXPORT_SQL[table]
+    cur = conn.execute(sql, {
+        'start': start or '0000-01-01',
+        'end': end or '9999-12-31',
+    })
+    while True:
+        rows = cur.fetchmany(FETCH_SIZE)
+        if not rows:
+            break
+        yield rows
+
+
+def export_ndjson(conn, start=None, end=None, archived=False):
+    """Yield NDJSON chunks for every table."""
+    for table, (type, columns) in TABLES.items():
+        for rows in export_rows(conn, table, start, end, archived):
+            yield ''.join(
+                json.dumps({'type': type, **dict(zip(columns, row))}, separators=(',', ':')) + '\n'
+                for row in rows
+            )
+
+
+def export_csv(conn, table, start=None, end=None, archived=False):
+    """Yield CSV chunks for one table, starting with a header row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(TABLES[table][1])
+    for rows in export_rows(conn, table, start, end, archived):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_data(format='ndjson', table=None, start=None, end=None):
+    """Yield export chunks from a dedicated connection, read as one snapshot."""
+    conn = connect()
+    try:
+        archived = attach_archive(conn)
+        conn.execute("BEGIN")
+        if format == 'csv':
+            yield from export_csv(conn, table or 'completions', start, end, archived)
+        else:
+            yield from export_ndjson(conn, start, end, archived)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def read_ndjson(lines):
+    """Yield (type, record) pairs from NDJSON lines."""
+    for line in lines:
+        line = line.strip()
+        if line:
+            record = json.loads(line)
+            yield record.pop('type', None), record
+
+
+def read_csv(lines, table):
+    """Yield (type, record) pairs from CSV lines for one table."""
+    type = TABLES[table][0]
+    for row in csv.DictReader(lines):
+        # CSV has no NULL; empty cells fall back to the column defaults
+        yield type, {key: value if value != '' else None for key, value in row.items()}
+
+
+def is_empty(conn):
+    """Whether the database has no children, chores or completions yet."""
+    return conn.execute("""
+        SELECT NOT EXISTS (SELECT 1 FROM children)
+            AND NOT EXISTS (SELECT 1 FROM chores)
+            AND NOT EXISTS (SELECT 1 FROM chore_completions)
+    """).fetchone()[0] == 1
+
+
+def load_records(conn, records, defer_indexes=False):
+    """Load (type, record) pairs in batched transactions; returns counts per type.
+
+    Period state, rollups and each chore's current period are rebuilt
+    afterwards, and an import event is published so open boards reload.
+    Raises ValueError for unknown record types; batches loaded before an
+    error stay committed.
+
+    defer_indexes drops the secondary indexes until the load ends, however
+    it ends. Queries running meanwhile scan whole tables, so only defer
+    where nothing else is using the database (the command line) or there
+    is nothing yet to search.
+    """
+    counts = dict.fromkeys(IMPORT_SQL, 0)
+    deferred = [name for name, definition in INDEXES.items()
+                if definition.split('(')[0] in ('children', 'chores', 'chore_completions')]
+
+    def flush(type, batch):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(IMPORT_SQL[type], batch)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        counts[type] += len(batch)
+
+    if defer_indexes:
+        for name in deferred:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        conn.commit()
+
+    try:
+        try:
+            type, batch = None, []
+            for record_type, record in records:
+                if record_type not in IMPORT_SQL:
+                    raise ValueError(f"Unknown record type: {record_type!r}")
+                if batch and (record_type != type or len(batch) >= BATCH_SIZE):
+                    flush(type, batch)
+                    batch = []
+                type = record_type
+                batch.append({column: record.get(column) for column in COLUMNS[type]})
+            if batch:
+                flush(type, batch)
+        finally:
+            if defer_indexes:
+                # Committed on their own, so a failed rebuild below can't take them with it
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for name in deferred:
+                        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {INDEXES[name]}")
+                except BaseException:
+                    conn.rollback()
+                    raise
+                conn.commit()
+    finally:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rebuild_period_state(conn)
+            rebuild_rollups(conn)
+            cal = read_calendar(conn)
+            refresh_periods(conn, local_today(cal), cal, everything=True)
+            publish(conn, 'data.imported', **counts)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    return counts
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Export or import chores data.")
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('path', nargs='?', help="file to import (default: stdin)")
+    parser.add_argument('--format', choices=FORMATS, default='ndjson')
+    parser.add_argument('--table', choices=list(TABLES), default='completions',
+                        help="table for CSV files")
+    parser.add_argument('--start', help="first completion date to export (YYYY-MM-DD)")
+    parser.add_argument('--end', help="last completion date to export (YYYY-MM-DD)")
+    args = parser.parse_args(argv[1:])
+
+    migrate_db()
+
+    if args.command == 'export':
+        for chunk in export_data(args.format, args.table, args.start, args.end):
+            sys.stdout.write(chunk)
+        return 0
+
+    if args.path:
+        source = open(args.path, encoding='utf-8', newline='')
+        defer_indexes = os.path.getsize(args.path) >= DEFER_INDEXES_MIN_BYTES
+    else:
+        source = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        defer_indexes = True
+
+    conn = connect()
+    try:
+        with source:
+            if args.format == 'csv':
+                records = read_csv(source, args.table)
+            else:
+                records = read_ndjson(source)
+            counts = load_records(conn, records, defer_indexes)
+    finally:
+        conn.close()
+    print(', '.join(f"{count} {type} rows" for type, count in counts.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
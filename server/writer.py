@@ -0,0 +1,154 @@
+"""Group commit: one writer thread per process for the hot write paths.
+
+With CHORES_WRITE_QUEUE=1, completion, reorder and update handlers hand
+their transaction body to this process's GroupWriter instead of running
+it on the request thread. The writer takes everything queued within a
+few milliseconds (CHORES_GROUP_COMMIT_MS) and runs it as one
+transaction, each body in its own savepoint, so a burst of taps from
+several tablets costs one lock acquisition and one fsync instead of one
+each. Requests wait for their result, which is only handed back once
+the group has committed.
+
+A body that raises is rolled back to its savepoint and its request gets
+the exception; the rest of the group still commits. Bodies run in the
+order they were queued, so their checks (already completed? seen this
+idempotency key?) behave exactly as they do one transaction at a time.
+
+In multi-household mode each body runs against the database it was
+submitted for, and a group only ever holds bodies for one database.
+"""
+from collections import deque
+from concurrent.futures import Future
+import os
+import queue
+import threading
+import time
+
+from database import current_path, get_db, release_db, transaction, use_database
+
+ENABLED = os.environ.get('CHORES_WRITE_QUEUE', '0') == '1'
+# How long the writer waits for more work after the first item (ms)
+GROUP_COMMIT_MS = float(os.environ.get('CHORES_GROUP_COMMIT_MS', 2))
+# Most transaction bodies committed together
+MAX_GROUP = 64
+# How long a request waits for its body to be committed (seconds)
+WRITE_TIMEOUT = float(os.environ.get('CHORES_WRITE_TIMEOUT', 30))
+
+
+class GroupWriter(threading.Thread):
+    """Runs queued transaction bodies in group-committed batches."""
+
+    def __init__(self):
+        super().__init__(name='group-writer', daemon=True)
+        self.pid = os.getpid()
+        self.jobs = queue.SimpleQueue()
+        # Jobs taken from the queue for other databases than the group's
+        self.deferred = deque()
+
+    def submit(self, func):
+        """Queue func(conn) for the next group; returns a Future of its result."""
+        future = Future()
+        self.jobs.put((current_path(), func, future))
+        return future
+
+    def run(self):
+        while True:
+            path, group = self.next_group()
+            try:
+                with use_database(path):
+                    try:
+                        self.commit(get_db(), group)
+                    finally:
+                        release_db()
+            except Exception as e:
+                # The database couldn't be opened (moved, failed migration):
+                # fail this group and keep serving the others
+                for _, _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def next_group(self):
+        """Block for one job, then take whatever else for its database arrives within the window."""
+        if not self.deferred:
+            self.deferred.append(self.jobs.get())
+        path = self.deferred[0][0]
+        group = []
+        others = deque()
+        for job in self.deferred:
+            (group if job[0] == path and len(group) < MAX_GROUP else others).append(job)
+        self.deferred = others
+
+        deadline = time.monotonic() + GROUP_COMMIT_MS / 1000
+        while len(group) < MAX_GROUP:
+            try:
+                job = self.jobs.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            (group if job[0] == path else self.deferred).append(job)
+        return path, group
+
+    def commit(self, conn, group):
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for _, func, future in group:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT job")
+                try:
+                    results.append((future, func(conn), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    results.append((future, None, e))
+                conn.execute("RELEASE job")
+            conn.commit()
+        except Exception as e:
+            # The group failed as a whole (locked, disk full): nothing was applied
+            if conn.in_transaction:
+                conn.rollback()
+            for _, func, future in group:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Get this process's GroupWriter, starting it on first use."""
+    global _writer
+    with _writer_lock:
+        # Threads don't survive fork(), so each worker starts its own,
+        # and a writer that died is replaced
+        if _writer is None or _writer.pid != os.getpid() or not _writer.is_alive():
+            _writer = GroupWriter()
+            _writer.start()
+    return _writer
+
+
+def run_write(func):
+    """Run func(conn) as a write transaction and return its result.
+
+    Goes through the group writer when CHORES_WRITE_QUEUE is on, and is
+    the same as calling func inside transaction() otherwise. func must not
+    use the request's connection or anything thread-local. Raises
+    TimeoutError if the writer hasn't committed it within WRITE_TIMEOUT.
+    """
+    if ENABLED:
+        future = get_writer().submit(func)
+        try:
+            return future.result(timeout=WRITE_TIMEOUT)
+        except TimeoutError:
+            # Not run at all if the writer hasn't reached it yet
+            future.cancel()
+            raise
+    with transaction() as conn:
+        return func(conn)
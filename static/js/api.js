@@ -1,41 +1,148 @@
 // API Client for Chores App
 
+// localStorage may be unavailable (private browsing) or full; the app
+// then works as before, just without an offline copy
+function loadStored(key, fallback) {
+    try {
+        return JSON.parse(localStorage.getItem(key)) ?? fallback;
+    } catch (err) {
+        return fallback;
+    }
+}
+
+function saveStored(key, value) {
+    try {
+        localStorage.setItem(key, JSON.stringify(value));
+    } catch (err) {
+        // Not persisted; kept in memory only
+    }
+}
+
+// With several households the tablet is opened once at /#household=<token>;
+// the token is kept and sent with every call to pick its household
+function takeHouseholdToken() {
+    const match = location.hash.match(/^#household=(.+)$/);
+    if (!match) return loadStored('chores.household', null);
+    const token = decodeURIComponent(match[1]);
+    saveStored('chores.household', token);
+    history.replaceState(null, '', location.pathname + location.search);
+    return token;
+}
+
+const HOUSEHOLD_TOKEN = takeHouseholdToken();
+
+// A household served under a /h/<id>/ prefix calls its API there too.
+// Either way its offline copy is kept apart from other households on this origin
+const BASE = (location.pathname.match(/^\/h\/[^/]+/) || [''])[0];
+const STORAGE_PREFIX = BASE ? `chores.${BASE.slice(3)}.`
+    : HOUSEHOLD_TOKEN ? `chores.${HOUSEHOLD_TOKEN.slice(0, 8)}.` : 'chores.';
+
+function apiFetch(url, options = {}) {
+    if (HOUSEHOLD_TOKEN) {
+        options.headers = { ...options.headers, 'X-Household-Token': HOUSEHOLD_TOKEN };
+    }
+    return fetch(url, options);
+}
+
+// Today as YYYY-MM-DD in the household's time zone (from /api/settings),
+// like the server's date; the tablet's own zone until one is known
+function localDate() {
+    try {
+        return new Date().toLocaleDateString('en-CA', { timeZone: api.timeZone || undefined });
+    } catch (err) {
+        // A zone this browser doesn't know
+        return new Date().toLocaleDateString('en-CA');
+    }
+}
+
 const api = {
+    // Signed token from the last successful PIN check, sent with parent-only calls
+    parentToken: null,
+
+    parentHeaders(headers = {}) {
+        if (this.parentToken) headers['X-Parent-Token'] = this.parentToken;
+        return headers;
+    },
+
+    async parentFetch(url, options = {}) {
+        options.headers = this.parentHeaders(options.headers);
+        const res = await apiFetch(url, options);
+        if (res.status === 401) {
+            this.parentToken = null;
+            window.dispatchEvent(new Event('parent-session-expired'));
+        }
+        return res;
+    },
+
+    // Last ETag and body for each polled URL, so unchanged data costs a 304
+    validators: {},
+
+    async getJSON(url) {
+        const cached = this.validators[url];
+        const headers = cached ? { 'If-None-Match': cached.etag } : {};
+        const res = await apiFetch(url, { headers, cache: 'no-store' });
+        if (res.status === 304 && cached) {
+            return structuredClone(cached.data);
+        }
+        const data = await res.json();
+        const etag = res.headers.get('ETag');
+        if (res.ok && etag) {
+            this.validators[url] = { etag, data: structuredClone(data) };
+        }
+        return data;
+    },
+
+    // The household's time zone, kept for days when the server can't be reached
+    timeZone: loadStored(STORAGE_PREFIX + 'timezone', null),
+
+    async loadSettings() {
+        try {
+            const settings = await this.getJSON(BASE + '/api/settings');
+            this.timeZone = settings.timezone;
+            saveStored(STORAGE_PREFIX + 'timezone', this.timeZone);
+        } catch (err) {
+            // Offline: keep the last zone we saw
+        }
+    },
+
     // Auth
     async pinExists() {
-        const res = await fetch('/api/auth/pin-exists');
+        const res = await apiFetch(BASE + '/api/auth/pin-exists');
         return res.json();
     },
 
     async verifyPin(pin) {
-        const res = await fetch('/api/auth/verify-pin', {
+        const res = await apiFetch(BASE + '/api/auth/verify-pin', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ pin })
         });
-        return { ok: res.ok, data: await res.json() };
+        const data = await res.json();
+        if (res.ok && data.token) this.parentToken = data.token;
+        return { ok: res.ok, data };
     },
 
     async setPin(pin, currentPin = null) {
         const body = { pin };
         if (currentPin) body.current_pin = currentPin;
 
-        const res = await fetch('/api/auth/set-pin', {
+        const res = await apiFetch(BASE + '/api/auth/set-pin', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(body)
         });
-        return { ok: res.ok, data: await res.json() };
+        const data = await res.json();
+        if (res.ok && data.token) this.parentToken = data.token;
+        return { ok: res.ok, data };
     },
 
     // Children
     async getChildren() {
-        const res = await fetch('/api/children');
-        return res.json();
+        return this.getJSON(BASE + '/api/children');
     },
 
     async createChild(name) {
-        const res = await fetch('/api/children', {
+        const res = await this.parentFetch(BASE + '/api/children', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ name })
@@ -44,7 +151,7 @@ const api = {
     },
 
     async updateChild(id, data) {
-        const res = await fetch(`/api/children/${id}`, {
+        const res = await this.parentFetch(`${BASE}/api/children/${id}`, {
             method: 'PUT',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -53,29 +160,127 @@ const api = {
     },
 
     async deleteChild(id) {
-        const res = await fetch(`/api/children/${id}`, {
+        const res = await this.parentFetch(`${BASE}/api/children/${id}`, {
             method: 'DELETE'
         });
         return res.json();
     },
 
+    // Local copy of the board ({seq, date, children}), kept current with
+    // deltas from /api/sync and saved so it still shows while offline
+    local: loadStored(STORAGE_PREFIX + 'board', null),
+
+    // Completions tapped while offline, waiting to be sent to /api/sync
+    outbox: loadStored(STORAGE_PREFIX + 'outbox', []),
+    flushing: false,
+
+    // Board (every child with their chores): fetches only what changed
+    // since the last call and applies it to the local copy
+    async getBoard() {
+        await this.flushOutbox();
+        let url = BASE + '/api/sync';
+        if (this.local) url += `?since=${this.local.seq}&date=${this.local.date}`;
+        try {
+            const res = await apiFetch(url, { cache: 'no-store' });
+            if (!res.ok) throw new Error(`Sync failed: ${res.status}`);
+            this.applyDelta(await res.json());
+        } catch (err) {
+            // Offline: show the last board we saw
+            if (!this.local) throw err;
+        }
+        return { children: this.withOutbox(this.local.children) };
+    },
+
+    applyDelta(delta) {
+        let children = delta.children;
+        if (!delta.full) {
+            const replaced = new Set(delta.children.map(c => c.id).concat(delta.removed));
+            children = this.local.children
+                .filter(c => !replaced.has(c.id))
+                .concat(delta.children)
+                .sort((a, b) => a.display_order - b.display_order || a.id - b.id);
+        }
+        this.local = { seq: delta.seq, date: delta.date, children };
+        saveStored(STORAGE_PREFIX + 'board', this.local);
+    },
+
+    // A copy of the board showing today's queued completions as done
+    withOutbox(children) {
+        const board = structuredClone(children);
+        const today = localDate();
+        const queued = new Map(this.outbox
+            .filter(m => m.type === 'complete' && m.date === today)
+            .map(m => [m.chore_id, m]));
+        for (const child of board) {
+            for (const chore of child.chores) {
+                const mutation = queued.get(chore.id);
+                if (mutation && !chore.completed) {
+                    chore.completed = true;
+                    chore.completed_at = mutation.at;
+                }
+            }
+        }
+        return board;
+    },
+
+    queueMutation(type, choreId) {
+        const mutation = {
+            id: this.newIdempotencyKey(),
+            type,
+            chore_id: choreId,
+            date: localDate(),
+            at: new Date().toISOString()
+        };
+        this.outbox.push(mutation);
+        saveStored(STORAGE_PREFIX + 'outbox', this.outbox);
+        return mutation;
+    },
+
+    // Send queued mutations. The server resolves conflicts and ignores
+    // mutations it has already applied, so a batch is dropped once it
+    // has been answered, and kept to resend if the server can't be reached.
+    async flushOutbox() {
+        if (this.flushing) return;
+        this.flushing = true;
+        try {
+            while (this.outbox.length > 0) {
+                const batch = this.outbox.slice(0, 100);
+                const res = await apiFetch(BASE + '/api/sync', {
+                    method: 'POST',
+                    headers: this.parentHeaders({ 'Content-Type': 'application/json' }),
+                    body: JSON.stringify({ mutations: batch })
+                });
+                if (res.status >= 500) break;
+                const sent = new Set(batch.map(m => m.id));
+                this.outbox = this.outbox.filter(m => !sent.has(m.id));
+                saveStored(STORAGE_PREFIX + 'outbox', this.outbox);
+            }
+        } catch (err) {
+            // Still offline; try again on the next sync
+        } finally {
+            this.flushing = false;
+        }
+    },
+
     // Chores
     async getChores(childId) {
-        const res = await fetch(`/api/children/${childId}/chores`);
-        return res.json();
+        return this.getJSON(`${BASE}/api/children/${childId}/chores`);
     },
 
-    async createChore(childId, title, frequency = 'daily') {
-        const res = await fetch(`/api/children/${childId}/chores`, {
+    // schedule is required for interval, weekdays and monthday chores
+    async createChore(childId, title, frequency = 'daily', schedule = null) {
+        const body = { title, frequency };
+        if (schedule) body.schedule = schedule;
+        const res = await this.parentFetch(`${BASE}/api/children/${childId}/chores`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ title, frequency })
+            body: JSON.stringify(body)
         });
         return res.json();
     },
 
     async updateChore(choreId, data) {
-        const res = await fetch(`/api/chores/${choreId}`, {
+        const res = await this.parentFetch(`${BASE}/api/chores/${choreId}`, {
             method: 'PUT',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
@@ -84,31 +289,73 @@ const api = {
     },
 
     async deleteChore(choreId) {
-        const res = await fetch(`/api/chores/${choreId}`, {
+        const res = await this.parentFetch(`${BASE}/api/chores/${choreId}`, {
             method: 'DELETE'
         });
         return res.json();
     },
 
     async completeChore(choreId) {
-        const res = await fetch(`/api/chores/${choreId}/complete`, {
+        const res = await apiFetch(`${BASE}/api/chores/${choreId}/complete`, {
             method: 'POST'
         });
         return res.json();
     },
 
+    newIdempotencyKey() {
+        return Date.now().toString(36) + Math.random().toString(36).slice(2);
+    },
+
+    // Complete several chores in one request. Network failures are retried
+    // with the same idempotency key, so a retry never completes twice; if
+    // the server stays unreachable the completions are queued for later.
+    async completeChores(choreIds) {
+        const key = this.newIdempotencyKey();
+        for (let attempt = 0; navigator.onLine !== false; attempt++) {
+            try {
+                const res = await apiFetch(BASE + '/api/chores/complete', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json', 'Idempotency-Key': key },
+                    body: JSON.stringify({ chore_ids: choreIds })
+                });
+                return res.json();
+            } catch (err) {
+                if (attempt >= 2) break;
+                await new Promise(resolve => setTimeout(resolve, 500 * (attempt + 1)));
+            }
+        }
+        return {
+            results: choreIds.map(choreId => {
+                const mutation = this.queueMutation('complete', choreId);
+                return { chore_id: choreId, success: true, completed_at: mutation.at, queued: true };
+            })
+        };
+    },
+
     async uncompleteChore(choreId) {
-        const res = await fetch(`/api/chores/${choreId}/complete`, {
+        const res = await this.parentFetch(`${BASE}/api/chores/${choreId}/complete`, {
             method: 'DELETE'
         });
         return res.json();
     },
 
+    // Live updates: calls onChange for every change event from any device,
+    // and when the connection comes back so queued taps are sent
+    subscribe(onChange) {
+        // EventSource can't send headers, so the token goes in the query string
+        let url = BASE + '/api/events';
+        if (HOUSEHOLD_TOKEN) url += `?household_token=${encodeURIComponent(HOUSEHOLD_TOKEN)}`;
+        const source = new EventSource(url);
+        source.onmessage = (e) => onChange(JSON.parse(e.data));
+        source.onopen = () => onChange({ type: 'reconnected', data: {} });
+        window.addEventListener('online', () => onChange({ type: 'online', data: {} }));
+        return source;
+    },
+
     // History
     async getHistory(days = 7, childId = null) {
-        let url = `/api/history?days=${days}`;
+        let url = `${BASE}/api/history?days=${days}`;
         if (childId) url += `&child_id=${childId}`;
-        const res = await fetch(url);
-        return res.json();
+        return this.getJSON(url);
     }
 };
@@ -38,22 +38,66 @@ function choresApp() {
         showAddChore: false,
         newChoreTitle: '',
         newChoreFrequency: '',
+        // Schedule of an interval, weekdays or monthday chore
+        newChoreEvery: 2,
+        newChoreDays: [],
+        newChoreDay: 1,
+        weekdayNames: ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+
+        // Chore completions waiting to be sent as one batch
+        pendingCompletions: new Map(),
+        completionTimer: null,
 
         // Settings
         currentPin: '',
         newPin: '',
 
         async init() {
+            // Parent session timed out on the server; ask for the PIN again
+            window.addEventListener('parent-session-expired', () => {
+                if (this.isAuthenticated) {
+                    alert('Parent session expired. Please enter your PIN again.');
+                    this.logout();
+                }
+            });
+
             // Check if PIN needs to be set up
             const { exists } = await api.pinExists();
             this.needsSetup = !exists;
 
+            // The household's time zone decides what "today" is
+            await api.loadSettings();
+
             // Load children
             await this.loadChildren();
+
+            // Other devices' changes arrive as events instead of by polling
+            api.subscribe(async (event) => {
+                if (event.type === 'settings.updated') await api.loadSettings();
+                this.refresh();
+            });
+        },
+
+        // Reload whatever is on screen after a change elsewhere
+        async refresh() {
+            await this.loadChildren();
+            if (this.currentView === 'child' && this.selectedChild) {
+                const latest = this.children.find(c => c.id === this.selectedChild.id);
+                if (latest) {
+                    this.selectedChild = latest;
+                    this.chores = latest.chores;
+                }
+            }
+            if (this.editingChild) {
+                this.editingChildChores = await api.getChores(this.editingChild.id);
+            }
         },
 
         async loadChildren() {
-            this.children = await api.getChildren();
+            // The board includes each child's chores, so opening a child
+            // doesn't need another round trip
+            const board = await api.getBoard();
+            this.children = board.children;
         },
 
         // Navigation
@@ -67,13 +111,26 @@ function choresApp() {
 
         async selectChild(child) {
             this.selectedChild = child;
-            this.chores = await api.getChores(child.id);
+            this.chores = child.chores;
             this.currentView = 'child';
+
+            // Refresh in case another device changed something
+            await this.loadChildren();
+            const latest = this.children.find(c => c.id === child.id);
+            if (latest && this.selectedChild === child) {
+                this.selectedChild = latest;
+                this.chores = latest.chores;
+            }
         },
 
-        // Filter chores by frequency for grouped display
+        // Filter chores by frequency for grouped display; custom
+        // schedules share the 'scheduled' section
         choresByFrequency(frequency) {
-            return this.chores.filter(c => (c.frequency || 'daily') === frequency);
+            const scheduled = ['weekdays', 'interval', 'monthday'];
+            return this.chores.filter(c => {
+                const f = c.frequency || 'daily';
+                return (scheduled.includes(f) ? 'scheduled' : f) === frequency;
+            });
         },
 
         // Chore completion (kid view)
@@ -83,10 +140,25 @@ function choresApp() {
                 return;
             }
 
-            const result = await api.completeChore(chore.id);
-            if (result.success) {
-                chore.completed = true;
-                chore.completed_at = result.completed_at;
+            // Taps in quick succession are sent together in one request
+            if (this.pendingCompletions.has(chore.id)) return;
+            this.pendingCompletions.set(chore.id, chore);
+            clearTimeout(this.completionTimer);
+            this.completionTimer = setTimeout(() => this.flushCompletions(), 150);
+        },
+
+        async flushCompletions() {
+            const pending = this.pendingCompletions;
+            this.pendingCompletions = new Map();
+            if (pending.size === 0) return;
+
+            const { results } = await api.completeChores([...pending.keys()]);
+            for (const result of results || []) {
+                const chore = pending.get(result.chore_id);
+                if (chore && result.success) {
+                    chore.completed = true;
+                    chore.completed_at = result.completed_at;
+                }
             }
         },
 
@@ -129,6 +201,7 @@ function choresApp() {
 
         logout() {
             this.isAuthenticated = false;
+            api.parentToken = null;
             this.goHome();
         },
 
@@ -211,6 +284,9 @@ function choresApp() {
         addChore() {
             this.newChoreTitle = '';
             this.newChoreFrequency = '';
+            this.newChoreEvery = 2;
+            this.newChoreDays = [];
+            this.newChoreDay = 1;
             this.showAddChore = true;
             this.$nextTick(() => {
                 this.$refs.choreInput?.focus();
@@ -223,12 +299,44 @@ function choresApp() {
             this.newChoreFrequency = '';
         },
 
+        toggleNewChoreDay(day) {
+            this.newChoreDays = this.newChoreDays.includes(day)
+                ? this.newChoreDays.filter(d => d !== day)
+                : [...this.newChoreDays, day];
+        },
+
+        // The schedule the new chore's frequency needs, or null
+        newChoreSchedule() {
+            if (this.newChoreFrequency === 'interval') return { every: Number(this.newChoreEvery) };
+            if (this.newChoreFrequency === 'weekdays') return { days: [...this.newChoreDays].sort((a, b) => a - b) };
+            if (this.newChoreFrequency === 'monthday') return { day: Number(this.newChoreDay) };
+            return null;
+        },
+
+        canAddChore() {
+            if (!this.newChoreTitle.trim() || !this.newChoreFrequency) return false;
+            const schedule = this.newChoreSchedule();
+            if (this.newChoreFrequency === 'interval') {
+                return Number.isInteger(schedule.every) && schedule.every >= 1 && schedule.every <= 366;
+            }
+            if (this.newChoreFrequency === 'weekdays') return schedule.days.length > 0;
+            if (this.newChoreFrequency === 'monthday') {
+                return Number.isInteger(schedule.day) && schedule.day >= 1 && schedule.day <= 31;
+            }
+            return true;
+        },
+
         async confirmAddChore() {
-            if (!this.newChoreTitle.trim() || !this.newChoreFrequency) {
+            if (!this.canAddChore()) {
                 return;
             }
 
-            await api.createChore(this.editingChild.id, this.newChoreTitle.trim(), this.newChoreFrequency);
+            const result = await api.createChore(this.editingChild.id, this.newChoreTitle.trim(),
+                this.newChoreFrequency, this.newChoreSchedule());
+            if (result.error) {
+                alert(result.error);
+                return;
+            }
             this.editingChildChores = await api.getChores(this.editingChild.id);
             this.showAddChore = false;
             this.newChoreTitle = '';
@@ -325,7 +433,12 @@ function choresApp() {
             });
         },
 
-        formatFrequency(freq) {
+        formatFrequency(freq, schedule) {
+            if (schedule) {
+                if (freq === 'interval') return `Every ${schedule.every} days`;
+                if (freq === 'weekdays') return schedule.days.map(d => this.weekdayNames[d]).join(', ');
+                if (freq === 'monthday') return `Monthly on day ${schedule.day}`;
+            }
             const labels = {
                 'daily': 'Daily',
                 'weekly': 'Weekly',
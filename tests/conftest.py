@@ -0,0 +1,40 @@
+"""Shared fixtures: the app on a fresh database in a temporary directory.
+
+The database path is read when database.py is imported, so it is set
+here, before any test module imports the server.
+"""
+from pathlib import Path
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ['CHORES_DB_PATH'] = str(Path(tempfile.mkdtemp()) / 'chores.db')
+sys.path.insert(0, str(Path(__file__).parent.parent / 'server'))
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    app = create_app()
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    return app
+
+
+@pytest.fixture(scope='session')
+def parent_token(app):
+    return app.test_client().post('/api/auth/set-pin', json={'pin': '1234'}).get_json()['token']
+
+
+@pytest.fixture
+def client(app, parent_token):
+    """A test client that sends the parent session token with every request."""
+    client = app.test_client()
+    client.environ_base['HTTP_X_PARENT_TOKEN'] = parent_token
+    return client
+
+
+@pytest.fixture
+def child(client):
+    return client.post('/api/children', json={'name': 'Ann'}).get_json()
@@ -0,0 +1,38 @@
+import base64
+import json
+
+import pytest
+
+
+def cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+
+@pytest.mark.parametrize('value', [
+    cursor(['2024-01-01', 'Ann', [1], '2024-01-01 10:00:00', 1]),
+    cursor(['2024-01-01', {'a': 1}, 1, '2024-01-01 10:00:00', 1]),
+    cursor(['2024-01-01', 'Ann', 1, None, 1]),
+    cursor(['2024-01-01', 'Ann', 1]),
+    'not a cursor',
+])
+def test_malformed_cursor_is_rejected(client, value):
+    response = client.get('/api/history', query_string={'limit': 10, 'cursor': value})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
+
+
+def test_next_cursor_continues_the_history(client, child):
+    for title in ('Bed', 'Teeth', 'Dishes'):
+        chore = client.post(f"/api/children/{child['id']}/chores", json={'title': title}).get_json()
+        client.post(f"/api/chores/{chore['id']}/complete")
+
+    def titles(page):
+        return [c['title'] for day in page['history'] for entry in day['children']
+                if entry['id'] == child['id'] for c in entry['chores']]
+
+    first = client.get('/api/history', query_string={'limit': 2}).get_json()
+    second = client.get('/api/history', query_string={'limit': 2, 'cursor': first['next_cursor']}).get_json()
+    everything = client.get('/api/history').get_json()
+    paged = titles(first) + titles(second)
+    assert paged and paged == titles(everything)[:len(paged)]
+    assert sorted(titles(everything)) == ['Bed', 'Dishes', 'Teeth']
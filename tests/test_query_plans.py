@@ -0,0 +1,23 @@
+"""Every route statement must search, not scan, chores and chore_completions.
+
+See server/query_plans.py, which runs the same check from the command line.
+"""
+import pytest
+
+import query_plans
+
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    conn = query_plans.open_database(tmp_path_factory.mktemp('plans') / 'plans.db')
+    yield conn
+    conn.close()
+
+
+def test_statements_are_found():
+    assert len(query_plans.statements()) > 0
+
+
+@pytest.mark.parametrize('sql', [pytest.param(sql, id=where) for where, sql in query_plans.statements()])
+def test_no_full_scans(conn, sql):
+    assert query_plans.full_scans(conn, sql) == []
@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from database import transaction
+from rollups import rebuild_rollups
+from schedules import local_today
+
+
+def chore_stats(client, child, chore):
+    stats = client.get('/api/stats', query_string={'child_id': child['id']}).get_json()
+    return next(c for c in stats['children'][0]['chores'] if c['id'] == chore['id'])
+
+
+def test_current_period_counts_once_completed(client, child):
+    chore = client.post(f"/api/children/{child['id']}/chores", json={'title': 'Teeth'}).get_json()
+
+    stats = chore_stats(client, child, chore)
+    assert (stats['completed'], stats['expected'], stats['rate']) == (0, 0, None)
+
+    assert client.post(f"/api/chores/{chore['id']}/complete").status_code == 200
+    stats = chore_stats(client, child, chore)
+    assert (stats['completed'], stats['expected'], stats['rate']) == (1, 1, 1.0)
+    assert stats['current_streak'] == 1
+
+    assert client.delete(f"/api/chores/{chore['id']}/complete").status_code == 200
+    stats = chore_stats(client, child, chore)
+    assert (stats['completed'], stats['expected']) == (0, 0)
+
+
+def test_ended_periods_are_expected(client, child):
+    chore = client.post(f"/api/children/{child['id']}/chores", json={'title': 'Bed'}).get_json()
+    today = local_today()
+    days_ago = [(today - timedelta(days=n)).isoformat() for n in (0, 1, 2, 3)]
+    # As if the chore was created three days ago and not looked at since
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE chores SET created_at = ?, period_start = ?, period_end = ? WHERE id = ?",
+            [days_ago[3] + ' 12:00:00', days_ago[3], days_ago[2], chore['id']]
+        )
+
+    client.get('/api/board')
+    stats = chore_stats(client, child, chore)
+    assert (stats['completed'], stats['expected']) == (0, 3)
+
+    assert client.post(f"/api/chores/{chore['id']}/complete").status_code == 200
+    stats = chore_stats(client, child, chore)
+    assert (stats['completed'], stats['expected'], stats['current_streak']) == (1, 4, 1)
+
+    # A rebuild derives the same periods from the schedule
+    with transaction() as conn:
+        rebuild_rollups(conn, chore['id'])
+    assert chore_stats(client, child, chore) == stats
@@ -0,0 +1,37 @@
+from datetime import timedelta
+import uuid
+
+from database import query_db
+from schedules import local_today
+
+
+def mutation(type, chore_id, day):
+    return {'id': str(uuid.uuid4()), 'type': type, 'chore_id': chore_id, 'date': day.isoformat()}
+
+
+def test_uncomplete_past_period_keeps_later_periods(client, child):
+    chore = client.post(f"/api/children/{child['id']}/chores", json={'title': 'Bed'}).get_json()
+    today = local_today()
+    yesterday = today - timedelta(days=1)
+
+    results = client.post('/api/sync', json={'mutations': [
+        mutation('complete', chore['id'], yesterday),
+        mutation('complete', chore['id'], today),
+    ]}).get_json()['results']
+    assert [r['status'] for r in results] == ['applied', 'applied']
+
+    results = client.post('/api/sync', json={'mutations': [
+        mutation('uncomplete', chore['id'], yesterday),
+    ]}).get_json()['results']
+    assert results[0]['status'] == 'applied'
+
+    completions = query_db("SELECT date FROM chore_completions WHERE chore_id = ?", [chore['id']])
+    assert [row['date'] for row in completions] == [today.isoformat()]
+    rollups = query_db("SELECT date FROM daily_rollups WHERE chore_id = ?", [chore['id']])
+    assert [row['date'] for row in rollups] == [today.isoformat()]
+    states = query_db("SELECT period_start FROM chore_period_state WHERE chore_id = ?", [chore['id']])
+    assert [row['period_start'] for row in states] == [today.isoformat()]
+
+    board = client.get('/api/sync').get_json()
+    entry = next(c for c in board['children'] if c['id'] == child['id'])
+    assert next(c for c in entry['chores'] if c['id'] == chore['id'])['completed']